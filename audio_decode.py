@@ -0,0 +1,388 @@
+"""Audio decoding helpers that stream PCM instead of writing temp files.
+
+`normalize_pcm_stream` is the entry point for uploads: formats libsndfile
+understands (WAV in any sample format, FLAC, OGG/Vorbis, ...) are decoded
+in-process with soundfile, downmixed and resampled to the model rate with a
+vectorized polyphase `Resampler`. Only containers soundfile cannot open are
+handed to ffmpeg, which saves a process spawn on most uploads.
+
+`ffmpeg_pcm_stream` pipes the encoded upload into ffmpeg's stdin and yields
+raw 16-bit little-endian mono PCM from its stdout as it is produced, so the
+recognizer can start while ffmpeg is still decoding. `FfmpegStreamDecoder`
+does the same for live streams whose bytes arrive over time.
+
+Requirements: ffmpeg available on PATH (or set FFMPEG_BINARY).
+"""
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from math import gcd
+
+import numpy as np
+
+FFMPEG = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+TARGET_RATE = 16000
+# bytes of PCM per chunk handed to the recognizer (4000 samples of s16le)
+CHUNK_BYTES = 8000
+# bytes per write into ffmpeg's stdin
+_FEED_BYTES = 64 * 1024
+
+
+class DecodeError(RuntimeError):
+    """Raised when ffmpeg cannot decode the input."""
+
+
+def _iter_input(data):
+    """Yield byte blocks from bytes, a file-like object or an iterable of bytes."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data)
+        for i in range(0, len(view), _FEED_BYTES):
+            yield view[i:i + _FEED_BYTES]
+    elif hasattr(data, 'read'):
+        while True:
+            block = data.read(_FEED_BYTES)
+            if not block:
+                break
+            yield block
+    else:
+        for block in data:
+            if block:
+                yield block
+
+
+def _ffmpeg_cmd(src, samplerate, channels):
+    return [FFMPEG, '-hide_banner', '-loglevel', 'error', '-i', src,
+            '-f', 's16le', '-acodec', 'pcm_s16le',
+            '-ar', str(samplerate), '-ac', str(channels), 'pipe:1']
+
+
+def _run_ffmpeg(cmd, data, chunk_size):
+    """Run ffmpeg, feeding `data` to stdin if given, and yield stdout chunks."""
+    try:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE if data is not None else subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise DecodeError(f'ffmpeg not available: {e}')
+
+    errors = []
+
+    def feed():
+        try:
+            for block in _iter_input(data):
+                proc.stdin.write(block)
+        except (BrokenPipeError, ValueError, OSError):
+            # ffmpeg exited early; the return code reports the failure
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    def drain_stderr():
+        # keep only the tail so a chatty ffmpeg cannot grow memory
+        for line in proc.stderr:
+            errors.append(line)
+            del errors[:-20]
+
+    threads = [threading.Thread(target=drain_stderr, daemon=True)]
+    if data is not None:
+        threads.append(threading.Thread(target=feed, daemon=True))
+    for t in threads:
+        t.start()
+
+    finished = False
+    try:
+        while True:
+            chunk = proc.stdout.read(chunk_size)
+            if not chunk:
+                break
+            if len(chunk) % 2:
+                # only possible on the very last read; drop the half sample
+                chunk = chunk[:-1]
+            yield chunk
+        finished = True
+    finally:
+        if not finished and proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        for t in threads:
+            t.join(timeout=5)
+        proc.stdout.close()
+        proc.stderr.close()
+
+    if proc.returncode != 0:
+        msg = b''.join(errors).decode('utf-8', 'replace').strip()
+        raise DecodeError(f'ffmpeg conversion failed: {msg}' if msg else 'ffmpeg conversion failed')
+
+
+def ffmpeg_pcm_stream(data, samplerate=TARGET_RATE, channels=1, chunk_size=CHUNK_BYTES):
+    """Decode `data` with ffmpeg and yield raw s16le PCM chunks of `chunk_size` bytes.
+
+    `data` may be bytes, a file-like object or an iterable of byte blocks; it
+    is piped to ffmpeg's stdin while PCM is read from stdout, so nothing is
+    written to disk. Containers that need a seekable input (e.g. MP4 with the
+    index at the end) fail on a pipe; for in-memory bytes and seekable file
+    objects those are retried once through a temporary file.
+
+    Raises DecodeError if ffmpeg fails.
+    """
+    cmd = _ffmpeg_cmd('pipe:0', samplerate, channels)
+    produced = False
+    try:
+        for chunk in _run_ffmpeg(cmd, data, chunk_size):
+            produced = True
+            yield chunk
+        return
+    except DecodeError:
+        seekable = hasattr(data, 'seekable') and data.seekable()
+        if produced or not (seekable or isinstance(data, (bytes, bytearray, memoryview))):
+            raise
+
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, 'in')
+        with open(path, 'wb') as f:
+            if seekable:
+                data.seek(0)
+                shutil.copyfileobj(data, f, _FEED_BYTES)
+            else:
+                f.write(data)
+        yield from ffmpeg_pcm_file(path, samplerate, channels, chunk_size)
+
+
+def ffmpeg_pcm_file(path, samplerate=TARGET_RATE, channels=1, chunk_size=CHUNK_BYTES):
+    """Decode the file at `path` with ffmpeg and yield raw s16le PCM chunks.
+
+    ffmpeg opens the file itself, so it can seek (MP4/M4A/3GP with the index
+    at the end decode fine). Raises DecodeError if ffmpeg fails.
+    """
+    # file: keeps names with a colon from being read as a protocol
+    src = 'file:' + os.path.abspath(path)
+    yield from _run_ffmpeg(_ffmpeg_cmd(src, samplerate, channels), None, chunk_size)
+
+
+class FfmpegStreamDecoder:
+    """Incremental ffmpeg decoder for live streams (e.g. Opus in Ogg/WebM).
+
+    Encoded bytes are written with `feed` as they arrive; decoded s16le PCM
+    is collected by a reader thread and returned by `read` without blocking.
+    Call `finish` at end of stream to flush ffmpeg, or `close` to abort.
+    """
+
+    def __init__(self, samplerate=TARGET_RATE, channels=1):
+        self.samplerate = samplerate
+        cmd = [FFMPEG, '-hide_banner', '-loglevel', 'error', '-fflags', 'nobuffer',
+               '-i', 'pipe:0', '-f', 's16le', '-acodec', 'pcm_s16le',
+               '-ar', str(samplerate), '-ac', str(channels), 'pipe:1']
+        try:
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                          stderr=subprocess.PIPE)
+        except OSError as e:
+            raise DecodeError(f'ffmpeg not available: {e}')
+        self._lock = threading.Lock()
+        self._pcm = bytearray()
+        self._errors = []
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._stderr = threading.Thread(target=self._read_stderr, daemon=True)
+        self._reader.start()
+        self._stderr.start()
+
+    def _read_stdout(self):
+        fd = self._proc.stdout.fileno()
+        while True:
+            try:
+                block = os.read(fd, 65536)
+            except OSError:
+                break
+            if not block:
+                break
+            with self._lock:
+                self._pcm += block
+
+    def _read_stderr(self):
+        for line in self._proc.stderr:
+            self._errors.append(line)
+            del self._errors[:-20]
+
+    def feed(self, data):
+        """Write encoded bytes to ffmpeg (may block while ffmpeg catches up)."""
+        try:
+            self._proc.stdin.write(data)
+            self._proc.stdin.flush()
+        except (BrokenPipeError, ValueError, OSError):
+            raise DecodeError(self._error_message())
+
+    def read(self):
+        """Return the PCM decoded so far (whole samples only)."""
+        with self._lock:
+            n = len(self._pcm) - len(self._pcm) % 2
+            out = bytes(self._pcm[:n])
+            del self._pcm[:n]
+        return out
+
+    def finish(self, timeout=10):
+        """Close ffmpeg's input, wait for it to exit and return the remaining PCM."""
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+            self._proc.wait()
+        self._reader.join(timeout=timeout)
+        self._stderr.join(timeout=timeout)
+        if self._proc.returncode != 0:
+            raise DecodeError(self._error_message())
+        return self.read()
+
+    def close(self):
+        if self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        for f in (self._proc.stdin, self._proc.stdout, self._proc.stderr):
+            try:
+                f.close()
+            except (OSError, ValueError):
+                pass
+
+    def _error_message(self):
+        msg = b''.join(self._errors).decode('utf-8', 'replace').strip()
+        return f'ffmpeg conversion failed: {msg}' if msg else 'ffmpeg conversion failed'
+
+
+
+# -- in-process normalization ------------------------------------------------
+
+class Resampler:
+    """Streaming polyphase resampler (Kaiser-windowed sinc), vectorized with NumPy.
+
+    Feed float32 blocks to `process` and call `flush` at the end; the output
+    is aligned with the input (the filter delay is compensated).
+    """
+
+    def __init__(self, orig_rate, target_rate, zero_crossings=16, beta=8.0):
+        g = gcd(int(orig_rate), int(target_rate))
+        self.up = int(target_rate) // g
+        self.down = int(orig_rate) // g
+        factor = max(self.up, self.down)
+        n = 2 * zero_crossings * factor + 1
+        cutoff = 1.0 / factor
+        t = np.arange(n) - (n - 1) / 2.0
+        h = cutoff * np.sinc(cutoff * t) * np.kaiser(n, beta) * self.up
+        self.taps = -(-n // self.up)
+        h = np.concatenate([h, np.zeros(self.taps * self.up - n)])
+        # phases[p, j] = h[p + j * up]
+        self._phases = h.reshape(self.taps, self.up).T.astype(np.float32)
+        self._delay = (n - 1) // 2
+        self._buf = np.zeros(self.taps, dtype=np.float32)
+        self._buf_start = -self.taps
+        self._in_total = 0
+        self._out_total = 0
+
+    def _emit(self, n_hi):
+        ns = np.arange(self._out_total, n_hi, dtype=np.int64)
+        if len(ns) == 0:
+            return np.zeros(0, dtype=np.float32)
+        out = np.empty(len(ns), dtype=np.float32)
+        j = np.arange(self.taps)
+        # bound the size of the (outputs x taps) gather
+        step = max(1, 262144 // self.taps)
+        for i in range(0, len(ns), step):
+            t = ns[i:i + step] * self.down + self._delay
+            base = t // self.up - self._buf_start
+            out[i:i + step] = np.einsum('ij,ij->i', self._phases[t % self.up],
+                                        self._buf[base[:, None] - j[None, :]])
+        self._out_total = n_hi
+        # drop input no later output can reach
+        keep_from = (n_hi * self.down + self._delay) // self.up - self.taps + 1 - self._buf_start
+        if keep_from > 0:
+            self._buf = self._buf[keep_from:]
+            self._buf_start += keep_from
+        return out
+
+    def process(self, x):
+        if self.up == self.down:
+            return np.asarray(x, dtype=np.float32)
+        self._buf = np.concatenate([self._buf, np.asarray(x, dtype=np.float32)])
+        self._in_total += len(x)
+        n_hi = (self._in_total * self.up - 1 - self._delay) // self.down + 1
+        return self._emit(max(n_hi, self._out_total))
+
+    def flush(self):
+        if self.up == self.down:
+            return np.zeros(0, dtype=np.float32)
+        total = -(-self._in_total * self.up // self.down)
+        pad = self._delay // self.up + self.taps + 1
+        self._buf = np.concatenate([self._buf, np.zeros(pad, dtype=np.float32)])
+        return self._emit(max(total, self._out_total))
+
+
+def _float_to_pcm16(x):
+    return (np.clip(x, -1.0, 1.0 - 1.0 / 32768) * 32768.0).astype('<i2').tobytes()
+
+
+def _soundfile_pcm_stream(f, target_rate, chunk_size):
+    frames = chunk_size // 2
+    if f.channels == 1 and f.samplerate == target_rate and f.subtype == 'PCM_16':
+        # already in the model's format: pass blocks straight through
+        for block in f.blocks(blocksize=frames, dtype='int16'):
+            yield block.tobytes()
+        return
+
+    resampler = Resampler(f.samplerate, target_rate)
+    for block in f.blocks(blocksize=frames, dtype='float32', always_2d=True):
+        mono = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1, dtype=np.float32)
+        out = resampler.process(mono)
+        if len(out):
+            yield _float_to_pcm16(out)
+    out = resampler.flush()
+    if len(out):
+        yield _float_to_pcm16(out)
+
+
+def open_soundfile(data):
+    """Open `data` (bytes, path or seekable file object) with soundfile.
+
+    Returns None if soundfile is unavailable or cannot read the format.
+    """
+    try:
+        # imported here so importing this module stays cheap
+        import soundfile as sf
+    except Exception:
+        return None
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = io.BytesIO(data)
+    try:
+        return sf.SoundFile(data)
+    except Exception:
+        if hasattr(data, 'seek'):
+            data.seek(0)
+        return None
+
+
+def normalize_pcm_stream(data, samplerate=TARGET_RATE, chunk_size=CHUNK_BYTES, info=None):
+    """Yield s16le mono PCM at `samplerate` for an encoded upload.
+
+    `data` is bytes, a path or a seekable file object. Formats soundfile can
+    open are decoded in-process (any channel count, integer/float/24-bit
+    samples, any rate); everything else goes through ffmpeg, which opens
+    files on disk (paths, or file objects with a file name) itself.
+    If an `info` dict is given, its 'decoder' is set to 'soundfile' or 'ffmpeg'.
+    """
+    f = open_soundfile(data)
+    if info is not None:
+        info['decoder'] = 'ffmpeg' if f is None else 'soundfile'
+    if f is None:
+        path = data if isinstance(data, str) else getattr(data, 'name', None)
+        if isinstance(path, str) and os.path.isfile(path):
+            yield from ffmpeg_pcm_file(path, samplerate=samplerate, chunk_size=chunk_size)
+        else:
+            yield from ffmpeg_pcm_stream(data, samplerate=samplerate, chunk_size=chunk_size)
+        return
+    with f:
+        yield from _soundfile_pcm_stream(f, samplerate, chunk_size)
@@ -0,0 +1,280 @@
+"""Storage tier for received audio.
+
+Audio is stored as FLAC under a name derived from the SHA-256 of its PCM
+(`upload_<hash>.flac`), so concurrent requests can never overwrite each
+other and re-sent audio is stored once. Encoding and file I/O run on a
+background thread per write; the request thread only hashes the PCM and
+enqueues it. The file is written under a temporary `.part` name and moved
+into place when complete.
+
+A janitor thread keeps the folders bounded:
+ - removes `.part` files left behind by crashes
+ - compresses older WAV files to FLAC (keeping their index rows)
+ - deletes files older than the maximum age
+ - deletes the oldest files while the total size is over the quota
+Sizes and ages come from the recordings index (recordings_index.py), so a
+pass does not need to stat every file.
+
+Configuration (environment):
+    AUDIO_STORAGE_QUOTA_MB        total size limit (default: 2048; 0 disables)
+    AUDIO_STORAGE_MAX_AGE_DAYS    delete files older than this (default: 0, disabled)
+    AUDIO_STORAGE_INTERVAL        seconds between janitor passes (default: 300)
+"""
+import hashlib
+import os
+import queue
+import threading
+import time
+import uuid
+
+import numpy as np
+
+DEFAULT_QUOTA_MB = float(os.environ.get('AUDIO_STORAGE_QUOTA_MB', '2048'))
+DEFAULT_MAX_AGE_DAYS = float(os.environ.get('AUDIO_STORAGE_MAX_AGE_DAYS', '0'))
+DEFAULT_INTERVAL = float(os.environ.get('AUDIO_STORAGE_INTERVAL', '300'))
+
+PART_SUFFIX = '.part'
+# files younger than this may still be in use and are left alone by the janitor
+_GRACE_SECONDS = 60
+# most WAV files remembered as not compressible; older entries are retried
+_MAX_SKIP_COMPRESS = 1000
+
+
+class StoredAudioWriter:
+    """Write s16le PCM to a content-addressed FLAC file from a background thread.
+
+    `write` hashes and enqueues; `close` returns the final path right away
+    (the file appears there once the background thread has finished).
+    """
+
+    _SENTINEL = None
+
+    def __init__(self, folder, prefix, samplerate, channels=1, on_done=None):
+        self.folder = folder
+        self.prefix = prefix
+        self.samplerate = samplerate
+        self.channels = channels
+        self.path = None
+        self.error = None
+        # False when identical audio was already stored under the same name
+        self.created = False
+        self._tmp = os.path.join(folder, f'.{prefix}-{uuid.uuid4().hex}.flac{PART_SUFFIX}')
+        self._hash = hashlib.sha256()
+        self._on_done = on_done
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        import soundfile as sf
+
+        try:
+            with sf.SoundFile(self._tmp, mode='w', samplerate=self.samplerate, channels=self.channels,
+                              format='FLAC', subtype='PCM_16') as f:
+                while True:
+                    data = self._queue.get()
+                    if data is self._SENTINEL:
+                        break
+                    f.write(np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels))
+            if os.path.exists(self.path):
+                # same audio stored before; refresh its age instead of a second copy
+                os.remove(self._tmp)
+                os.utime(self.path)
+            else:
+                os.replace(self._tmp, self.path)
+                self.created = True
+        except Exception as e:
+            self.error = e
+            print(f'⚠️  Failed to save {self.path or self._tmp}: {e}')
+            try:
+                os.remove(self._tmp)
+            except OSError:
+                pass
+        if self._on_done is not None:
+            try:
+                self._on_done(self)
+            except Exception:
+                pass
+
+    def write(self, data):
+        if data and self.error is None:
+            self._hash.update(data)
+            self._queue.put(bytes(data))
+
+    def close(self, wait=False):
+        """Finish the file; returns its final path."""
+        if self.path is None:
+            digest = self._hash.hexdigest()[:24]
+            self.path = os.path.join(self.folder, f'{self.prefix}_{digest}.flac')
+            self._queue.put(self._SENTINEL)
+        if wait:
+            self._thread.join()
+        return self.path
+
+
+class AudioStorage:
+    """Content-addressed, compressed, quota-managed audio folders.
+
+    `index` is the RecordingsIndex covering the folders; stored files are
+    added to it when written and removed when evicted.
+    """
+
+    def __init__(self, index, quota_mb=DEFAULT_QUOTA_MB, max_age_days=DEFAULT_MAX_AGE_DAYS,
+                 interval=DEFAULT_INTERVAL):
+        self.index = index
+        self.quota = int(quota_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400.0
+        self.interval = interval
+        self.evicted = 0
+        self.compressed = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        # WAV files the janitor found it cannot compress (float samples etc.), oldest first
+        self._skip_compress = {}
+
+    def writer(self, folder, prefix, samplerate, channels=1):
+        """Return a StoredAudioWriter whose file is indexed when complete."""
+        self.start()
+        return StoredAudioWriter(folder, prefix, samplerate, channels, on_done=self._stored)
+
+    def _stored(self, writer):
+        if writer.error is not None:
+            if writer.path is not None:
+                self.index.remove(writer.path)
+        else:
+            try:
+                self.index.add_file(writer.path)
+            except Exception as e:
+                print(f'⚠️  Failed to index {writer.path}: {e}')
+            if self.quota and writer.created:
+                # let the janitor check the quota soon rather than on its next pass
+                self._wake.set()
+
+    # -- janitor -------------------------------------------------------------
+
+    def start(self):
+        """Start the background janitor thread (idempotent)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._janitor, daemon=True)
+                self._thread.start()
+
+    def _janitor(self):
+        while True:
+            try:
+                self.cleanup()
+            except Exception as e:
+                print(f'⚠️  Storage cleanup failed: {e}')
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _delete(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        self.index.remove(path)
+        self.evicted += 1
+
+    def _remove_stale_parts(self, now):
+        for folder in self.index.folders.values():
+            try:
+                entries = list(os.scandir(folder))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.name.endswith(PART_SUFFIX) and now - entry.stat().st_mtime > 3600:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def compress_wav(self, path):
+        """Re-encode a PCM WAV file as FLAC next to it; returns the new path or None."""
+        import soundfile as sf
+
+        try:
+            info = sf.info(path)
+        except Exception:
+            return None
+        if info.format != 'WAV' or info.subtype not in ('PCM_16', 'PCM_24'):
+            return None
+        target = os.path.splitext(path)[0] + '.flac'
+        if os.path.exists(target):
+            return None
+        tmp = target + PART_SUFFIX
+        with sf.SoundFile(path) as src, sf.SoundFile(tmp, mode='w', samplerate=src.samplerate,
+                                                     channels=src.channels, format='FLAC',
+                                                     subtype=info.subtype) as dst:
+            for block in src.blocks(blocksize=65536, dtype='int32'):
+                dst.write(block)
+        # keep the original timestamps so listing order and eviction age don't change
+        st = os.stat(path)
+        os.utime(tmp, (st.st_atime, st.st_mtime))
+        os.replace(tmp, target)
+        self.index.rename(path, target)
+        os.remove(path)
+        self.compressed += 1
+        return target
+
+    def _skip(self, path):
+        self._skip_compress[path] = True
+        while len(self._skip_compress) > _MAX_SKIP_COMPRESS:
+            del self._skip_compress[next(iter(self._skip_compress))]
+
+    def cleanup(self, compress_limit=50):
+        """One janitor pass; returns a dict of what it did."""
+        now = time.time()
+        evicted, compressed = self.evicted, self.compressed
+        self.index.refresh()
+        self._remove_stale_parts(now)
+        # forget files that were deleted since
+        self._skip_compress = {p: True for p in self._skip_compress if os.path.exists(p)}
+
+        candidates = self.index.oldest(compress_limit + len(self._skip_compress),
+                                       before=now - _GRACE_SECONDS, suffix='.wav')
+        for path in [p for p in candidates if p not in self._skip_compress][:compress_limit]:
+            try:
+                if self.compress_wav(path) is None:
+                    self._skip(path)
+            except Exception as e:
+                self._skip(path)
+                print(f'⚠️  Failed to compress {path}: {e}')
+
+        if self.max_age:
+            while True:
+                expired = self.index.oldest(500, before=now - self.max_age)
+                if not expired:
+                    break
+                for path in expired:
+                    self._delete(path)
+
+        if self.quota:
+            total = self.index.total_size()
+            while total > self.quota:
+                victims = self.index.oldest(100, before=now - _GRACE_SECONDS)
+                if not victims:
+                    break
+                for path in victims:
+                    try:
+                        size = os.path.getsize(path)
+                    except OSError:
+                        size = 0
+                    self._delete(path)
+                    total -= size
+                    if total <= self.quota:
+                        break
+                total = self.index.total_size()
+
+        return {'evicted': self.evicted - evicted, 'compressed': self.compressed - compressed,
+                'total_bytes': self.index.total_size()}
+
+    def stats(self):
+        return {
+            'total_bytes': self.index.total_size(),
+            'quota_bytes': self.quota,
+            'max_age_days': self.max_age / 86400.0,
+            'evicted': self.evicted,
+            'compressed': self.compressed,
+        }
@@ -1,25 +1,53 @@
+"""Audio helpers: recording, waveform/spectrogram rendering and analysis.
+
+Heavy or platform-specific dependencies (matplotlib, sounddevice,
+soundfile, the Android recorder) are imported on first use, so servers and
+tools that only need part of this module don't pay for the rest at startup.
+"""
+import importlib
 import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from functools import lru_cache
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from kivy.utils import platform as kivy_platform
-
-# Try to import desktop audio libs; on Android these will not be available
-try:
-    import sounddevice as sd
-    import soundfile as sf
-except Exception:
-    sd = None
-    sf = None
-
-# Android helper - only import if on Android to avoid import errors on desktop
-android_recorder = None
-if kivy_platform == 'android':
-    try:
-        from android_audio import recorder as android_recorder
-    except Exception:
-        android_recorder = None
+
+# Same environment checks kivy.utils.platform makes for Android, without importing kivy
+# (KIVY_BUILD wins, then P4A_BOOTSTRAP, then the older ANDROID_ARGUMENT)
+_KIVY_BUILD = os.environ.get('KIVY_BUILD', '')
+ON_ANDROID = _KIVY_BUILD == 'android' or (_KIVY_BUILD != 'ios' and (
+    'P4A_BOOTSTRAP' in os.environ or 'ANDROID_ARGUMENT' in os.environ))
+
+_modules = {}
+
+
+def _optional(name):
+    """Import module `name` on first use; None if it is not available here
+    (e.g. the desktop audio libs on Android)."""
+    if name not in _modules:
+        try:
+            _modules[name] = importlib.import_module(name)
+        except Exception:
+            _modules[name] = None
+    return _modules[name]
+
+
+def _android_recorder():
+    """The native Android recorder, or None off Android."""
+    if not ON_ANDROID:
+        return None
+    module = _optional('android_audio')
+    return module.recorder if module is not None else None
+
+
+def _pyplot():
+    """matplotlib.pyplot on the non-interactive Agg backend."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
 
 
 def record_wav(path, duration=5, samplerate=16000, channels=1):
@@ -27,16 +55,17 @@ def record_wav(path, duration=5, samplerate=16000, channels=1):
 
     This function blocks for `duration` seconds while recording.
     """
-    if kivy_platform == 'android' and android_recorder is not None:
+    android_recorder = _android_recorder()
+    if android_recorder is not None:
         # On Android, use MediaRecorder to write a 3gp container file.
         # We change extension to .3gp for Android native recording.
         out_path = os.path.splitext(path)[0] + '.3gp'
         android_recorder.start(out_path)
-        import time
         time.sleep(duration)
         android_recorder.stop()
         return out_path
 
+    sd, sf = _optional('sounddevice'), _optional('soundfile')
     if sd is None or sf is None:
         raise RuntimeError('sounddevice/soundfile not available in this environment')
 
@@ -47,26 +76,338 @@ def record_wav(path, duration=5, samplerate=16000, channels=1):
 
 
 def load_wav(path):
+    sf = _optional('soundfile')
     if sf is None:
         raise RuntimeError('soundfile not available to read audio on this platform')
-    data, sr = sf.read(path)
+    data, sr = sf.read(path, dtype='float32')
     # Ensure mono
     if data.ndim > 1:
-        data = np.mean(data, axis=1)
+        data = np.mean(data, axis=1, dtype=np.float32)
     return data, sr
 
 
-def make_waveform_and_spectrogram(wav_path, out_wave_img, out_spec_img):
+def _reduce_block(block, offset, total, width, lo, hi):
+    """Fold samples `block` (starting at sample `offset` of `total`) into the
+    per-column envelope arrays `lo`/`hi` of length `width`."""
+    if len(block) == 0:
+        return
+    # column of the first and last sample, and where columns start in the block
+    first = offset * width // total
+    last = (offset + len(block) - 1) * width // total
+    starts = (np.arange(first + 1, last + 1, dtype=np.int64) * total + width - 1) // width - offset
+    starts = np.concatenate([[0], starts])
+    cols = slice(first, last + 1)
+    np.minimum(lo[cols], np.minimum.reduceat(block, starts), out=lo[cols])
+    np.maximum(hi[cols], np.maximum.reduceat(block, starts), out=hi[cols])
+
+
+def minmax_envelope(samples, width):
+    """Per-column (min, max) of mono `samples` for a `width`-column waveform.
+
+    Returns two float32 arrays of min(width, len(samples)) values each.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    width = max(1, min(width, len(samples)))
+    lo = np.full(width, np.inf, dtype=np.float32)
+    hi = np.full(width, -np.inf, dtype=np.float32)
+    if len(samples):
+        _reduce_block(samples, 0, len(samples), width, lo, hi)
+    else:
+        lo[:] = hi[:] = 0.0
+    return lo, hi
+
+
+def file_envelope(path, width, block_frames=1 << 16):
+    """Like `minmax_envelope` for a sound file, read blockwise in float32.
+
+    Returns (lo, hi, samplerate, frames); memory does not grow with the file.
+    """
+    sf = _optional('soundfile')
+    if sf is None:
+        raise RuntimeError('soundfile not available to read audio on this platform')
+    with sf.SoundFile(path) as f:
+        total, sr = f.frames, f.samplerate
+        width = max(1, min(width, total))
+        lo = np.full(width, np.inf, dtype=np.float32)
+        hi = np.full(width, -np.inf, dtype=np.float32)
+        offset = 0
+        for block in f.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+            mono = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1, dtype=np.float32)
+            _reduce_block(mono, offset, total, width, lo, hi)
+            offset += len(mono)
+    if total == 0:
+        lo[:] = hi[:] = 0.0
+    return lo, hi, sr, total
+
+
+def write_png(path, rgb):
+    """Write an (height, width, 3) uint8 array as an 8-bit RGB PNG."""
+    rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+    height, width = rgb.shape[:2]
+    # every scanline is prefixed with filter type 0 (None)
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgb.reshape(height, width * 3)
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+        f.write(chunk(b'IEND', b''))
+
+
+def render_waveform_png(src, out_png, width=800, height=200, color=(25, 118, 210), background=(255, 255, 255)):
+    """Render a waveform straight to PNG from a min/max envelope.
+
+    `src` is a sound file path or an array of mono samples in [-1, 1].
+    Only `width` columns are drawn, so the cost of drawing does not depend on
+    the length of the audio; no matplotlib figure is involved.
+    """
+    if isinstance(src, (str, os.PathLike)):
+        lo, hi = file_envelope(src, width)[:2]
+    else:
+        lo, hi = minmax_envelope(src, width)
+    # stretch to the requested width when there are fewer samples than columns
+    cols = np.arange(width) * len(lo) // width
+    lo, hi = lo[cols], hi[cols]
+
+    mid = (height - 1) / 2.0
+    top = np.floor(mid - np.clip(hi, -1.0, 1.0) * mid).astype(np.int32)
+    bottom = np.ceil(mid - np.clip(lo, -1.0, 1.0) * mid).astype(np.int32)
+    rows = np.arange(height, dtype=np.int32)[:, None]
+    mask = (rows >= top) & (rows <= bottom)
+
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[:] = background
+    img[mask] = color
+    write_png(out_png, img)
+    return out_png
+
+
+@lru_cache(maxsize=16)
+def hann_window(n_fft):
+    """Periodic Hann window of length `n_fft` (float32, cached, read-only)."""
+    w = (0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+    w.flags.writeable = False
+    return w
+
+
+def _hz_to_mel(hz):
+    return 2595.0 * np.log10(1.0 + np.asarray(hz, dtype=np.float64) / 700.0)
+
+
+def _mel_to_hz(mel):
+    return 700.0 * (10.0 ** (np.asarray(mel, dtype=np.float64) / 2595.0) - 1.0)
+
+
+@lru_cache(maxsize=16)
+def mel_filterbank(samplerate, n_fft, n_mels=64, fmin=0.0, fmax=None):
+    """Triangular (HTK) mel filterbank, shape (n_mels, n_fft // 2 + 1), float32, cached."""
+    fmax = samplerate / 2.0 if fmax is None else fmax
+    bins = np.fft.rfftfreq(n_fft, 1.0 / samplerate)
+    edges = _mel_to_hz(np.linspace(_hz_to_mel(fmin), _hz_to_mel(fmax), n_mels + 2))
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (bins - lower) / np.maximum(center - lower, 1e-10)
+    falling = (upper - bins) / np.maximum(upper - center, 1e-10)
+    fb = np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+    fb.flags.writeable = False
+    return fb
+
+
+def _pcm_reader(path):
+    """Return (read, total_frames, samplerate, close) for a sound file.
+
+    16-bit PCM WAV is memory-mapped; other formats are read through soundfile.
+    read(start, length) returns `length` mono float32 samples, zero-padded
+    past the end of the file.
+    """
+    from wav_stream import WavStreamReader, WavFormatError
+
+    try:
+        with open(path, 'rb') as f:
+            wf = WavStreamReader(f)
+        mappable = wf.getsampwidth() == 2 and wf.getcomptype() == 'NONE'
+    except WavFormatError:
+        mappable = False
+
+    if mappable:
+        nch = wf.getnchannels()
+        offset = wf.data_offset
+        total = (os.path.getsize(path) - offset) // (2 * nch)
+        if wf.data_size is not None:
+            total = min(total, wf.data_size // (2 * nch))
+        pcm = np.memmap(path, dtype='<i2', mode='r', offset=offset, shape=(total, nch))
+
+        def read(start, length):
+            block = pcm[start:start + length]
+            out = np.zeros(length, dtype=np.float32)
+            if nch == 1:
+                out[:len(block)] = block[:, 0]
+            else:
+                out[:len(block)] = block.mean(axis=1, dtype=np.float32)
+            out *= 1.0 / 32768
+            return out
+
+        return read, total, wf.getframerate(), lambda: None
+
+    sf = _optional('soundfile')
+    if sf is None:
+        raise RuntimeError('soundfile not available to read audio on this platform')
+    f = sf.SoundFile(path)
+
+    def read(start, length):
+        f.seek(min(start, f.frames))
+        block = f.read(length, dtype='float32', always_2d=True)
+        out = np.zeros(length, dtype=np.float32)
+        out[:len(block)] = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1, dtype=np.float32)
+        return out
+
+    return read, f.frames, f.samplerate, f.close
+
+
+def stft_frame_count(total, n_fft, hop):
+    """Number of STFT frames for `total` samples (the last frame is zero-padded)."""
+    return 1 + max(0, total - n_fft + hop - 1) // hop if total else 0
+
+
+def stft_power(read, total, n_fft=512, hop=160, chunk_frames=1024):
+    """Yield power spectra (frames, n_fft // 2 + 1) chunk by chunk.
+
+    `read(start, length)` supplies mono float32 samples (see `_pcm_reader`);
+    `chunk_frames` STFT frames are computed per step, so memory is bounded
+    by the chunk size rather than the signal length.
+    """
+    window = hann_window(n_fft)
+    n_frames = stft_frame_count(total, n_fft, hop)
+    for f0 in range(0, n_frames, chunk_frames):
+        f1 = min(n_frames, f0 + chunk_frames)
+        x = read(f0 * hop, (f1 - f0 - 1) * hop + n_fft)
+        frames = np.lib.stride_tricks.sliding_window_view(x, n_fft)[::hop] * window
+        spec = np.fft.rfft(frames, axis=1)
+        yield (spec.real ** 2 + spec.imag ** 2).astype(np.float32)
+
+
+class SpectrogramTooLarge(ValueError):
+    """The requested spectrogram exceeds the caller's size limit."""
+
+
+def _sample_reader(src, samplerate):
+    """(read, total, samplerate, close) for a sound file path or an array of mono samples."""
+    if isinstance(src, (str, os.PathLike)):
+        return _pcm_reader(src)
+    data = np.asarray(src, dtype=np.float32)
+
+    def read(start, length):
+        out = np.zeros(length, dtype=np.float32)
+        block = data[start:start + length]
+        out[:len(block)] = block
+        return out
+
+    return read, len(data), samplerate, lambda: None
+
+
+def _log_power(read, total, samplerate, n_fft, hop, n_mels, chunk_frames):
+    """Yield float32 dB chunks (frames, bins) of the (mel) power spectrum."""
+    fb = mel_filterbank(samplerate, n_fft, n_mels) if n_mels else None
+    for power in stft_power(read, total, n_fft, hop, chunk_frames):
+        if fb is not None:
+            power = power @ fb.T
+        power += 1e-10
+        np.log10(power, out=power)
+        power *= 10.0
+        yield power
+
+
+def spectrogram(src, samplerate=None, n_fft=512, hop=160, n_mels=None, chunk_frames=1024):
+    """Log-power spectrogram in dB, shape (frames, bins), float32.
+
+    `src` is a sound file path (processed chunk by chunk from a memory map
+    where possible) or an array of mono samples with its `samplerate`.
+    With `n_mels` the linear bins are folded into a mel filterbank.
+    Returns (spec_db, samplerate).
+    """
+    read, total, samplerate, close = _sample_reader(src, samplerate)
+    spec = np.empty((stft_frame_count(total, n_fft, hop), n_mels or n_fft // 2 + 1), dtype=np.float32)
+    row = 0
+    try:
+        for db in _log_power(read, total, samplerate, n_fft, hop, n_mels, chunk_frames):
+            spec[row:row + len(db)] = db
+            row += len(db)
+    finally:
+        close()
+    return spec, samplerate
+
+
+def _quantize_into(db, min_db, dynamic_range, out):
+    """Write uint8 codes for `db` into `out`, scaling `db` in place."""
+    db -= min_db
+    db *= 255.0 / dynamic_range
+    np.rint(db, out=db)
+    np.clip(db, 0, 255, out=db)
+    out[...] = db
+
+
+def quantize_db(spec_db, dynamic_range=80.0):
+    """Map dB values to uint8 over the top `dynamic_range` dB.
+
+    Returns (codes, min_db, max_db); value = min_db + code / 255 * (max_db - min_db).
+    """
+    max_db = float(spec_db.max()) if spec_db.size else 0.0
+    min_db = max_db - dynamic_range
+    codes = np.empty(spec_db.shape, dtype=np.uint8)
+    _quantize_into(np.array(spec_db, dtype=np.float32), min_db, dynamic_range, codes)
+    return codes, min_db, max_db
+
+
+def spectrogram_codes(src, samplerate=None, n_fft=512, hop=160, n_mels=None, dynamic_range=80.0,
+                      chunk_frames=1024, max_cells=None):
+    """`spectrogram` followed by `quantize_db`, without the float32 array.
+
+    The input is read twice: once for the peak dB, then again to quantize
+    each chunk straight into the uint8 result, so memory is one byte per
+    cell plus a chunk. Raises SpectrogramTooLarge before any work if the
+    result would exceed `max_cells` cells.
+    Returns (codes, min_db, max_db, samplerate).
+    """
+    read, total, samplerate, close = _sample_reader(src, samplerate)
+    try:
+        shape = (stft_frame_count(total, n_fft, hop), n_mels or n_fft // 2 + 1)
+        if max_cells is not None and shape[0] * shape[1] > max_cells:
+            raise SpectrogramTooLarge(f'Spectrogram of {shape[0]} x {shape[1]} exceeds {max_cells} cells; '
+                                      'use a larger hop or fewer mels')
+        max_db = None
+        for db in _log_power(read, total, samplerate, n_fft, hop, n_mels, chunk_frames):
+            peak = float(db.max())
+            max_db = peak if max_db is None else max(max_db, peak)
+        max_db = 0.0 if max_db is None else max_db
+        min_db = max_db - dynamic_range
+
+        codes = np.empty(shape, dtype=np.uint8)
+        row = 0
+        for db in _log_power(read, total, samplerate, n_fft, hop, n_mels, chunk_frames):
+            _quantize_into(db, min_db, dynamic_range, codes[row:row + len(db)])
+            row += len(db)
+    finally:
+        close()
+    return codes, min_db, max_db, samplerate
+
+
+def make_waveform_and_spectrogram(wav_path, out_wave_img, out_spec_img, width=800):
     """Generate waveform and spectrogram images from a WAV file.
 
-    Saves two PNGs: waveform and spectrogram.
+    Saves two PNGs: waveform and spectrogram. The waveform is drawn from a
+    `width`-column min/max envelope rather than every sample.
     """
     data, sr = load_wav(wav_path)
-    times = np.arange(len(data)) / float(sr)
+    plt = _pyplot()
+    lo, hi = minmax_envelope(data, width)
+    times = np.arange(len(lo), dtype=np.float32) * (len(data) / float(sr * len(lo)))
 
     # Waveform
     plt.figure(figsize=(8, 3))
-    plt.plot(times, data, linewidth=0.6)
+    plt.fill_between(times, lo, hi, linewidth=0.6)
     plt.xlabel('Time (s)')
     plt.ylabel('Amplitude')
     plt.title('Waveform')
@@ -75,8 +416,10 @@ def make_waveform_and_spectrogram(wav_path, out_wave_img, out_spec_img):
     plt.close()
 
     # Spectrogram
+    spec, _ = spectrogram(data, sr, n_fft=1024, hop=512)
     plt.figure(figsize=(8, 3))
-    plt.specgram(data, NFFT=1024, Fs=sr, noverlap=512, cmap='viridis')
+    plt.imshow(spec.T, origin='lower', aspect='auto', cmap='viridis',
+               extent=(0, len(data) / float(sr), 0, sr / 2.0))
     plt.xlabel('Time (s)')
     plt.ylabel('Frequency (Hz)')
     plt.title('Spectrogram')
@@ -86,24 +429,111 @@ def make_waveform_and_spectrogram(wav_path, out_wave_img, out_spec_img):
     plt.close()
 
 
+class RingBuffer:
+    """Fixed-size single-producer/single-consumer ring of audio frames.
+
+    The producer (the PortAudio callback) only copies into preallocated
+    memory and bumps a counter; no locks, no allocation, no I/O. The consumer
+    (a writer thread) drains it in large batches. Counters are monotonically
+    increasing frame indices, so each side only ever writes its own index.
+    """
+
+    def __init__(self, capacity, channels=1, dtype=np.int16):
+        self.capacity = int(capacity)
+        self.channels = channels
+        self._buf = np.zeros((self.capacity, channels), dtype=dtype)
+        self._written = 0
+        self._read = 0
+        # frames lost because the consumer fell behind
+        self.overruns = 0
+        self.dropped_frames = 0
+        # most frames ever waiting in the buffer
+        self.high_water = 0
+
+    def __len__(self):
+        return self._written - self._read
+
+    def write(self, block):
+        """Copy (frames, channels) `block` in; returns the frames stored."""
+        n = len(block)
+        free = self.capacity - (self._written - self._read)
+        if n > free:
+            self.overruns += 1
+            self.dropped_frames += n - free
+            n = free
+        start = self._written % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = block[:first]
+        self._buf[:n - first] = block[first:n]
+        self._written += n
+        self.high_water = max(self.high_water, self._written - self._read)
+        return n
+
+    def read_into(self, out):
+        """Move up to len(out) frames into `out`; returns the frame count."""
+        n = min(len(out), self._written - self._read)
+        start = self._read % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._buf[start:start + first]
+        out[first:n] = self._buf[:n - first]
+        self._read += n
+        return n
+
+
 class Recorder:
     """Non-blocking recorder using sounddevice.InputStream and soundfile.SoundFile.
 
+    The audio callback only copies captured int16 frames into a preallocated
+    RingBuffer; a writer thread drains it to the file in batches, so no disk
+    I/O or allocation happens on the real-time audio thread. `stats()`
+    reports buffer overruns, PortAudio input over/underflows and the
+    buffer's high-water mark.
+
+    With `live=True` the writer thread also hands each batch to a
+    recognizer thread, which transcribes while recording is still going on
+    (see streaming.StreamingSession). `on_partial(text)` and
+    `on_final(result)` are called from that thread; `result` is a dict with
+    'text', 'start' and 'end'. When `stop()` returns, `text` holds the
+    complete transcript.
+
     Usage:
         r = Recorder()
         r.start('out.wav')
         ...
         r.stop()
+        print(r.stats())
+
+        r.start('out.wav', live=True, on_partial=print)
+        ...
+        r.stop()
+        print(r.text)
     """
 
-    def __init__(self):
+    def __init__(self, buffer_seconds=10.0, flush_interval=0.1):
+        self.buffer_seconds = buffer_seconds
+        self.flush_interval = flush_interval
         self._sf = None
         self._stream = None
         self._path = None
+        self._ring = None
+        self._writer = None
+        self._stopping = False
+        self.input_overflows = 0
+        self.input_underflows = 0
+        self.error = None
+        self._live = None
+        self._recognizer = None
+        self.results = []
+
+    @property
+    def text(self):
+        """Transcript of the final results of the live recognizer so far."""
+        return ' '.join(r['text'] for r in self.results if r['text'])
 
-    def start(self, path, samplerate=16000, channels=1):
+    def start(self, path, samplerate=16000, channels=1, live=False, model=None, on_partial=None, on_final=None):
         # On Android use native recorder which records into a 3gp file
-        if kivy_platform == 'android' and android_recorder is not None:
+        android_recorder = _android_recorder()
+        if android_recorder is not None:
             if self._stream is not None:
                 raise RuntimeError('Recorder already running')
             out_path = os.path.splitext(path)[0] + '.3gp'
@@ -114,27 +544,119 @@ class Recorder:
             self._stream = True
             return
 
+        sd, sf = _optional('sounddevice'), _optional('soundfile')
         if sd is None or sf is None:
             raise RuntimeError('sounddevice/soundfile not available in this environment')
 
         if self._stream is not None:
             raise RuntimeError('Recorder already running')
+        if live and model is None:
+            from model_registry import registry
+            model = registry.get()
         self._path = path
         os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
         self._sf = sf.SoundFile(path, mode='w', samplerate=samplerate, channels=channels, subtype='PCM_16')
+        self._ring = ring = RingBuffer(int(self.buffer_seconds * samplerate), channels)
+        self._stopping = False
+        self.input_overflows = 0
+        self.input_underflows = 0
+        self.error = None
+        self.results = []
+        self._live = None
+        if live:
+            self._live = queue.Queue()
+            self._recognizer = threading.Thread(target=self._recognize,
+                                                args=(self._live, model, samplerate, on_partial, on_final),
+                                                daemon=True)
+            self._recognizer.start()
 
         def callback(indata, frames, time, status):
             if status:
-                # keep simple logging; avoid printing too often
-                print('Recorder status:', status)
-            # write a copy to avoid underlying buffer reuse issues
-            self._sf.write(indata.copy())
+                # counted, not printed: no I/O on the audio thread
+                if status.input_overflow:
+                    self.input_overflows += 1
+                if status.input_underflow:
+                    self.input_underflows += 1
+            ring.write(indata)
 
-        self._stream = sd.InputStream(samplerate=samplerate, channels=channels, callback=callback)
+        self._writer = threading.Thread(target=self._drain, args=(ring, self._sf), daemon=True)
+        self._writer.start()
+        self._stream = sd.InputStream(samplerate=samplerate, channels=channels, dtype='int16', callback=callback)
         self._stream.start()
 
+    def _drain(self, ring, sf_file):
+        """Writer thread: move batches from the ring buffer to the file."""
+        batch = np.empty((ring.capacity, ring.channels), dtype=np.int16)
+        while True:
+            # read the flag first so frames queued before stop() are still written
+            stopping = self._stopping
+            n = ring.read_into(batch)
+            if n:
+                if self._live is not None:
+                    block = batch[:n]
+                    if block.shape[1] > 1:
+                        block = block.sum(axis=1, dtype=np.int32) // block.shape[1]
+                    self._live.put(block.astype(np.int16).tobytes())
+                try:
+                    sf_file.write(batch[:n])
+                except Exception as e:
+                    self.error = e
+                    print(f'Recorder write failed: {e}')
+                    break
+            elif stopping:
+                break
+            else:
+                time.sleep(self.flush_interval)
+        if self._live is not None:
+            self._live.put(None)
+
+    def _recognize(self, chunks, model, samplerate, on_partial, on_final):
+        """Recognizer thread: transcribe batches from the writer as they arrive."""
+        from recognizer_pool import pool
+        from streaming import StreamingSession
+
+        def emit(msg):
+            if msg['type'] == 'partial':
+                if on_partial is not None:
+                    on_partial(msg['partial'])
+            else:
+                result = {'text': msg['text'], 'start': msg['start'], 'end': msg['end']}
+                self.results.append(result)
+                if on_final is not None:
+                    on_final(result)
+
+        try:
+            with pool.acquire(model, samplerate, words=True) as rec:
+                session = StreamingSession(rec, samplerate)
+                for pcm in iter(chunks.get, None):
+                    for msg in session.accept(pcm):
+                        emit(msg)
+                emit(session.finish())
+        except Exception as e:
+            self.error = e
+            print(f'Live transcription failed: {e}')
+            # keep draining so batches don't pile up in memory
+            for _ in iter(chunks.get, None):
+                pass
+
+    def stats(self):
+        """Buffer health counters for the current (or last) recording."""
+        ring = self._ring
+        if ring is None:
+            return {}
+        return {
+            'overruns': ring.overruns,
+            'dropped_frames': ring.dropped_frames,
+            'input_overflows': self.input_overflows,
+            'input_underflows': self.input_underflows,
+            'buffered_frames': len(ring),
+            'high_water_frames': ring.high_water,
+            'high_water_ratio': round(ring.high_water / float(ring.capacity), 3),
+        }
+
     def stop(self):
-        if kivy_platform == 'android' and android_recorder is not None and self._stream:
+        android_recorder = _android_recorder()
+        if android_recorder is not None and self._stream:
             # stop Android native recorder
             android_path = android_recorder.stop()
             self._stream = None
@@ -148,6 +670,15 @@ class Recorder:
             self._stream.close()
         finally:
             self._stream = None
+            # the callback has stopped; let the writer drain what is left
+            if self._writer is not None:
+                self._stopping = True
+                self._writer.join()
+                self._writer = None
+            # the writer has queued the last batch; wait for its transcript
+            if self._recognizer is not None:
+                self._recognizer.join()
+                self._recognizer = None
         if self._sf is not None:
             try:
                 self._sf.close()
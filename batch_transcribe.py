@@ -0,0 +1,232 @@
+"""Batch transcription of a directory (or manifest) of audio files.
+
+Files are distributed across a pool of worker processes; each worker loads the
+model once and keeps it for all of its files. Results are appended to a JSONL
+file as they complete, one object per file:
+
+    {"path": "...", "text": "...", "duration": 12.3, "elapsed": 1.1}
+    {"path": "...", "error": "..."}
+
+Re-running with the same output file resumes: files that already have a
+successful result are skipped, failed ones are retried.
+
+Usage:
+    python batch_transcribe.py recordings/ -o results.jsonl
+    python batch_transcribe.py manifest.txt -o results.jsonl --workers 8 --model vosk-model-small-en-us-0.15
+
+A manifest is a text file with one path per line, or a JSONL file with a
+"path" field per line.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.ogg', '.mp3', '.m4a', '.3gp', '.webm', '.opus')
+
+
+def find_audio_files(source, extensions=AUDIO_EXTENSIONS):
+    """Return the audio file paths in directory `source`, or listed in manifest `source`."""
+    if os.path.isdir(source):
+        paths = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(extensions):
+                    paths.append(os.path.join(root, name))
+        return paths
+
+    base = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                line = json.loads(line)['path']
+            paths.append(line if os.path.isabs(line) else os.path.join(base, line))
+    return paths
+
+
+def load_done(output):
+    """Return the set of paths that already have a successful result in `output`."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, encoding='utf-8') as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                # partial line from an interrupted run
+                continue
+            if 'error' not in row and 'path' in row:
+                done.add(row['path'])
+    return done
+
+
+# -- worker side -------------------------------------------------------------
+
+def _init_worker(model_name):
+    # Load the model once per worker; failures are reported per file
+    from model_registry import registry
+    try:
+        registry.get(model_name)
+    except Exception:
+        pass
+
+
+def transcribe_file(path, model_name=None):
+    """Transcribe one file (runs in a worker) and return its result row."""
+    import soundfile as sf
+    import audio_decode
+    import transcribe
+    from model_registry import registry
+
+    start = time.monotonic()
+    try:
+        model = registry.get(model_name)
+        try:
+            duration = sf.info(path).duration
+        except Exception:
+            duration = None
+        if duration is not None:
+            text = transcribe.transcribe_wav(path, model=model)
+        else:
+            # not readable by soundfile (compressed container); ffmpeg reads the file
+            # itself so it can seek (M4A/3GP with the index at the end)
+            pcm = audio_decode.ffmpeg_pcm_file(path)
+            nbytes = [0]
+
+            def counted(chunks):
+                for chunk in chunks:
+                    nbytes[0] += len(chunk)
+                    yield chunk
+
+            try:
+                text = transcribe.transcribe_pcm_stream(counted(pcm), audio_decode.TARGET_RATE, model=model)
+            finally:
+                pcm.close()
+            duration = nbytes[0] / 2.0 / audio_decode.TARGET_RATE
+        return {'path': path, 'text': text, 'duration': round(duration, 3),
+                'elapsed': round(time.monotonic() - start, 3)}
+    except Exception as e:
+        return {'path': path, 'error': f'{type(e).__name__}: {e}',
+                'elapsed': round(time.monotonic() - start, 3)}
+
+
+# -- driver ------------------------------------------------------------------
+
+class Progress:
+    """Throughput reporter (files/s and audio-seconds/s) printed to stderr."""
+
+    def __init__(self, total, interval=2.0, stream=sys.stderr):
+        self.total = total
+        self.interval = interval
+        self.stream = stream
+        self.files = 0
+        self.errors = 0
+        self.audio_seconds = 0.0
+        self.start = time.monotonic()
+        self._last = 0.0
+
+    def update(self, row, force=False):
+        self.files += 1
+        if 'error' in row:
+            self.errors += 1
+        else:
+            self.audio_seconds += row.get('duration') or 0.0
+        now = time.monotonic()
+        if force or now - self._last >= self.interval or self.files == self.total:
+            self._last = now
+            self.report()
+
+    def rates(self):
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        return self.files / elapsed, self.audio_seconds / elapsed
+
+    def report(self):
+        files_per_s, audio_per_s = self.rates()
+        eta = (self.total - self.files) / files_per_s if files_per_s else float('inf')
+        print(f'[{self.files}/{self.total}] {files_per_s:.2f} files/s, {audio_per_s:.1f} audio-s/s, '
+              f'{self.errors} errors, ETA {eta:.0f}s', file=self.stream)
+
+
+def run_batch(source, output, model_name=None, workers=None, resume=True, extensions=AUDIO_EXTENSIONS):
+    """Transcribe every file from `source` into JSONL `output`. Returns the Progress."""
+    paths = find_audio_files(source, extensions)
+    if resume:
+        done = load_done(output)
+        paths = [p for p in paths if p not in done]
+    elif os.path.exists(output):
+        os.remove(output)
+
+    progress = Progress(len(paths))
+    if not paths:
+        return progress
+
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    # don't glue the first new row onto a partial line from an interrupted run
+    partial_line = False
+    if os.path.exists(output) and os.path.getsize(output) > 0:
+        with open(output, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            partial_line = f.read(1) != b'\n'
+
+    with open(output, 'a', encoding='utf-8') as out:
+        if partial_line:
+            out.write('\n')
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_name,)) as executor:
+            pending = set()
+            todo = iter(paths)
+            # keep a bounded number of files queued so huge archives don't
+            # create millions of futures up front
+            window = workers * 4
+            while True:
+                for path in todo:
+                    pending.add(executor.submit(transcribe_file, path, model_name))
+                    if len(pending) >= window:
+                        break
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    row = fut.result()
+                    out.write(json.dumps(row, ensure_ascii=False) + '\n')
+                    out.flush()
+                    progress.update(row)
+    return progress
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Transcribe a directory or manifest of audio files to JSONL.')
+    parser.add_argument('source', help='directory to scan, or manifest file (one path per line or JSONL with "path")')
+    parser.add_argument('-o', '--output', default='transcripts.jsonl', help='JSONL output file (default: transcripts.jsonl)')
+    parser.add_argument('-m', '--model', default=None, help='model directory name under models/ (default: first found)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--no-resume', action='store_true', help='start over instead of skipping files already in the output')
+    parser.add_argument('--ext', default=','.join(AUDIO_EXTENSIONS), help='comma-separated extensions to pick up from directories')
+    args = parser.parse_args(argv)
+
+    from model_registry import registry
+    if not registry.find_model_dir(args.model):
+        print('No model found under models/. Please download a Vosk model as described in README.', file=sys.stderr)
+        return 3
+
+    extensions = tuple(e if e.startswith('.') else '.' + e for e in args.ext.lower().split(',') if e)
+    progress = run_batch(args.source, args.output, model_name=args.model, workers=args.workers,
+                         resume=not args.no_resume, extensions=extensions)
+    files_per_s, audio_per_s = progress.rates()
+    print(f'Done: {progress.files} files ({progress.errors} errors), {progress.audio_seconds:.1f} audio-s, '
+          f'{files_per_s:.2f} files/s, {audio_per_s:.1f} audio-s/s -> {args.output}', file=sys.stderr)
+    return 1 if progress.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""Startup-time benchmark with a budget.
+
+Each measurement runs in a fresh interpreter, so nothing is shared between
+runs and the module caches are cold the way they are for a new worker or an
+autoscaled instance:
+
+    import:<module>   time to import the module
+    ready:web_app     import + model warm-up until /health/ready answers 200 (Flask app)
+    ready:server      import + app startup + warm-up until /health/ready answers 200 (FastAPI)
+    worker_boot       spawn one transcription worker and run a first (empty) job
+
+Heavy optional dependencies (matplotlib, kivy, sounddevice, vosk) that an
+import pulls in are listed, since they are the usual cause of regressions.
+The median of `--runs` runs is compared with the budget; the exit status is
+1 if any measurement is over budget.
+
+Usage:
+    python bench_startup.py
+    python bench_startup.py --runs 7 --json startup.json
+    python bench_startup.py --budget import:web_app=400 --only import:
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+HEAVY_MODULES = ('matplotlib', 'kivy', 'sounddevice', 'soundfile', 'vosk')
+
+# default budgets in milliseconds
+BUDGETS_MS = {
+    'import:audio_utils': 200,
+    'import:transcribe': 200,
+    'import:audio_decode': 200,
+    'import:web_app': 400,
+    'import:server': 1000,
+    'ready:web_app': 3000,
+    'ready:server': 4000,
+    'worker_boot': 1500,
+}
+
+# seconds to wait for /health/ready before a ready:* measurement fails
+READY_TIMEOUT = 120
+
+_PRELUDE = '''
+import json, sys, time
+sys.path.insert(0, {here!r})
+
+def wait_ready(get, timeout={timeout!r}):
+    deadline = time.perf_counter() + timeout
+    while True:
+        resp = get('/health/ready')
+        if resp.status_code == 200:
+            return
+        body = resp.get_json() if hasattr(resp, 'get_json') else resp.json()
+        if body.get('state') == 'failed':
+            raise SystemExit('warm-up failed: %s' % body.get('error'))
+        if time.perf_counter() > deadline:
+            raise SystemExit('not ready after %s s' % timeout)
+        time.sleep(0.01)
+
+start = time.perf_counter()
+'''
+
+_EPILOGUE = '''
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{'ms': elapsed * 1000.0, 'heavy': heavy}}))
+'''
+
+_SCRIPTS = {
+    'ready:web_app': '''
+import web_app
+wait_ready(web_app.app.test_client().get)
+elapsed = time.perf_counter() - start
+''',
+    'ready:server': '''
+from fastapi.testclient import TestClient
+import server
+with TestClient(server.app) as client:
+    wait_ready(client.get)
+    elapsed = time.perf_counter() - start
+''',
+    'worker_boot': '''
+import asyncio, os
+import worker_pool
+pool = worker_pool.TranscriptionPool(workers=1, queue_size=0)
+try:
+    asyncio.run(pool.submit(os.getpid))
+    elapsed = time.perf_counter() - start
+finally:
+    pool.shutdown()
+''',
+}
+
+
+def _script(name):
+    # each script stops the clock itself, before any shutdown work
+    if name.startswith('import:'):
+        body = f'import {name.split(":", 1)[1]}\nelapsed = time.perf_counter() - start\n'
+    else:
+        body = _SCRIPTS[name]
+    return _PRELUDE.format(here=HERE, timeout=READY_TIMEOUT) + body + _EPILOGUE.format(heavy=HEAVY_MODULES)
+
+
+def measure(name, runs=5):
+    """Run measurement `name` `runs` times in fresh interpreters.
+
+    Returns a dict with the median/min/max in ms and the heavy modules loaded,
+    or with an 'error' if the measurement could not run here.
+    """
+    times = []
+    heavy = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, '-c', _script(name)], cwd=HERE,
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            tail = (proc.stderr.strip().splitlines() or ['failed'])[-1]
+            return {'name': name, 'error': tail}
+        row = json.loads(proc.stdout.strip().splitlines()[-1])
+        times.append(row['ms'])
+        heavy = row['heavy']
+    return {
+        'name': name,
+        'median_ms': round(statistics.median(times), 1),
+        'min_ms': round(min(times), 1),
+        'max_ms': round(max(times), 1),
+        'heavy_modules': heavy,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure import and first-request times against a budget.')
+    parser.add_argument('--runs', type=int, default=5, help='fresh-interpreter runs per measurement (default: 5)')
+    parser.add_argument('--only', default=None, help='only run measurements whose name starts with this prefix')
+    parser.add_argument('--budget', action='append', default=[], metavar='NAME=MS',
+                        help='override a budget, e.g. ready:server=1500 (repeatable)')
+    parser.add_argument('--json', default=None, help='also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    budgets = dict(BUDGETS_MS)
+    for item in args.budget:
+        name, _, ms = item.partition('=')
+        budgets[name] = float(ms)
+
+    results = []
+    over = 0
+    for name, budget in budgets.items():
+        if args.only and not name.startswith(args.only):
+            continue
+        row = measure(name, args.runs)
+        row['budget_ms'] = budget
+        if 'error' in row:
+            print(f'{name:<22} skipped: {row["error"]}')
+        else:
+            row['ok'] = row['median_ms'] <= budget
+            over += not row['ok']
+            heavy = ', '.join(row['heavy_modules']) or '-'
+            print(f'{name:<22} {row["median_ms"]:8.1f} ms  (budget {budget:.0f})  '
+                  f'{"ok" if row["ok"] else "OVER"}  heavy: {heavy}')
+        results.append(row)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'runs': args.runs, 'results': results}, f, indent=2)
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""Transcription benchmark suite with latency percentiles.
+
+Runs the pipeline stages on the WAV files in recordings/ and on synthetic
+audio of fixed lengths, and reports p50/p95/p99 of each:
+
+    model_load           load the Vosk model from disk (a fresh Model each run)
+    transcribe:<clip>    transcribe_wav on a 16 kHz mono clip; also the real-time
+                         factor (processing time / audio duration, lower is better)
+    decode:<clip>        audio_decode.normalize_pcm_stream to 16 kHz mono PCM:
+                         `pcm16` clips pass straight through, `resample` clips are
+                         44.1 kHz stereo float and are downmixed and resampled
+    render:<clip>        make_waveform_and_spectrogram (needs matplotlib)
+
+Each measurement has one untimed warm-up run. Results can be written as
+JSON and compared with an earlier run; the exit status is 1 if any p50 is
+more than `--threshold` times its baseline.
+
+Usage:
+    python bench_transcribe.py
+    python bench_transcribe.py --runs 20 --lengths 1,10,60 --json bench.json
+    python bench_transcribe.py --only transcribe: --compare bench.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RECORDINGS_DIR = os.path.join(HERE, 'recordings')
+
+DEFAULT_LENGTHS = (1, 5, 30)
+
+
+def percentiles(times):
+    """Return (p50, p95, p99) of `times` (linear interpolation)."""
+    return tuple(float(v) for v in np.percentile(np.asarray(times, dtype=np.float64), [50, 95, 99]))
+
+
+def synth_speechlike(seconds, samplerate=16000, seed=0):
+    """Float32 test signal: bursts of harmonic tones and noise separated by pauses.
+
+    It is not speech, but the recognizer and the VAD see a mix of voiced-like
+    frames and silence, which keeps timings closer to real recordings than
+    pure noise or a sine would.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * samplerate)
+    out = np.zeros(n, dtype=np.float32)
+    pos = 0
+    while pos < n:
+        burst = int(rng.uniform(0.3, 1.2) * samplerate)
+        t = np.arange(min(burst, n - pos), dtype=np.float32) / samplerate
+        f0 = rng.uniform(100, 250)
+        tone = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+        env = np.hanning(len(t)).astype(np.float32)
+        out[pos:pos + len(t)] = 0.2 * env * tone + 0.01 * rng.standard_normal(len(t))
+        pos += len(t) + int(rng.uniform(0.1, 0.5) * samplerate)
+    return out
+
+
+def prepare_clips(workdir, lengths, use_recordings=True):
+    """Write the benchmark inputs; returns a list of (name, path, seconds, kind)."""
+    import soundfile as sf
+
+    clips = []
+    if use_recordings:
+        for path in sorted(glob.glob(os.path.join(RECORDINGS_DIR, '*.wav'))):
+            info = sf.info(path)
+            clips.append((os.path.splitext(os.path.basename(path))[0], path, info.duration, 'pcm16'))
+    for seconds in lengths:
+        data = synth_speechlike(seconds)
+        path = os.path.join(workdir, f'synth_{seconds:g}s.wav')
+        sf.write(path, data, 16000, subtype='PCM_16')
+        clips.append((f'synth_{seconds:g}s', path, float(seconds), 'pcm16'))
+        # the same audio as a 44.1 kHz stereo float file, for the resampling path
+        hi = np.interp(np.arange(int(seconds * 44100)) * (16000 / 44100.0),
+                       np.arange(len(data)), data).astype(np.float32)
+        path = os.path.join(workdir, f'synth_{seconds:g}s_44k_stereo.wav')
+        sf.write(path, np.stack([hi, hi * 0.8], axis=1), 44100, subtype='FLOAT')
+        clips.append((f'synth_{seconds:g}s_44k_stereo', path, float(seconds), 'resample'))
+    return clips
+
+
+def _time_runs(fn, runs):
+    fn()  # warm-up
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _row(name, times, audio_seconds=None):
+    p50, p95, p99 = percentiles(times)
+    row = {
+        'name': name,
+        'runs': len(times),
+        'p50_ms': round(p50 * 1000.0, 2),
+        'p95_ms': round(p95 * 1000.0, 2),
+        'p99_ms': round(p99 * 1000.0, 2),
+        'mean_ms': round(sum(times) / len(times) * 1000.0, 2),
+    }
+    if audio_seconds:
+        row['audio_seconds'] = round(audio_seconds, 3)
+        row['rtf_p50'] = round(p50 / audio_seconds, 4)
+        row['rtf_p95'] = round(p95 / audio_seconds, 4)
+    return row
+
+
+def bench_model_load(model_dir, runs):
+    from model_registry import import_vosk
+
+    vosk = import_vosk()
+    if hasattr(vosk, 'SetLogLevel'):
+        vosk.SetLogLevel(-1)
+    # constructing Model directly bypasses the registry's cache
+    return _row('model_load', _time_runs(lambda: vosk.Model(model_dir), runs))
+
+
+def bench_transcribe(clip, model, runs):
+    import transcribe
+
+    name, path, seconds, _kind = clip
+    return _row(f'transcribe:{name}', _time_runs(lambda: transcribe.transcribe_wav(path, model=model), runs),
+                seconds)
+
+
+def bench_decode(clip, runs):
+    import audio_decode
+
+    name, path, seconds, kind = clip
+
+    def run():
+        for _ in audio_decode.normalize_pcm_stream(path, 16000):
+            pass
+
+    row = _row(f'decode:{name}', _time_runs(run, runs), seconds)
+    row['path'] = kind
+    return row
+
+
+def bench_render(clip, runs, workdir):
+    import audio_utils
+
+    name, path, seconds, _kind = clip
+    wave = os.path.join(workdir, 'wave.png')
+    spec = os.path.join(workdir, 'spec.png')
+    return _row(f'render:{name}',
+                _time_runs(lambda: audio_utils.make_waveform_and_spectrogram(path, wave, spec), runs), seconds)
+
+
+def compare(results, baseline_path, threshold):
+    """Attach the baseline p50 and ratio to each row; returns the number of regressions."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {row['name']: row for row in json.load(f).get('results', []) if 'p50_ms' in row}
+    regressions = 0
+    for row in results:
+        base = baseline.get(row['name'])
+        if base is None or 'p50_ms' not in row or not base['p50_ms']:
+            continue
+        row['baseline_p50_ms'] = base['p50_ms']
+        row['ratio'] = round(row['p50_ms'] / base['p50_ms'], 3)
+        row['regression'] = row['ratio'] > threshold
+        regressions += row['regression']
+    return regressions
+
+
+def _print_row(row):
+    if 'error' in row:
+        print(f'{row["name"]:<40} skipped: {row["error"]}')
+        return
+    line = f'{row["name"]:<40} p50 {row["p50_ms"]:9.2f}  p95 {row["p95_ms"]:9.2f}  p99 {row["p99_ms"]:9.2f} ms'
+    if 'rtf_p50' in row:
+        line += f'  rtf {row["rtf_p50"]:.4f}'
+    if 'ratio' in row:
+        line += f'  x{row["ratio"]:.2f}{" REGRESSION" if row["regression"] else ""}'
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark model load, transcription, decoding and rendering.')
+    parser.add_argument('--model', default=None, help='model name or directory (default: first model under models/)')
+    parser.add_argument('--runs', type=int, default=10, help='timed runs per measurement (default: 10)')
+    parser.add_argument('--load-runs', type=int, default=3, help='timed model loads (default: 3)')
+    parser.add_argument('--lengths', default=','.join(str(s) for s in DEFAULT_LENGTHS),
+                        help='synthetic clip lengths in seconds, comma-separated (default: 1,5,30)')
+    parser.add_argument('--no-recordings', action='store_true', help='skip the WAV files in recordings/')
+    parser.add_argument('--only', default=None, help='only run measurements whose name starts with this prefix')
+    parser.add_argument('--json', default=None, help='write the results to this JSON file')
+    parser.add_argument('--compare', default=None, metavar='BASELINE.json', help='compare p50s with an earlier --json run')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='p50 / baseline ratio counted as a regression (default: 1.2)')
+    args = parser.parse_args(argv)
+
+    lengths = [float(s) for s in args.lengths.split(',') if s.strip()]
+
+    def wanted(name):
+        return not args.only or name.startswith(args.only)
+
+    def run(name, fn, *fn_args):
+        try:
+            row = fn(*fn_args)
+        except Exception as e:
+            row = {'name': name, 'error': f'{type(e).__name__}: {e}'}
+        _print_row(row)
+        results.append(row)
+
+    import model_registry
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix='bench_transcribe_')
+    try:
+        clips = prepare_clips(workdir, lengths, use_recordings=not args.no_recordings)
+        # an explicit directory is fine here: this is a local tool, not a server
+        if args.model and os.path.isdir(args.model):
+            model_dir = args.model
+        else:
+            model_dir = model_registry.find_model_dir(args.model)
+
+        if wanted('model_load'):
+            if model_dir:
+                run('model_load', bench_model_load, model_dir, args.load_runs)
+            else:
+                run('model_load', lambda: {'name': 'model_load', 'error': 'no model found under models/'})
+
+        if any(wanted(f'transcribe:{c[0]}') for c in clips):
+            try:
+                model = model_registry.registry.load(model_dir) if model_dir else None
+            except Exception as e:
+                model = None
+                print(f'⚠️  Could not load model: {e}')
+            for clip in clips:
+                name = f'transcribe:{clip[0]}'
+                if clip[3] != 'pcm16' or not wanted(name):
+                    continue
+                if model is None:
+                    run(name, lambda: {'name': name, 'error': 'model not available'})
+                else:
+                    run(name, bench_transcribe, clip, model, args.runs)
+
+        for clip in clips:
+            if wanted(f'decode:{clip[0]}'):
+                run(f'decode:{clip[0]}', bench_decode, clip, args.runs)
+
+        for clip in clips:
+            if clip[3] == 'pcm16' and wanted(f'render:{clip[0]}'):
+                run(f'render:{clip[0]}', bench_render, clip, args.runs, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    regressions = 0
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        print()
+        for row in results:
+            if row.get('regression'):
+                _print_row(row)
+        print(f'{regressions} regression(s) against {args.compare} (threshold x{args.threshold:g})')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'machine': platform.machine(),
+                'model': os.path.basename(os.path.normpath(model_dir)) if model_dir else None,
+                'runs': args.runs,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': results,
+            }, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
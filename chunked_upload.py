@@ -0,0 +1,119 @@
+"""Resumable chunked uploads.
+
+Large recordings can be sent in pieces: the client creates an upload, PUTs
+raw byte ranges to it in order (each with its `offset`, so a retried chunk
+is detected instead of being appended twice) and then asks for the
+assembled file to be transcribed. Chunks are copied from the request stream
+to disk in blocks; a chunk is never held in memory whole.
+
+Configuration (environment):
+    UPLOAD_MAX_MB         largest accepted upload (default: 512)
+    UPLOAD_MAX_AGE_HOURS  unfinished uploads are deleted after this (default: 24)
+"""
+import os
+import re
+import threading
+import time
+import uuid
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get('UPLOAD_MAX_MB', '512')) * 1024 * 1024)
+DEFAULT_MAX_AGE = float(os.environ.get('UPLOAD_MAX_AGE_HOURS', '24')) * 3600.0
+
+_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+_COPY_BLOCK = 1 << 20
+
+
+class UploadNotFound(KeyError):
+    """Raised for an unknown (or expired) upload id."""
+
+
+class OffsetMismatch(ValueError):
+    """Raised when a chunk does not start at the current end of the upload.
+
+    `size` is the number of bytes the server has, so the client can resume.
+    """
+
+    def __init__(self, size):
+        super().__init__(f'Chunk offset does not match upload size {size}')
+        self.size = size
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UploadStore:
+    """Upload parts kept as files under `root`."""
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    def path(self, upload_id):
+        if not _ID_RE.match(upload_id or ''):
+            raise UploadNotFound(upload_id)
+        path = os.path.join(self.root, upload_id + '.part')
+        if not os.path.exists(path):
+            raise UploadNotFound(upload_id)
+        return path
+
+    def _id_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def create(self):
+        """Start a new upload and return its id."""
+        os.makedirs(self.root, exist_ok=True)
+        self.cleanup()
+        upload_id = uuid.uuid4().hex
+        open(os.path.join(self.root, upload_id + '.part'), 'wb').close()
+        return upload_id
+
+    def size(self, upload_id):
+        return os.path.getsize(self.path(upload_id))
+
+    def append(self, upload_id, offset, stream):
+        """Append the bytes of `stream` at `offset`; returns the new size.
+
+        Raises OffsetMismatch if `offset` is not the current size, and
+        UploadTooLarge if the upload would exceed the size limit (the partial
+        chunk is discarded).
+        """
+        path = self.path(upload_id)
+        with self._id_lock(upload_id):
+            with open(path, 'r+b') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if offset != size:
+                    raise OffsetMismatch(size)
+                while True:
+                    block = stream.read(_COPY_BLOCK)
+                    if not block:
+                        break
+                    if f.tell() + len(block) > self.max_bytes:
+                        f.truncate(size)
+                        raise UploadTooLarge(f'Upload exceeds {self.max_bytes // (1024 * 1024)} MB')
+                    f.write(block)
+                return f.tell()
+
+    def discard(self, upload_id):
+        try:
+            os.remove(self.path(upload_id))
+        except (UploadNotFound, FileNotFoundError):
+            pass
+        with self._lock:
+            self._locks.pop(upload_id, None)
+
+    def cleanup(self):
+        """Delete uploads that have not been written to for `max_age` seconds."""
+        now = time.time()
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.name.endswith('.part') and now - entry.stat().st_mtime > self.max_age:
+                self.discard(entry.name[:-len('.part')])
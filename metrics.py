@@ -0,0 +1,326 @@
+"""Prometheus-style metrics for the transcription servers.
+
+A small dependency-free implementation of counters, gauges and histograms
+with labels, rendered in the Prometheus text exposition format (version
+0.0.4) by `render()`. Updating a metric is a dict lookup and an addition
+under a per-metric lock, so instrumentation can stay on in production.
+Values that other components already count (queue depth, cache hits) are
+read when /metrics is scraped, through callback metrics, rather than
+being updated on every request.
+
+Per-request stage timings are collected with `Stages` and observed into
+the `stt_stage_seconds` histogram:
+
+    model       waiting for / loading the model (including startup warm-up)
+    receive     reading the request body
+    decode      decoding / resampling to PCM (for streamed bodies this
+                includes waiting for the body to arrive)
+    queue       waiting for a worker process (server.py)
+    recognize   Kaldi recognition
+    serialize   building the JSON response
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if value != value:
+        return 'NaN'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels):
+            raise ValueError(f'{self.name} expects labels {self.labels}, got {tuple(labels)}')
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}' for key, value in items]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    @contextmanager
+    def track(self, **labels):
+        """Count the body of the `with` block as in progress."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed bucket bounds."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (last slot is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {count}')
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Counter or gauge whose value is read from `fn()` at scrape time.
+
+    `fn` returns a number, or a dict of {label values tuple: number} when the
+    metric has labels. Errors in `fn` drop the metric from that scrape.
+    """
+
+    def __init__(self, name, help, fn, kind='gauge', labels=(), registry=None):
+        self.kind = kind
+        self.fn = fn
+        super().__init__(name, help, labels, registry)
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        if not self.labels:
+            return [] if value is None else [f'{self.name} {_format_value(value)}']
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(v)}'
+                for key, v in (value or {}).items()]
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric already registered: {metric.name}')
+            self._metrics[metric.name] = metric
+
+    def unregister(self, name):
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """All metrics in the text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            samples = metric.samples()
+            if samples:
+                lines += metric.header() + samples
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def render():
+    return REGISTRY.render()
+
+
+def callback(name, help, fn, kind='gauge', labels=()):
+    """Register (or replace) a CallbackMetric in the default registry."""
+    REGISTRY.unregister(name)
+    return CallbackMetric(name, help, fn, kind=kind, labels=labels)
+
+
+# -- metrics shared by both servers ------------------------------------------
+
+STAGE_SECONDS = Histogram('stt_stage_seconds', 'Time spent per request stage.', ('stage',))
+REQUESTS = Counter('stt_requests_total', 'Transcription requests by endpoint and HTTP status.', ('endpoint', 'status'))
+REQUEST_SECONDS = Histogram('stt_request_seconds', 'Total transcription request latency.', ('endpoint',))
+IN_FLIGHT = Gauge('stt_requests_in_flight', 'Transcription requests being processed.', ('endpoint',))
+ERRORS = Counter('stt_errors_total', 'Failed transcription requests by error type.', ('endpoint', 'type'))
+AUDIO_SECONDS = Counter('stt_audio_seconds_total', 'Seconds of audio recognized.')
+REALTIME_FACTOR = Histogram('stt_realtime_factor', 'Recognition time divided by audio duration.',
+                            buckets=(0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0))
+MODEL_LOAD_SECONDS = Histogram('stt_model_load_seconds', 'Time to load a Vosk model.', ('model',),
+                               buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+
+
+class Stages:
+    """Stage timings of one request, in seconds."""
+
+    def __init__(self):
+        self.seconds = {}
+        # request details for traces (decoder used, ...)
+        self.info = {}
+
+    def add(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def timed_iter(self, name, iterable):
+        """Yield from `iterable`, counting the time spent producing items as stage `name`."""
+        it = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start)
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+    def observe(self):
+        for name, seconds in self.seconds.items():
+            STAGE_SECONDS.observe(seconds, stage=name)
+
+
+def observe_recognition(audio_seconds, recognize_seconds):
+    """Record processed audio and the real-time factor of one recognition."""
+    if audio_seconds:
+        AUDIO_SECONDS.inc(audio_seconds)
+        REALTIME_FACTOR.observe(recognize_seconds / audio_seconds)
+
+
+def observe_model_load(model_dir, seconds):
+    """Load listener for model_registry (`registry.add_load_listener`)."""
+    MODEL_LOAD_SECONDS.observe(seconds, model=os.path.basename(os.path.normpath(model_dir)))
+
+
+def export_stats(prefix, fn, fields):
+    """Expose entries of a component's `stats()` dict as callback metrics.
+
+    `fields` maps a stats key to (kind, help); the metric is named
+    `<prefix>_<key>`, with `_total` appended for counters.
+    """
+    for key, (kind, help) in fields.items():
+        name = f'{prefix}_{key}' + ('_total' if kind == 'counter' else '')
+        callback(name, help, lambda key=key: fn()[key], kind=kind)
+
+
+RESULT_CACHE_FIELDS = {
+    'hits': ('counter', 'Result cache hits (memory or disk).'),
+    'disk_hits': ('counter', 'Result cache hits served from the SQLite tier.'),
+    'misses': ('counter', 'Result cache misses.'),
+    'coalesced': ('counter', 'Requests that waited for an identical in-flight transcription.'),
+    'hit_rate': ('gauge', 'Fraction of result cache lookups that were hits.'),
+    'memory_entries': ('gauge', 'Entries in the in-memory result cache.'),
+}
@@ -1,74 +1,522 @@
+"""Download and install Vosk models.
+
+Archives are fetched over several parallel HTTP range requests when the
+server supports them (one stream otherwise). Progress is kept in a `.part`
+file plus a small JSON state file under `<dest_dir>/.downloads/`, so an
+interrupted download resumes with the segments it still needs. While the
+download threads run, the calling thread consumes the file in order as soon
+as a contiguous prefix is on disk: it feeds the checksum, and for tar archives
+the extraction, so both finish shortly after the last byte arrives. (Zip
+archives keep their index at the end and are extracted once complete.)
+
+The archive is extracted into a hidden temporary directory under
+`dest_dir` and renamed into place only after the checksum matched and the
+result looks like a complete model, so `models/` never holds a half-
+extracted model.
+
+Usage:
+    python model_downloader.py https://alphacephei.com/vosk/models/vosk-model-small-en-us-0.15.zip \\
+        --sha256 <hex> --dest models
+"""
+import hashlib
+import json
 import os
 import shutil
-import requests
 import tarfile
+import threading
+import time
+import uuid
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from math import floor
 
+import requests
+
+DOWNLOADS_DIR = '.downloads'
+DEFAULT_CONNECTIONS = 4
+DEFAULT_SEGMENT_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+RETRIES = 3
+TIMEOUT = 30
+
+# files whose presence marks an extracted Vosk model as complete
+MODEL_MARKERS = (os.path.join('am', 'final.mdl'), 'final.mdl')
+
+
+class ChecksumError(RuntimeError):
+    """Raised when a downloaded archive does not match the expected checksum."""
+
 
-def download_and_extract(url, dest_dir, progress_callback=None):
-    """Download an archive from `url` and extract to `dest_dir`.
+def is_complete_model(path):
+    """True if `path` is an installed (not hidden, fully extracted) Vosk model."""
+    if os.path.basename(os.path.normpath(path)).startswith('.') or not os.path.isdir(path):
+        return False
+    return any(os.path.isfile(os.path.join(path, marker)) for marker in MODEL_MARKERS)
 
-    Supports .zip and .tar.gz/.tgz archives. Returns path to extracted folder.
+
+def _parse_checksum(checksum):
+    """'sha256:<hex>', 'md5:<hex>' or a bare SHA-256 hex digest -> (algorithm, hex)."""
+    if not checksum:
+        return None, None
+    algo, _, digest = checksum.rpartition(':')
+    return (algo or 'sha256').lower(), digest.strip().lower()
+
+
+def _archive_kind(fname):
+    if fname.endswith('.zip'):
+        return 'zip'
+    if fname.endswith(('.tar.gz', '.tgz', '.tar', '.tar.bz2', '.tar.xz')):
+        return 'tar'
+    return None
+
+
+class _Assembler:
+    """Tracks how much of the `.part` file is contiguous from byte 0.
+
+    Download threads report finished segments (or bytes, for a single
+    stream); `read_ordered` blocks until the requested bytes are on disk.
     """
-    os.makedirs(dest_dir, exist_ok=True)
-    fname = url.split('/')[-1]
-    download_path = os.path.join(dest_dir, fname)
 
-    with requests.get(url, stream=True) as r:
+    def __init__(self, path, size, segment_size, done=()):
+        self.path = path
+        self.size = size
+        self.segment_size = segment_size
+        self._cond = threading.Condition()
+        self._done = set(done)
+        self._contiguous = 0
+        self._finished = False
+        self.error = None
+        self._advance()
+
+    def _advance(self):
+        if self.size is None:
+            return
+        i = 0
+        while i in self._done:
+            i += 1
+        self._contiguous = min(self.size, i * self.segment_size)
+
+    def segment_done(self, index):
+        with self._cond:
+            self._done.add(index)
+            self._advance()
+            self._cond.notify_all()
+
+    def set_contiguous(self, nbytes):
+        with self._cond:
+            self._contiguous = nbytes
+            self._cond.notify_all()
+
+    def finish(self):
+        with self._cond:
+            self._finished = True
+            if self.size is None:
+                self.size = self._contiguous
+            self._cond.notify_all()
+
+    def fail(self, error):
+        with self._cond:
+            self.error = error
+            self._cond.notify_all()
+
+    def read_ordered(self):
+        """Yield the file's bytes in order as they become available."""
+        pos = 0
+        with open(self.path, 'rb') as f:
+            while True:
+                with self._cond:
+                    while (pos >= self._contiguous and not self.error
+                           and not (self._finished and pos >= (self.size or 0))):
+                        self._cond.wait(1.0)
+                    if self.error:
+                        raise self.error
+                    end = self._contiguous
+                    if pos >= end and self._finished:
+                        return
+                f.seek(pos)
+                while pos < end:
+                    block = f.read(min(CHUNK_SIZE, end - pos))
+                    if not block:
+                        break
+                    pos += len(block)
+                    yield block
+
+
+class _ChunkReader:
+    """File-like `read` over an iterator of byte blocks (for tarfile stream mode)."""
+
+    def __init__(self, blocks):
+        self._blocks = blocks
+        self._buf = b''
+
+    def read(self, n=-1):
+        while n < 0 or len(self._buf) < n:
+            try:
+                self._buf += next(self._blocks)
+            except StopIteration:
+                break
+        if n < 0:
+            n = len(self._buf)
+        data, self._buf = self._buf[:n], self._buf[n:]
+        return data
+
+    def drain(self):
+        self._buf = b''
+        for _ in self._blocks:
+            pass
+
+
+def _probe(session, url):
+    """Return (size or None, accepts_ranges, validator) for `url`."""
+    try:
+        r = session.head(url, allow_redirects=True, timeout=TIMEOUT)
+        if r.ok:
+            size = r.headers.get('Content-Length')
+            ranges = r.headers.get('Accept-Ranges', '').lower() == 'bytes'
+            validator = r.headers.get('ETag') or r.headers.get('Last-Modified')
+            if size is not None and ranges:
+                return int(size), True, validator
+    except requests.RequestException:
+        pass
+    # some servers don't answer HEAD usefully; ask for the first byte instead
+    with session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=TIMEOUT) as r:
         r.raise_for_status()
-        total = r.headers.get('Content-Length')
-        if total is not None:
-            total = int(total)
-        downloaded = 0
-        with open(download_path, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if progress_callback and total:
-                        percent = floor(downloaded * 100 / total)
-                        try:
-                            progress_callback(percent)
-                        except Exception:
-                            pass
-
-    # extract
-    if download_path.endswith('.zip'):
-        with zipfile.ZipFile(download_path, 'r') as z:
-            z.extractall(dest_dir)
-    elif download_path.endswith(('.tar.gz', '.tgz', '.tar')):
-        with tarfile.open(download_path, 'r:*') as t:
-            t.extractall(dest_dir)
+        validator = r.headers.get('ETag') or r.headers.get('Last-Modified')
+        if r.status_code == 206 and '/' in r.headers.get('Content-Range', ''):
+            total = r.headers['Content-Range'].rsplit('/', 1)[1]
+            return (int(total) if total != '*' else None), total != '*', validator
+        size = r.headers.get('Content-Length')
+        return (int(size) if size is not None else None), False, validator
+
+
+class _Download:
+    """One archive download into `part_path`, resumable through a JSON state file."""
+
+    def __init__(self, url, part_path, connections, segment_size, progress_callback):
+        self.url = url
+        self.part_path = part_path
+        self.state_path = part_path + '.json'
+        self.connections = max(1, int(connections))
+        self.segment_size = segment_size
+        self.progress_callback = progress_callback
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._downloaded = 0
+        self._last_percent = -1
+
+    @property
+    def session(self):
+        # one Session (connection pool) per download thread
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    # -- resume state --------------------------------------------------------
+
+    def _load_state(self, size, validator):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if (state.get('url') != self.url or state.get('size') != size or state.get('validator') != validator
+                or state.get('segment_size') != self.segment_size or not os.path.exists(self.part_path)):
+            return set()
+        return set(state.get('done', []))
+
+    def _save_state(self, size, validator, done):
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'url': self.url, 'size': size, 'validator': validator,
+                       'segment_size': self.segment_size, 'done': sorted(done)}, f)
+        os.replace(tmp, self.state_path)
+
+    def cleanup(self):
+        for path in (self.part_path, self.state_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # -- progress ------------------------------------------------------------
+
+    def _progress(self, nbytes, total):
+        if not self.progress_callback or not total:
+            return
+        with self._lock:
+            self._downloaded += nbytes
+            percent = floor(self._downloaded * 100 / total)
+            if percent == self._last_percent:
+                return
+            self._last_percent = percent
+        try:
+            self.progress_callback(percent)
+        except Exception:
+            pass
+
+    # -- fetching ------------------------------------------------------------
+
+    def start(self):
+        """Start downloading in the background; returns the _Assembler to read from."""
+        size, ranges, validator = _probe(self.session, self.url)
+        self.size = size
+        if ranges and size:
+            done = self._load_state(size, validator)
+            if not done:
+                with open(self.part_path, 'wb') as f:
+                    f.truncate(size)
+            assembler = _Assembler(self.part_path, size, self.segment_size, done)
+            self._downloaded = sum(min(self.segment_size, size - i * self.segment_size) for i in done)
+            target = lambda: self._fetch_segments(size, validator, done, assembler)
+        else:
+            # no range support: one stream from the start
+            self.cleanup()
+            open(self.part_path, 'wb').close()
+            assembler = _Assembler(self.part_path, size, self.segment_size)
+            target = lambda: self._fetch_stream(size, assembler)
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+        return assembler
+
+    def join(self):
+        """Wait until the download threads have stopped writing."""
+        self._thread.join()
+
+    def _fetch_segment(self, index, size, assembler):
+        start = index * self.segment_size
+        end = min(size, start + self.segment_size) - 1
+        for attempt in range(RETRIES):
+            if assembler.error:
+                raise RuntimeError('Download cancelled')
+            written = 0
+            try:
+                headers = {'Range': f'bytes={start}-{end}'}
+                with self.session.get(self.url, headers=headers, stream=True, timeout=TIMEOUT) as r:
+                    if r.status_code != 206:
+                        raise requests.HTTPError(f'Expected 206 for a range request, got {r.status_code}')
+                    with open(self.part_path, 'r+b') as f:
+                        f.seek(start)
+                        for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                            if assembler.error:
+                                raise RuntimeError('Download cancelled')
+                            f.write(chunk)
+                            written += len(chunk)
+                            self._progress(len(chunk), size)
+                if written != end - start + 1:
+                    raise requests.HTTPError(f'Segment {index} incomplete ({written} of {end - start + 1} bytes)')
+                return
+            except (requests.RequestException, OSError):
+                self._progress(-written, size)
+                if attempt == RETRIES - 1:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+
+    def _fetch_segments(self, size, validator, done, assembler):
+        count = -(-size // self.segment_size)
+        pending = [i for i in range(count) if i not in done]
+        done = set(done)
+
+        def fetch(index):
+            self._fetch_segment(index, size, assembler)
+            with self._lock:
+                done.add(index)
+                self._save_state(size, validator, done)
+            assembler.segment_done(index)
+
+        # segments are handed out in order, so the contiguous prefix grows steadily
+        executor = ThreadPoolExecutor(max_workers=min(self.connections, max(1, len(pending))))
+        try:
+            for future in [executor.submit(fetch, i) for i in pending]:
+                future.result()
+        except BaseException as e:
+            # stop the reader at once; running segments stop at their next chunk
+            assembler.fail(e)
+            # wait for them so a retry never shares the .part and state files with them
+            executor.shutdown(wait=True, cancel_futures=True)
+            return
+        executor.shutdown()
+        assembler.finish()
+
+    def _fetch_stream(self, size, assembler):
+        written = 0
+        try:
+            with self.session.get(self.url, stream=True, timeout=TIMEOUT) as r:
+                r.raise_for_status()
+                with open(self.part_path, 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                        if assembler.error:
+                            raise RuntimeError('Download cancelled')
+                        f.write(chunk)
+                        f.flush()
+                        written += len(chunk)
+                        assembler.set_contiguous(written)
+                        self._progress(len(chunk), size)
+            if size is not None and written != size:
+                raise requests.HTTPError(f'Download incomplete ({written} of {size} bytes)')
+            assembler.finish()
+        except BaseException as e:
+            assembler.fail(e)
+
+
+def _extract_tar_stream(reader, dest):
+    with tarfile.open(fileobj=reader, mode='r|*') as t:
+        if hasattr(tarfile, 'data_filter'):
+            t.extractall(dest, filter='data')
+        else:
+            for member in t:
+                target = os.path.realpath(os.path.join(dest, member.name))
+                if not target.startswith(os.path.realpath(dest) + os.sep) or member.issym() or member.islnk():
+                    raise RuntimeError(f'Unsafe path in archive: {member.name}')
+                t.extract(member, dest)
+
+
+def _extract_zip(path, dest):
+    root = os.path.realpath(dest)
+    with zipfile.ZipFile(path, 'r') as z:
+        for name in z.namelist():
+            target = os.path.realpath(os.path.join(dest, name))
+            if target != root and not target.startswith(root + os.sep):
+                raise RuntimeError(f'Unsafe path in archive: {name}')
+        z.extractall(dest)
+
+
+def _install(tmp_dir, dest_dir, default_name):
+    """Move the extracted model from `tmp_dir` to `dest_dir/<name>`; returns the path."""
+    entries = [e for e in os.listdir(tmp_dir) if not e.startswith('.')]
+    if len(entries) == 1 and os.path.isdir(os.path.join(tmp_dir, entries[0])):
+        source, name = os.path.join(tmp_dir, entries[0]), entries[0]
     else:
-        # assume model is a directory or file — move into place
-        target = os.path.join(dest_dir, fname)
-        shutil.move(download_path, target)
+        source, name = tmp_dir, default_name
+    if not any(os.path.isfile(os.path.join(source, m)) for m in MODEL_MARKERS):
+        raise RuntimeError(f'Archive does not contain a Vosk model (no {" or ".join(MODEL_MARKERS)})')
 
-    # attempt to find top-level folder
-    entries = [os.path.join(dest_dir, e) for e in os.listdir(dest_dir)]
-    entries = [e for e in entries if os.path.isdir(e)]
-    if entries:
-        # return first directory
-        return entries[0]
-    return dest_dir
+    target = os.path.join(dest_dir, name)
+    old = None
+    if os.path.exists(target):
+        # swap out the previous (possibly half-extracted) copy
+        old = os.path.join(dest_dir, f'.old-{name}-{uuid.uuid4().hex[:8]}')
+        os.rename(target, old)
+    os.rename(source, target)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+    return target
 
 
-def ensure_vosk_model(local_models_dir='models', model_url=None, progress_callback=None):
-    """Ensure there's at least one model under `local_models_dir`.
+def download_and_extract(url, dest_dir, progress_callback=None, checksum=None, connections=DEFAULT_CONNECTIONS,
+                         segment_size=DEFAULT_SEGMENT_SIZE):
+    """Download an archive from `url` and install the model in it under `dest_dir`.
 
-    If `model_url` is provided, download and extract.
+    Supports .zip and .tar(.gz/.bz2/.xz) archives. `checksum` is 'sha256:<hex>',
+    'md5:<hex>' or a bare SHA-256 digest; a mismatch raises ChecksumError and
+    discards the download. Other failures keep the partial download, and the
+    next call resumes it. `progress_callback(percent)` is called as data
+    arrives. Returns the path of the installed model directory.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    fname = url.split('?')[0].rstrip('/').split('/')[-1]
+    kind = _archive_kind(fname)
+    if kind is None:
+        raise ValueError(f'Unsupported archive type: {fname}')
+    default_name = fname
+    for ext in ('.zip', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz', '.tar'):
+        if default_name.endswith(ext):
+            default_name = default_name[:-len(ext)]
+            break
+
+    downloads = os.path.join(dest_dir, DOWNLOADS_DIR)
+    os.makedirs(downloads, exist_ok=True)
+    algo, expected = _parse_checksum(checksum)
+    digest = hashlib.new(algo) if algo else None
+    tmp_dir = os.path.join(dest_dir, f'.tmp-{default_name}-{uuid.uuid4().hex[:8]}')
+    os.makedirs(tmp_dir)
+
+    download = _Download(url, os.path.join(downloads, fname + '.part'), connections, segment_size,
+                         progress_callback)
+    assembler = None
+    try:
+        assembler = download.start()
+
+        def ordered():
+            for block in assembler.read_ordered():
+                if digest is not None:
+                    digest.update(block)
+                yield block
+
+        blocks = ordered()
+        if kind == 'tar':
+            reader = _ChunkReader(blocks)
+            _extract_tar_stream(reader, tmp_dir)
+            # hash the end-of-archive padding tarfile did not need
+            reader.drain()
+        else:
+            for _ in blocks:
+                pass
+        download.join()
+
+        if digest is not None and digest.hexdigest() != expected:
+            download.cleanup()
+            raise ChecksumError(f'{algo} mismatch for {fname}: expected {expected}, got {digest.hexdigest()}')
+        if kind == 'zip':
+            _extract_zip(download.part_path, tmp_dir)
+
+        path = _install(tmp_dir, dest_dir, default_name)
+        download.cleanup()
+        return path
+    except BaseException as e:
+        # make the download threads stop early; the partial file is kept for resuming
+        if assembler is not None:
+            if not assembler.error:
+                assembler.fail(e)
+            download.join()
+        raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def ensure_vosk_model(local_models_dir='models', model_url=None, progress_callback=None, checksum=None):
+    """Ensure there's at least one complete model under `local_models_dir`.
+
+    Hidden directories (downloads and installs in progress) and directories
+    missing the model files (e.g. left by an interrupted extraction) are
+    skipped. If none is found and `model_url` is provided, the model is
+    downloaded and installed (see `download_and_extract`).
     Returns the path to the model directory (or None if missing).
     """
     os.makedirs(local_models_dir, exist_ok=True)
-    # look for existing subdirs
-    for name in os.listdir(local_models_dir):
+    for name in sorted(os.listdir(local_models_dir)):
         p = os.path.join(local_models_dir, name)
-        if os.path.isdir(p):
-            # basic heuristic: presence of 'conf' or 'README' (vosk models often have 'am' etc.)
+        if is_complete_model(p):
             return p
 
     if model_url:
-        return download_and_extract(model_url, local_models_dir, progress_callback=progress_callback)
+        return download_and_extract(model_url, local_models_dir, progress_callback=progress_callback,
+                                    checksum=checksum)
 
     return None
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Download and install a Vosk model.')
+    parser.add_argument('url', help='URL of a .zip or .tar.gz model archive')
+    parser.add_argument('--dest', default='models', help='models directory (default: models)')
+    parser.add_argument('--sha256', default=None, help='expected SHA-256 of the archive')
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS,
+                        help=f'parallel range requests (default: {DEFAULT_CONNECTIONS})')
+    args = parser.parse_args(argv)
+
+    def progress(percent):
+        print(f'\r{percent:3d}%', end='', flush=True)
+
+    path = download_and_extract(args.url, args.dest, progress_callback=progress, checksum=args.sha256,
+                                connections=args.connections)
+    print(f'\n✅ Model installed at {path}')
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+
+    sys.exit(main())
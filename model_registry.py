@@ -0,0 +1,374 @@
+"""Process-wide registry of loaded Vosk models.
+
+Loading a `vosk.Model` takes seconds and hundreds of MB, so each model
+directory is loaded once per process and the shared handle is handed out to
+every caller. Several models can live under `models/`; callers pick one by
+directory name. When the estimated memory of the loaded models exceeds the
+configured budget the least-recently-used ones are dropped.
+
+Usage:
+    from model_registry import registry
+    model = registry.get()                  # default (first) model
+    model = registry.get('vosk-model-en')   # a model by directory name
+
+Servers load their default model at startup on a background thread with
+`Warmup`, so they can answer health checks while the model loads.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MODELS_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+# Memory budget for loaded models in MB (0 disables eviction)
+DEFAULT_MEMORY_BUDGET_MB = int(os.environ.get('VOSK_MODEL_MEMORY_BUDGET_MB', '0'))
+
+# Seconds a request waits for the startup model load before it is refused (0: refuse at once)
+MODEL_WAIT_SECONDS = float(os.environ.get('MODEL_WAIT_SECONDS', '10'))
+# Retry-After (seconds) sent to clients refused during the startup model load
+MODEL_RETRY_AFTER = 5
+
+
+def import_vosk():
+    """Import and return the vosk module.
+
+    vosk is only imported when a model or recognizer is first needed, which
+    keeps it out of the startup path of processes that never load one.
+    """
+    try:
+        import vosk
+    except Exception:
+        raise RuntimeError('Vosk not installed. Please install `vosk` and a model.')
+    return vosk
+
+
+def _dir_size(path):
+    """Return the total size in bytes of the files under `path`.
+
+    Used as an estimate of a model's resident memory once loaded.
+    """
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def model_sample_rate(model_dir, default=16000):
+    """Return the sample rate a model expects, read from its conf/mfcc.conf."""
+    try:
+        with open(os.path.join(model_dir, 'conf', 'mfcc.conf')) as f:
+            for line in f:
+                if line.startswith('--sample-frequency='):
+                    return int(float(line.split('=', 1)[1]))
+    except (OSError, ValueError):
+        pass
+    return default
+
+
+class ModelNotReady(RuntimeError):
+    """Raised when the startup model load is still running after the wait timeout."""
+
+    def __init__(self, message, retry_after=MODEL_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Entry:
+    def __init__(self, path, model, size):
+        self.path = path
+        self.model = model
+        self.size = size
+
+
+class ModelRegistry:
+    """Thread-safe LRU cache of loaded Vosk models keyed by directory path."""
+
+    def __init__(self, models_root=MODELS_ROOT, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        self.models_root = models_root
+        self.memory_budget = int(memory_budget_mb) * 1024 * 1024
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._available = None
+        self._evict_listeners = []
+        self._load_listeners = []
+
+    # -- discovery ---------------------------------------------------------
+
+    def available_models(self, refresh=False):
+        """Return a dict of model name -> directory found under `models_root`.
+
+        The directory is scanned once and cached; pass `refresh=True` after
+        installing a new model.
+        """
+        with self._lock:
+            if self._available is not None and not refresh:
+                return dict(self._available)
+        found = OrderedDict()
+        if os.path.isdir(self.models_root):
+            for name in sorted(os.listdir(self.models_root)):
+                p = os.path.join(self.models_root, name)
+                if os.path.isdir(p) and not name.startswith('.'):
+                    found[name] = p
+        with self._lock:
+            self._available = found
+        return dict(found)
+
+    def find_model_dir(self, name=None):
+        """Return the directory for model `name` (or the default model).
+
+        `name` is a directory name under `models_root`, or the path of such a
+        directory (as returned by this method). Anything else, including other
+        paths on disk, is not a model: `name` may come from a client request.
+        Returns None if no matching model exists.
+        """
+        models = self.available_models()
+        if name:
+            if os.path.dirname(name):
+                # a path: only accept it if it is an entry directly under models_root
+                path = os.path.realpath(name)
+                if os.path.dirname(path) != os.path.realpath(self.models_root):
+                    return None
+                name = os.path.basename(path)
+            if name in models:
+                return models[name]
+            models = self.available_models(refresh=True)
+            return models.get(name)
+        if not models:
+            models = self.available_models(refresh=True)
+        for p in models.values():
+            return p
+        return None
+
+    # -- loading -----------------------------------------------------------
+
+    def get(self, name=None):
+        """Return the shared model for `name` (or the default model).
+
+        Raises FileNotFoundError if the model does not exist.
+        """
+        model_dir = self.find_model_dir(name)
+        if not model_dir:
+            if name:
+                raise FileNotFoundError(f'Model not found: {name}')
+            raise FileNotFoundError(f'No model found under {self.models_root}. Please download a Vosk model and place it there.')
+        return self.load(model_dir)
+
+    def load(self, model_dir):
+        """Return the shared model loaded from `model_dir`, loading it once."""
+        vosk = import_vosk()
+        if not os.path.exists(model_dir):
+            raise FileNotFoundError(f'Model directory not found: {model_dir}. Please download a Vosk model and place it there.')
+
+        key = os.path.realpath(model_dir)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    return entry.model
+                event = self._loading.get(key)
+                if event is None:
+                    # this thread loads the model; others wait on the event
+                    event = threading.Event()
+                    self._loading[key] = event
+                    break
+            event.wait()
+
+        try:
+            start = time.perf_counter()
+            model = vosk.Model(key)
+            self._notify_loaded(key, time.perf_counter() - start)
+            entry = _Entry(key, model, _dir_size(key))
+            with self._lock:
+                self._entries[key] = entry
+            self._evict(keep=key)
+            return model
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            event.set()
+
+    def is_loaded(self, model_dir):
+        with self._lock:
+            return os.path.realpath(model_dir) in self._entries
+
+    def loaded_models(self):
+        """Return a list of (path, estimated_bytes) for loaded models, LRU first."""
+        with self._lock:
+            return [(e.path, e.size) for e in self._entries.values()]
+
+    def add_load_listener(self, callback):
+        """Register `callback(model_dir, seconds)` to be called after a model is loaded."""
+        self._load_listeners.append(callback)
+
+    def _notify_loaded(self, model_dir, seconds):
+        for callback in list(self._load_listeners):
+            try:
+                callback(model_dir, seconds)
+            except Exception:
+                pass
+
+    # -- eviction ----------------------------------------------------------
+
+    def add_evict_listener(self, callback):
+        """Register `callback(model)` to be called when a model is evicted."""
+        self._evict_listeners.append(callback)
+
+    def _evict(self, keep=None):
+        if self.memory_budget <= 0:
+            return
+        evicted = []
+        with self._lock:
+            total = sum(e.size for e in self._entries.values())
+            for key in list(self._entries):
+                if total <= self.memory_budget:
+                    break
+                if key == keep:
+                    continue
+                entry = self._entries.pop(key)
+                total -= entry.size
+                evicted.append(entry)
+        for entry in evicted:
+            self._notify_evicted(entry.model)
+
+    def unload(self, model_dir):
+        """Drop the model loaded from `model_dir`, if any."""
+        with self._lock:
+            entry = self._entries.pop(os.path.realpath(model_dir), None)
+        if entry is not None:
+            self._notify_evicted(entry.model)
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._notify_evicted(entry.model)
+
+    def _notify_evicted(self, model):
+        for callback in list(self._evict_listeners):
+            try:
+                callback(model)
+            except Exception:
+                pass
+
+
+class Warmup:
+    """Runs `load()` on a background thread and reports its progress.
+
+    `state` is 'idle' (not started), 'loading', 'ready' or 'failed'. Servers
+    start it at startup, answer readiness checks from `status()` and hold
+    requests that need the model with `require()`. A failed load is retried
+    by the next `start()` once its backoff (RETRY_BACKOFF seconds, doubling
+    per failure up to MAX_RETRY_BACKOFF) has passed.
+    """
+
+    RETRY_BACKOFF = 5.0
+    MAX_RETRY_BACKOFF = 300.0
+
+    def __init__(self, load):
+        self.load = load
+        self.state = 'idle'
+        self.error = None
+        self.seconds = None
+        self.failures = 0
+        self._started = None
+        self._failed_at = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def ready(self):
+        return self.state == 'ready'
+
+    def _backoff_left(self):
+        backoff = min(self.MAX_RETRY_BACKOFF, self.RETRY_BACKOFF * 2 ** (self.failures - 1))
+        return max(0.0, backoff - (time.perf_counter() - self._failed_at))
+
+    def start(self):
+        """Start loading unless it is loading or loaded, or a retry is not due yet."""
+        with self._lock:
+            if self.state == 'failed':
+                if self._backoff_left() > 0:
+                    return
+            elif self.state != 'idle':
+                return
+            self.state = 'loading'
+            self._started = time.perf_counter()
+            self._done.clear()
+        threading.Thread(target=self._run, name='model-warmup', daemon=True).start()
+
+    def _run(self):
+        try:
+            self.load()
+        except Exception as e:
+            self.seconds = time.perf_counter() - self._started
+            self.error = str(e)
+            self.failures += 1
+            self._failed_at = time.perf_counter()
+            self.state = 'failed'
+            print(f'⚠️  Model load failed: {e} (retrying in {self._backoff_left():.0f}s)')
+        else:
+            self.seconds = time.perf_counter() - self._started
+            self.error = None
+            self.failures = 0
+            self.state = 'ready'
+        finally:
+            self._done.set()
+
+    def wait(self, timeout=None):
+        """Start (or retry) loading if due and wait up to `timeout` seconds; returns the state."""
+        self.start()
+        self._done.wait(timeout)
+        return self.state
+
+    def require(self, timeout=MODEL_WAIT_SECONDS):
+        """Wait for the load to finish.
+
+        Raises ModelNotReady if it is still running after `timeout` seconds
+        or has failed (with the time until the next retry as retry_after).
+        """
+        state = self.wait(timeout)
+        if state == 'loading':
+            raise ModelNotReady('Model is still loading, retry shortly', retry_after=self.retry_after())
+        if state == 'failed':
+            raise ModelNotReady(f'Model failed to load: {self.error}', retry_after=self.retry_after())
+
+    def retry_after(self):
+        """Seconds until a refused client should try again (Retry-After)."""
+        if self.state == 'failed':
+            return max(1, int(math.ceil(self._backoff_left())))
+        return MODEL_RETRY_AFTER
+
+    def status(self):
+        status = {'state': self.state}
+        if self.state == 'loading':
+            status['elapsed_seconds'] = round(time.perf_counter() - self._started, 3)
+        if self.seconds is not None:
+            status['load_seconds'] = round(self.seconds, 3)
+        if self.error:
+            status['error'] = self.error
+        if self.failures:
+            status['failures'] = self.failures
+        if self.state == 'failed':
+            status['retry_in_seconds'] = round(self._backoff_left(), 1)
+        return status
+
+
+# module-level default registry shared by the servers and scripts
+registry = ModelRegistry()
+
+
+def get_model(name=None):
+    return registry.get(name)
+
+
+def find_model_dir(name=None):
+    return registry.find_model_dir(name)
@@ -0,0 +1,280 @@
+"""Per-request tracing and an on-demand profiler.
+
+Tracing: a transcription request with `?trace=1` (or an `X-Trace: 1`
+header) gets a "trace" object in its JSON response with the time spent in
+each stage (see metrics.Stages), the decoder used and the request id; the
+same line is printed to the log.
+
+Profiling: an admin call starts a profiling session for the next N
+transcription requests, without restarting anything. Two modes:
+
+    sample    a sampling profiler: a thread records the stack of the request
+              thread every `interval` seconds; the dump is in the collapsed
+              ("folded") stack format read by flamegraph.pl and speedscope
+    cprofile  deterministic cProfile of each request; the dump is a pstats
+              file (python -m pstats, snakeviz)
+
+Requests served by worker processes are profiled in the worker and the
+results are merged in the server. Dumps are written to PROFILE_DIR
+(default: cache/profiles) when the session has seen its N requests or is
+stopped.
+
+The admin endpoints require the X-Admin-Token header to match ADMIN_TOKEN
+when that is set; without it they only answer requests from localhost.
+"""
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join('cache', 'profiles'))
+MODES = ('sample', 'cprofile')
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+
+def admin_allowed(remote_addr, token):
+    """True if an admin request from `remote_addr` with header `token` may proceed."""
+    if ADMIN_TOKEN:
+        return hmac.compare_digest((token or '').encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+    return remote_addr in ('127.0.0.1', '::1')
+
+
+# -- tracing -------------------------------------------------------------------
+
+def trace_requested(args, headers):
+    """True if the request asked for a trace (`?trace=1` or `X-Trace: 1`)."""
+    value = args.get('trace') or headers.get('X-Trace')
+    return value is not None and value.lower() not in ('0', 'false', 'no', '')
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:12]
+
+
+def make_trace(request_id, endpoint, stages, total_seconds, **info):
+    """Trace dict for a response; also printed as one log line."""
+    trace = {
+        'id': request_id,
+        'total_ms': round(total_seconds * 1000.0, 2),
+        'stages_ms': {name: round(s * 1000.0, 2) for name, s in stages.seconds.items()},
+    }
+    trace.update((k, v) for k, v in info.items() if v is not None)
+    stage_text = ' '.join(f'{name}={ms}ms' for name, ms in trace['stages_ms'].items())
+    extra = ' '.join(f'{k}={v}' for k, v in info.items() if v is not None)
+    print(f'🔎 trace {request_id} {endpoint} total={trace["total_ms"]}ms {stage_text} {extra}'.rstrip())
+    return trace
+
+
+# -- capturing one request -----------------------------------------------------
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+class _Sampler:
+    """Samples the stack of one thread from a background thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return dict(self.stacks)
+
+
+class _StatsHolder:
+    """Minimal object pstats.Stats can load (it calls `create_stats`)."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+@contextmanager
+def capture(mode, interval=0.005):
+    """Profile the `with` block in the current thread.
+
+    Yields a dict; after the block its 'result' is picklable profile data
+    for `Profiler.add` (folded stack counts, or cProfile stats).
+    """
+    out = {'mode': mode, 'result': None}
+    if mode == 'cprofile':
+        import cProfile
+
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # another profiler is active in this process; skip this request
+            yield out
+            return
+        try:
+            yield out
+        finally:
+            prof.disable()
+            prof.create_stats()
+            out['result'] = prof.stats
+    else:
+        sampler = _Sampler(threading.get_ident(), interval)
+        sampler.start()
+        try:
+            yield out
+        finally:
+            out['result'] = sampler.stop()
+
+
+# -- sessions --------------------------------------------------------------------
+
+class Profiler:
+    """One profiling session at a time over the next `requests` requests."""
+
+    def __init__(self, out_dir=PROFILE_DIR):
+        self.out_dir = out_dir
+        self._lock = threading.Lock()
+        # cProfile can only profile one request at a time in a process
+        self._cprofile_lock = threading.Lock()
+        self._session = None
+        self.last = None
+
+    def start(self, requests=10, mode='sample', interval=0.005):
+        """Start a session; raises ValueError for bad arguments or RuntimeError if one is running."""
+        if mode not in MODES:
+            raise ValueError(f'Unknown profile mode: {mode}')
+        if requests < 1 or not 0.0005 <= interval <= 1.0:
+            raise ValueError('requests must be >= 1 and interval between 0.0005 and 1 second')
+        with self._lock:
+            if self._session is not None:
+                raise RuntimeError('A profiling session is already running')
+            self._session = {
+                'mode': mode, 'interval': interval, 'requests': requests, 'claimed': 0, 'captured': 0,
+                'started': time.time(), 'stacks': Counter(), 'stats': None,
+            }
+            return self._status()
+
+    def claim(self):
+        """Reserve one request of the running session; returns (mode, interval) or None."""
+        with self._lock:
+            s = self._session
+            if s is None or s['claimed'] >= s['requests']:
+                return None
+            s['claimed'] += 1
+            return s['mode'], s['interval']
+
+    def release(self):
+        """Give back a claim that was not used (e.g. the result came from the cache)."""
+        with self._lock:
+            if self._session is not None and self._session['claimed'] > self._session['captured']:
+                self._session['claimed'] -= 1
+
+    def add(self, mode, result):
+        """Merge one captured request; writes the dump once the session is complete.
+
+        A None `result` (nothing was captured) gives the claim back, as `release`.
+        """
+        if result is None:
+            self.release()
+            return
+        with self._lock:
+            s = self._session
+            if s is None or mode != s['mode']:
+                return
+            if mode == 'cprofile':
+                import pstats
+
+                if s['stats'] is None:
+                    s['stats'] = pstats.Stats(_StatsHolder(result))
+                else:
+                    s['stats'].add(_StatsHolder(result))
+            else:
+                s['stacks'].update(result)
+            s['captured'] += 1
+            if s['captured'] >= s['requests']:
+                self._finish()
+
+    @contextmanager
+    def request(self):
+        """Profile the `with` block in this thread if a session wants another request."""
+        claim = self.claim()
+        if claim is None:
+            yield
+            return
+        mode, interval = claim
+        if mode == 'cprofile' and not self._cprofile_lock.acquire(blocking=False):
+            self.release()
+            yield
+            return
+        cap = {'result': None}
+        try:
+            with capture(mode, interval) as cap:
+                yield
+        finally:
+            if mode == 'cprofile':
+                self._cprofile_lock.release()
+            self.add(mode, cap['result'])
+
+    def stop(self):
+        """End the running session early and write what it captured."""
+        with self._lock:
+            if self._session is None:
+                return None
+            return self._finish()
+
+    def _finish(self):
+        s, self._session = self._session, None
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:6]
+        path = None
+        if s['mode'] == 'cprofile' and s['stats'] is not None:
+            path = os.path.join(self.out_dir, f'profile-{stamp}.prof')
+            s['stats'].dump_stats(path)
+        elif s['mode'] == 'sample' and s['stacks']:
+            path = os.path.join(self.out_dir, f'profile-{stamp}.folded')
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in s['stacks'].most_common():
+                    f.write(f'{stack} {count}\n')
+        self.last = {'mode': s['mode'], 'requests': s['captured'], 'path': path,
+                     'seconds': round(time.time() - s['started'], 3)}
+        print(f'✅ Profile of {s["captured"]} request(s) written to {path}' if path
+              else '⚠️  Profiling session ended without samples')
+        return self.last
+
+    def _status(self):
+        s = self._session
+        running = None
+        if s is not None:
+            running = {'mode': s['mode'], 'interval': s['interval'], 'requests': s['requests'],
+                       'captured': s['captured']}
+        return {'running': running, 'last': self.last}
+
+    def status(self):
+        with self._lock:
+            return self._status()
+
+
+# module-level default profiler
+profiler = Profiler()
@@ -0,0 +1,222 @@
+"""Bounded pool of reusable Vosk KaldiRecognizer objects.
+
+Building a KaldiRecognizer sets up the decoding graph for the model and shows
+up in per-request latency. The pool keeps recognizers per (model, sample
+rate, options), resets them after use and hands them out again. Sample
+rates can come from clients, so the number of idle recognizers is capped
+across all keys; beyond that the least recently used are dropped.
+
+Usage:
+    from recognizer_pool import pool
+    with pool.acquire(model, 16000, words=True) as rec:
+        rec.AcceptWaveform(data)
+        ...
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from model_registry import registry, import_vosk
+
+# Maximum recognizers per (model, sample rate, options) key
+DEFAULT_POOL_SIZE = int(os.environ.get('VOSK_RECOGNIZER_POOL_SIZE', '4'))
+# Seconds to wait for a free recognizer before giving up
+DEFAULT_CHECKOUT_TIMEOUT = float(os.environ.get('VOSK_RECOGNIZER_TIMEOUT', '30'))
+# Maximum idle recognizers kept over all keys
+DEFAULT_MAX_IDLE = int(os.environ.get('VOSK_RECOGNIZER_MAX_IDLE', '16'))
+
+
+class PoolTimeout(RuntimeError):
+    """Raised when no recognizer became free within the checkout timeout."""
+
+
+class _Slot:
+    def __init__(self, key, model, sample_rate, options):
+        self.key = key
+        self.model = model
+        self.sample_rate = sample_rate
+        self.options = options
+        self.idle = deque()
+        self.last_used = 0.0
+        self.created = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+
+
+class RecognizerPool:
+    """Thread-safe pool of recognizers with size limits and hit/miss counters."""
+
+    def __init__(self, max_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_CHECKOUT_TIMEOUT, max_idle=DEFAULT_MAX_IDLE):
+        self.max_size = max(1, int(max_size))
+        self.timeout = timeout
+        self.max_idle = max(0, int(max_idle))
+        self._cond = threading.Condition()
+        self._slots = {}
+        self._idle_total = 0
+
+    @staticmethod
+    def _key(model, sample_rate, words, partial_words):
+        return (id(model), float(sample_rate), bool(words), bool(partial_words))
+
+    def _create(self, slot):
+        rec = import_vosk().KaldiRecognizer(slot.model, slot.sample_rate)
+        words, partial_words = slot.options
+        if words:
+            rec.SetWords(True)
+        if partial_words:
+            rec.SetPartialWords(True)
+        return rec
+
+    def checkout(self, model, sample_rate, words=False, partial_words=False, timeout=None):
+        """Return a (slot, recognizer) pair; the recognizer must be checked in again.
+
+        Raises PoolTimeout if the pool for this key is exhausted for longer
+        than `timeout` seconds.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        key = self._key(model, sample_rate, words, partial_words)
+        with self._cond:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = _Slot(key, model, float(sample_rate), (bool(words), bool(partial_words)))
+                self._slots[key] = slot
+            if not slot.idle and slot.created >= self.max_size:
+                slot.waiting += 1
+                try:
+                    ok = self._cond.wait_for(lambda: slot.idle or slot.created < self.max_size, timeout)
+                finally:
+                    slot.waiting -= 1
+                if not ok:
+                    slot.timeouts += 1
+                    raise PoolTimeout(f'No free recognizer after {timeout}s (pool size {self.max_size})')
+            slot.in_use += 1
+            if slot.idle:
+                slot.hits += 1
+                self._idle_total -= 1
+                return slot, slot.idle.pop()
+            slot.misses += 1
+            slot.created += 1
+
+        # build outside the lock; construction is the slow part
+        try:
+            return slot, self._create(slot)
+        except Exception:
+            with self._cond:
+                slot.created -= 1
+                slot.in_use -= 1
+                self._drop_if_empty(slot)
+                self._cond.notify_all()
+            raise
+
+    def _drop_if_empty(self, slot):
+        # keys with nothing built are forgotten, so client-chosen rates don't pile up
+        if slot.created <= 0 and not slot.waiting and self._slots.get(slot.key) is slot:
+            del self._slots[slot.key]
+
+    def _evict_idle(self):
+        """Drop the least recently used idle recognizer of any key (lock held)."""
+        slots = [s for s in self._slots.values() if s.idle]
+        if not slots:
+            return
+        slot = min(slots, key=lambda s: s.last_used)
+        slot.idle.popleft()
+        slot.created -= 1
+        self._idle_total -= 1
+        self._drop_if_empty(slot)
+
+    def checkin(self, slot, rec, discard=False):
+        """Return a recognizer to the pool, resetting it for the next caller."""
+        if not discard:
+            try:
+                rec.Reset()
+            except Exception:
+                discard = True
+        with self._cond:
+            if self._slots.get(slot.key) is not slot:
+                # model was evicted while the recognizer was in use
+                return
+            slot.in_use -= 1
+            slot.last_used = time.monotonic()
+            if discard or self.max_idle == 0:
+                slot.created -= 1
+                self._drop_if_empty(slot)
+            else:
+                if self._idle_total >= self.max_idle:
+                    self._evict_idle()
+                slot.idle.append(rec)
+                self._idle_total += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def acquire(self, model, sample_rate, words=False, partial_words=False, timeout=None):
+        """Context manager yielding a pooled recognizer.
+
+        Recognizers that raised inside the block are discarded rather than reused.
+        """
+        slot, rec = self.checkout(model, sample_rate, words=words, partial_words=partial_words, timeout=timeout)
+        try:
+            yield rec
+        except BaseException:
+            self.checkin(slot, rec, discard=True)
+            raise
+        self.checkin(slot, rec)
+
+    def prewarm(self, model, sample_rate, count=1, words=False, partial_words=False):
+        """Build up to `count` idle recognizers ahead of the first request."""
+        taken = []
+        try:
+            for _ in range(min(count, self.max_size)):
+                taken.append(self.checkout(model, sample_rate, words=words, partial_words=partial_words))
+        finally:
+            for slot, rec in taken:
+                self.checkin(slot, rec)
+
+    def discard_model(self, model):
+        """Drop all recognizers built for `model` (e.g. after registry eviction)."""
+        with self._cond:
+            for key in [k for k, s in self._slots.items() if s.model is model]:
+                self._idle_total -= len(self._slots.pop(key).idle)
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            self._slots.clear()
+            self._idle_total = 0
+            self._cond.notify_all()
+
+    def stats(self):
+        """Return pool counters, totals plus one entry per key."""
+        with self._cond:
+            slots = list(self._slots.values())
+            keys = [{
+                'sample_rate': s.sample_rate,
+                'words': s.options[0],
+                'partial_words': s.options[1],
+                'created': s.created,
+                'idle': len(s.idle),
+                'in_use': s.in_use,
+                'hits': s.hits,
+                'misses': s.misses,
+                'timeouts': s.timeouts,
+            } for s in slots]
+        return {
+            'max_size': self.max_size,
+            'max_idle': self.max_idle,
+            'hits': sum(k['hits'] for k in keys),
+            'misses': sum(k['misses'] for k in keys),
+            'timeouts': sum(k['timeouts'] for k in keys),
+            'in_use': sum(k['in_use'] for k in keys),
+            'idle': sum(k['idle'] for k in keys),
+            'pools': keys,
+        }
+
+
+# module-level default pool
+pool = RecognizerPool()
+registry.add_evict_listener(pool.discard_model)
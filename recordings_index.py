@@ -0,0 +1,293 @@
+"""SQLite catalogue of saved recordings.
+
+Keeps one row per audio file in the recordings folders with its size,
+timestamps, duration, sample rate and transcript, so listing does not need a
+directory walk plus per-file syscalls on every request. The index is brought
+up to date with a single `os.scandir` pass per folder whenever a folder's
+mtime changes (only new or changed files have their headers read), and the
+app updates rows directly when it writes a file or finishes a transcript.
+
+Listing uses keyset (cursor) pagination over an indexed sort column, so a
+page costs the same regardless of how deep into the catalogue it is.
+
+Configuration (environment):
+    RECORDINGS_INDEX_PATH   SQLite file (default: cache/recordings.sqlite3)
+"""
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_DB_PATH = os.environ.get('RECORDINGS_INDEX_PATH', os.path.join('cache', 'recordings.sqlite3'))
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.ogg', '.opus', '.mp3', '.m4a', '.webm', '.3gp')
+
+# sort keys accepted by `query` -> column
+SORT_COLUMNS = {
+    'modified': 'mtime',
+    'created': 'created',
+    'name': 'name',
+    'size': 'size',
+    'duration': 'duration',
+}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS recordings (
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    mtime REAL NOT NULL DEFAULT 0,
+    created REAL NOT NULL DEFAULT 0,
+    duration REAL,
+    sample_rate INTEGER,
+    channels INTEGER,
+    transcript TEXT,
+    status TEXT NOT NULL DEFAULT 'none',
+    PRIMARY KEY (folder, name)
+);
+CREATE INDEX IF NOT EXISTS recordings_mtime ON recordings (mtime, folder, name);
+CREATE INDEX IF NOT EXISTS recordings_created ON recordings (created, folder, name);
+CREATE INDEX IF NOT EXISTS recordings_size ON recordings (size, folder, name);
+CREATE INDEX IF NOT EXISTS recordings_duration ON recordings (duration, folder, name);
+CREATE INDEX IF NOT EXISTS recordings_status ON recordings (status);
+'''
+
+
+def audio_info(path):
+    """Return (duration, sample_rate, channels) from a file's header, or Nones."""
+    try:
+        import soundfile as sf
+        info = sf.info(path)
+        return info.duration, info.samplerate, info.channels
+    except Exception:
+        return None, None, None
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from `query`; raises ValueError if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != 3:
+        raise ValueError('Invalid cursor')
+    return values
+
+
+class RecordingsIndex:
+    """Catalogue of the audio files in `folders` ({key: directory})."""
+
+    def __init__(self, folders, db_path=DEFAULT_DB_PATH):
+        self.folders = dict(folders)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._scan_lock = threading.Lock()
+        self._scanned_mtimes = {}
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # -- keeping the index current ------------------------------------------
+
+    def refresh(self, force=False):
+        """Rescan folders whose mtime changed since the last scan (all if `force`).
+
+        Returns the number of rows added, changed or removed.
+        """
+        changes = 0
+        with self._scan_lock:
+            for key, folder in self.folders.items():
+                try:
+                    mtime = os.stat(folder).st_mtime_ns
+                except FileNotFoundError:
+                    mtime = None
+                if not force and self._scanned_mtimes.get(key) == mtime:
+                    continue
+                changes += self._scan(key, folder)
+                self._scanned_mtimes[key] = mtime
+        return changes
+
+    def _scan(self, key, folder):
+        conn = self._conn()
+        known = {row['name']: (row['size'], row['mtime'])
+                 for row in conn.execute('SELECT name, size, mtime FROM recordings WHERE folder = ?', (key,))}
+        seen = set()
+        upserts = []
+        try:
+            entries = list(os.scandir(folder))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            if not entry.name.lower().endswith(AUDIO_EXTENSIONS) or not entry.is_file():
+                continue
+            seen.add(entry.name)
+            st = entry.stat()
+            if known.get(entry.name) == (st.st_size, st.st_mtime):
+                continue
+            duration, rate, channels = audio_info(entry.path)
+            upserts.append((key, entry.name, st.st_size, st.st_mtime, st.st_mtime, duration, rate, channels))
+        # rows with mtime 0 were added by set_transcript for a file still being written
+        gone = [(key, name) for name, (_size, mtime) in known.items() if name not in seen and mtime]
+        with conn:
+            conn.executemany(
+                'INSERT INTO recordings (folder, name, size, mtime, created, duration, sample_rate, channels) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (folder, name) DO UPDATE SET '
+                'size = excluded.size, mtime = excluded.mtime, duration = excluded.duration, '
+                'sample_rate = excluded.sample_rate, channels = excluded.channels', upserts)
+            conn.executemany('DELETE FROM recordings WHERE folder = ? AND name = ?', gone)
+        return len(upserts) + len(gone)
+
+    def _folder_key(self, path):
+        folder = os.path.abspath(os.path.dirname(path))
+        for key, directory in self.folders.items():
+            if os.path.abspath(directory) == folder:
+                return key
+        raise ValueError(f'{path} is not in an indexed folder')
+
+    def add_file(self, path):
+        """Index (or re-index) a file the app has just finished writing."""
+        st = os.stat(path)
+        duration, rate, channels = audio_info(path)
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT INTO recordings (folder, name, size, mtime, created, duration, sample_rate, channels) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (folder, name) DO UPDATE SET '
+                'size = excluded.size, mtime = excluded.mtime, duration = excluded.duration, '
+                'sample_rate = excluded.sample_rate, channels = excluded.channels',
+                (self._folder_key(path), os.path.basename(path), st.st_size, st.st_mtime, time.time(),
+                 duration, rate, channels))
+
+    def set_transcript(self, path, transcript, status='done'):
+        """Store the transcript of `path`; works before or after `add_file`."""
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT INTO recordings (folder, name, created, transcript, status) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (folder, name) DO UPDATE SET transcript = excluded.transcript, status = excluded.status',
+                (self._folder_key(path), os.path.basename(path), time.time(), transcript, status))
+
+    def remove(self, path):
+        with self._conn() as conn:
+            conn.execute('DELETE FROM recordings WHERE folder = ? AND name = ?',
+                         (self._folder_key(path), os.path.basename(path)))
+
+    def rename(self, old_path, new_path):
+        """Move a row to a new file name (e.g. after re-encoding), keeping its transcript."""
+        st = os.stat(new_path)
+        with self._conn() as conn:
+            conn.execute('UPDATE recordings SET name = ?, size = ?, mtime = ? WHERE folder = ? AND name = ?',
+                         (os.path.basename(new_path), st.st_size, st.st_mtime,
+                          self._folder_key(old_path), os.path.basename(old_path)))
+
+    def total_size(self):
+        """Bytes used by all indexed files."""
+        return self._conn().execute('SELECT COALESCE(SUM(size), 0) FROM recordings').fetchone()[0]
+
+    def oldest(self, limit=100, before=None, suffix=None):
+        """Paths of the least recently modified files, oldest first.
+
+        `before` limits the result to files modified before that time (epoch
+        seconds); `suffix` to names ending in it. Rows for files still being
+        written (added by `set_transcript`, mtime 0) are never returned.
+        """
+        where, args = ['mtime > 0'], []
+        if before is not None:
+            where.append('mtime < ?')
+            args.append(before)
+        if suffix is not None:
+            where.append('name LIKE ?')
+            args.append('%' + suffix)
+        sql = ('SELECT folder, name FROM recordings WHERE ' + ' AND '.join(where)
+               + ' ORDER BY mtime ASC, folder ASC, name ASC LIMIT ?')
+        rows = self._conn().execute(sql, args + [limit]).fetchall()
+        return [os.path.join(self.folders[row['folder']], row['name'])
+                for row in rows if row['folder'] in self.folders]
+
+    # -- listing -------------------------------------------------------------
+
+    def query(self, folder=None, status=None, search=None, min_duration=None, max_duration=None,
+              since=None, until=None, sort='modified', descending=True, limit=50, cursor=None):
+        """Return (rows, next_cursor) for one page of recordings.
+
+        Filters: `folder` key, transcript `status`, `search` (substring of
+        the name or transcript), duration bounds in seconds and modification
+        time bounds (epoch seconds). `cursor` is the `next_cursor` of the
+        previous page; it is None on the last page.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f'Unknown sort key: {sort}')
+        column = SORT_COLUMNS[sort]
+        where, args = [], []
+        if folder is not None:
+            where.append('folder = ?')
+            args.append(folder)
+        if status is not None:
+            where.append('status = ?')
+            args.append(status)
+        if search:
+            where.append("(name LIKE ? ESCAPE '\\' OR transcript LIKE ? ESCAPE '\\')")
+            pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            args += [pattern, pattern]
+        if min_duration is not None:
+            where.append('duration >= ?')
+            args.append(min_duration)
+        if max_duration is not None:
+            where.append('duration <= ?')
+            args.append(max_duration)
+        if since is not None:
+            where.append('mtime >= ?')
+            args.append(since)
+        if until is not None:
+            where.append('mtime < ?')
+            args.append(until)
+
+        # unknown durations sort as -1 so the keyset comparison stays total
+        key_expr = 'COALESCE(duration, -1)' if column == 'duration' else column
+        if cursor is not None:
+            where.append(f'({key_expr}, folder, name) {"<" if descending else ">"} (?, ?, ?)')
+            args += decode_cursor(cursor)
+        order = 'DESC' if descending else 'ASC'
+        sql = (f'SELECT *, {key_expr} AS sort_key FROM recordings'
+               + (' WHERE ' + ' AND '.join(where) if where else '')
+               + f' ORDER BY {key_expr} {order}, folder {order}, name {order} LIMIT ?')
+        rows = self._conn().execute(sql, args + [limit + 1]).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor([last['sort_key'], last['folder'], last['name']])
+        return [self._row_dict(row) for row in rows], next_cursor
+
+    @staticmethod
+    def _row_dict(row):
+        return {
+            'name': row['name'],
+            'folder': row['folder'],
+            'size': row['size'],
+            'modified': datetime.fromtimestamp(row['mtime']).isoformat(),
+            'created': datetime.fromtimestamp(row['created']).isoformat(),
+            'duration': round(row['duration'], 3) if row['duration'] is not None else None,
+            'sample_rate': row['sample_rate'],
+            'channels': row['channels'],
+            'status': row['status'],
+            'transcript': row['transcript'],
+        }
+
+    def count(self):
+        return self._conn().execute('SELECT COUNT(*) FROM recordings').fetchone()[0]
@@ -0,0 +1,310 @@
+"""Content-addressed cache of transcription results.
+
+Results are keyed by a SHA-256 of the normalized PCM plus the model id and
+recognition options, so re-submitting the same audio (client retries,
+duplicate uploads) skips decoding and recognition entirely. Two tiers:
+
+ - an in-memory LRU (per process)
+ - an on-disk SQLite table shared by processes and kept across restarts
+
+Concurrent requests for the same key are coalesced ("single flight"): the
+first caller computes the result, the others wait for it.
+
+Configuration (environment):
+    RESULT_CACHE_PATH     SQLite file (default: cache/results.sqlite3; empty disables the disk tier)
+    RESULT_CACHE_ENTRIES  in-memory LRU size (default: 1024)
+    RESULT_CACHE_MAX_ROWS disk tier size; least recently used rows are deleted (default: 100000)
+    RESULT_CACHE_MAX_AGE_DAYS  disk rows not used for this long are deleted (default: 30)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_DB_PATH = os.environ.get('RESULT_CACHE_PATH', os.path.join('cache', 'results.sqlite3'))
+DEFAULT_MEMORY_ENTRIES = int(os.environ.get('RESULT_CACHE_ENTRIES', '1024'))
+DEFAULT_MAX_ROWS = int(os.environ.get('RESULT_CACHE_MAX_ROWS', '100000'))
+DEFAULT_MAX_AGE = float(os.environ.get('RESULT_CACHE_MAX_AGE_DAYS', '30')) * 86400.0
+# the disk tier is trimmed on open and then every this many writes
+TRIM_EVERY = 100
+
+
+def make_key(digest, model_id, options=None):
+    """Cache key for audio `digest` (hex) recognized by `model_id` with `options`."""
+    opts = json.dumps(options or {}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f'{digest}|{model_id}|{opts}'.encode('utf-8')).hexdigest()
+
+
+class HashingReader:
+    """Wrap an iterable of PCM byte chunks, hashing them as they pass through.
+
+    `hexdigest()` is only meaningful once the iterator is exhausted.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._hash = hashlib.sha256()
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            self._hash.update(chunk)
+            yield chunk
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+class MemoryLRU:
+    """Small thread-safe LRU mapping."""
+
+    def __init__(self, max_entries=DEFAULT_MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class _SqliteTier:
+    """SQLite table of results; the file is created on first use.
+
+    Rows not read for `max_age` seconds are deleted, and beyond `max_rows`
+    the least recently read ones are (see `trim`).
+    """
+
+    def __init__(self, path, max_rows=DEFAULT_MAX_ROWS, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # one connection per thread; WAL lets readers and a writer overlap
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS results ('
+                         'key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute('UPDATE results SET accessed = ? WHERE key = ?', (time.time(), key))
+        conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        now = time.time()
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO results (key, value, created, accessed) VALUES (?, ?, ?, ?)',
+                     (key, json.dumps(value), now, now))
+        conn.commit()
+        with self._lock:
+            self._writes += 1
+            due = self._writes % TRIM_EVERY == 1
+        if due:
+            self.trim()
+
+    def trim(self):
+        """Delete expired rows and the least recently read rows over `max_rows`."""
+        conn = self._conn()
+        if self.max_age > 0:
+            conn.execute('DELETE FROM results WHERE accessed < ?', (time.time() - self.max_age,))
+        if self.max_rows > 0:
+            conn.execute('DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed DESC '
+                         'LIMIT -1 OFFSET ?)', (self.max_rows,))
+        conn.commit()
+
+    def count(self):
+        return self._conn().execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """Two-tier (memory LRU + SQLite) result cache with single-flight coalescing."""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, memory_entries=DEFAULT_MEMORY_ENTRIES):
+        self.memory = MemoryLRU(memory_entries)
+        self.disk = _SqliteTier(db_path) if db_path else None
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._async_flights = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        return self._get_disk(key)
+
+    def _get_disk(self, key):
+        if self.disk is None:
+            return None
+        try:
+            value = self.disk.get(key)
+        except (sqlite3.Error, OSError):
+            value = None
+        if value is not None:
+            self.hits += 1
+            self.disk_hits += 1
+            self.memory.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        self._put_disk(key, value)
+
+    def _put_disk(self, key, value):
+        if self.disk is not None:
+            try:
+                self.disk.put(key, value)
+            except (sqlite3.Error, OSError) as e:
+                print(f'⚠️  Result cache write failed: {e}')
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for `key`, or compute it once.
+
+        Concurrent callers with the same key wait for the first caller's
+        `compute()` instead of running their own. Exceptions are not cached;
+        they are raised in every waiting caller.
+        Returns (value, hit) where hit tells whether compute was skipped.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value, True
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, True
+
+        try:
+            # another leader may have finished between our lookup and the lock
+            value = self.get(key)
+            if value is None:
+                self.misses += 1
+                value = compute()
+                self.put(key, value)
+                flight.value = value
+                return value, False
+            flight.value = value
+            return value, True
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    async def get_or_compute_async(self, key, compute):
+        """asyncio version of `get_or_compute`; `compute` is a coroutine function.
+
+        Only the memory tier is checked on the event loop; SQLite reads and
+        writes run in a worker thread.
+        """
+        import asyncio
+
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits += 1
+            return value, True
+
+        fut = self._async_flights.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fut), True
+
+        fut = asyncio.get_running_loop().create_future()
+        # followers retrieve the exception; avoid "never retrieved" warnings
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._async_flights[key] = fut
+        try:
+            value = await asyncio.to_thread(self._get_disk, key) if self.disk is not None else None
+            hit = value is not None
+            if not hit:
+                self.misses += 1
+                value = await compute()
+                self.memory.put(key, value)
+            fut.set_result(value)
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            self._async_flights.pop(key, None)
+        if not hit:
+            await asyncio.to_thread(self._put_disk, key, value)
+        return value, hit
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': round(self.hits / float(lookups), 3) if lookups else 0.0,
+            'memory_entries': len(self.memory),
+        }
+
+
+# module-level default cache
+cache = ResultCache()
@@ -1,59 +1,407 @@
-"""Simple transcription server that accepts audio uploads, converts to WAV via ffmpeg,
+"""Simple transcription server that accepts audio uploads, decodes them to 16 kHz mono,
 and runs Vosk transcription locally.
 
-Requirements: ffmpeg available on PATH, a Vosk model under ./models/
+WAV/FLAC/OGG uploads are decoded and resampled in-process (audio_decode.py).
+Other formats are piped through ffmpeg's stdin and the PCM it emits is fed to
+the recognizer chunk by chunk, so recognition starts before decoding finishes
+and no intermediate files are written.
+
+Decoding and recognition run in a bounded pool of worker processes (see
+worker_pool.py) so the event loop keeps serving other clients. When the pool
+and its queue are full, requests are rejected at once with 429 and a
+Retry-After header. Tune with TRANSCRIBE_WORKERS and TRANSCRIBE_QUEUE_SIZE.
+
+Live audio can be streamed to the /stream WebSocket instead: send binary
+frames of 16-bit mono PCM (format=pcm, at `sample_rate`, 8000-48000 Hz) or
+Opus in an Ogg/WebM container as produced by MediaRecorder (format=opus),
+then the text "EOF". The server answers with JSON partial and final results as soon as
+they are available (see streaming.py). Recognition for streams runs in this
+process; concurrent streams per model are bounded by the recognizer pool.
+
+Requirements: ffmpeg available on PATH (for compressed formats), a Vosk model under ./models/
+Several models may be installed under ./models/; pick one per request with the
+`model` query parameter (the model's directory name). Pass skip_silence=true to
+drop long non-speech stretches before recognition (see vad.SilenceFilter).
+
+Upload results are cached (result_cache.py) under a hash of the uploaded bytes,
+the model and the options, so a re-sent file is answered without decoding;
+identical uploads in flight at the same time share one transcription. Pass
+cache=false to bypass it.
+
+GET /metrics returns Prometheus text-format metrics (metrics.py): stage
+latency histograms, audio seconds processed, real-time factor, model load
+time, in-flight requests, worker queue depth, cache hit rates and errors.
+
+Pass trace=1 (or an X-Trace: 1 header) to /transcribe to get per-stage
+timings in the response and the log. POST /admin/profile?requests=N starts
+a sampling (mode=sample, folded stacks) or cProfile (mode=cprofile) session
+over the next N transcriptions, run inside the workers; see profiling.py.
+
+At startup the default model is loaded in this process and in every worker
+on a background thread. GET /health/live answers as soon as the app is up;
+GET /health/ready returns 503 until warm-up has finished (state
+loading/ready/failed and the load time are in the body). Requests for the
+default model that arrive during warm-up wait up to MODEL_WAIT_SECONDS and
+then get a 503 with Retry-After. A failed warm-up is retried by a later
+request or readiness check after a backoff.
 Run with: uvicorn server:app --host 0.0.0.0 --port 8000
 """
+import asyncio
+import functools
+import hashlib
+import json
 import os
-import subprocess
-import tempfile
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+import time
+from typing import Optional
+
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 
-import transcribe
+import audio_decode
+import metrics
+import profiling
+import worker_pool
+from model_registry import registry, ModelNotReady, Warmup, MODEL_WAIT_SECONDS
+from recognizer_pool import pool, PoolTimeout
+from result_cache import cache as result_cache, make_key
+from streaming import StreamingSession
 
 app = FastAPI()
+transcription_pool = worker_pool.TranscriptionPool()
+
+
+def _load_default_model():
+    # in-process for /stream (with a recognizer at the default stream rate), then in each worker
+    pool.prewarm(registry.get(), audio_decode.TARGET_RATE, words=True)
+    transcription_pool.warm_up()
+
+
+warmup = Warmup(_load_default_model)
+
+registry.add_load_listener(metrics.observe_model_load)
+metrics.export_stats('stt_result_cache', result_cache.stats, metrics.RESULT_CACHE_FIELDS)
+metrics.callback('stt_model_ready', 'Whether the default model has finished loading.',
+                 lambda: 1 if warmup.ready else 0)
+metrics.export_stats('stt_workers', transcription_pool.stats, {
+    'workers': ('gauge', 'Transcription worker processes.'),
+    'in_flight': ('gauge', 'Jobs running or waiting for a worker.'),
+    'queued': ('gauge', 'Jobs waiting for a free worker.'),
+    'completed': ('counter', 'Jobs finished by the workers.'),
+    'rejected': ('counter', 'Jobs rejected because the queue was full.'),
+})
+
+
+@app.on_event('startup')
+async def start_workers():
+    transcription_pool.start()
+    warmup.start()
+
+
+@app.on_event('shutdown')
+async def stop_workers():
+    transcription_pool.shutdown(wait=False)
+
+
+def find_model_dir(name=None):
+    return registry.find_model_dir(name)
+
+
+@app.get('/models')
+async def list_models():
+    models = registry.available_models(refresh=True)
+    return JSONResponse({'models': [{'name': name} for name in models]})
+
+
+@app.get('/health')
+async def health():
+    return JSONResponse({'status': 'healthy', 'model': warmup.status(), 'workers': transcription_pool.stats(),
+                         'result_cache': result_cache.stats()})
+
+
+@app.get('/health/live')
+async def health_live():
+    """Liveness: the app is up and serving requests"""
+    return JSONResponse({'status': 'alive'})
+
+
+@app.get('/health/ready')
+async def health_ready():
+    """Readiness: 200 once warm-up has finished, 503 while loading or after a failure"""
+    # retries a failed warm-up once its backoff has passed
+    warmup.start()
+    status = dict(warmup.status(), ready=warmup.ready)
+    if warmup.ready:
+        return JSONResponse(status)
+    return JSONResponse(status, status_code=503, headers={'Retry-After': str(warmup.retry_after())})
+
+
+async def _wait_for_warmup(model_dir):
+    """Wait for the startup load if `model_dir` is the default model.
+
+    Raises ModelNotReady if it is still running after MODEL_WAIT_SECONDS or
+    failed (a failed load is retried once its backoff has passed).
+    """
+    if warmup.ready or model_dir != find_model_dir():
+        return
+    await run_in_threadpool(warmup.require, MODEL_WAIT_SECONDS)
+
+
+@app.get('/metrics')
+async def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
-def find_model_dir():
-    root = os.path.join(os.path.dirname(__file__), 'models')
-    if not os.path.exists(root):
-        return None
-    for name in os.listdir(root):
-        p = os.path.join(root, name)
-        if os.path.isdir(p):
-            return p
-    return None
+def _failed(status, detail, error_type, headers=None):
+    """Count a failed /transcribe request and return the HTTPException to raise"""
+    metrics.ERRORS.inc(endpoint='/transcribe', type=error_type)
+    metrics.REQUESTS.inc(endpoint='/transcribe', status=status)
+    return HTTPException(status_code=status, detail=detail, headers=headers)
 
 
 @app.post('/transcribe')
-async def upload_and_transcribe(file: UploadFile = File(...)):
+async def upload_and_transcribe(request: Request, file: UploadFile = File(...), model: Optional[str] = None,
+                                skip_silence: bool = False, cache: bool = True):
+    start = time.perf_counter()
+    stages = metrics.Stages()
+    traced = profiling.trace_requested(request.query_params, request.headers)
+    with metrics.IN_FLIGHT.track(endpoint='/transcribe'), metrics.REQUEST_SECONDS.time(endpoint='/transcribe'):
+        try:
+            result = await _upload_and_transcribe(file, model, skip_silence, cache, stages)
+        except HTTPException as e:
+            # failed requests (counted by _failed) still report their stages
+            stages.observe()
+            if not traced:
+                raise
+            trace = profiling.make_trace(profiling.new_request_id(), '/transcribe', stages,
+                                         time.perf_counter() - start, status=e.status_code, **stages.info)
+            return JSONResponse({'detail': e.detail, 'trace': trace}, status_code=e.status_code, headers=e.headers)
+        with stages.stage('serialize'):
+            response = JSONResponse(result)
+    stages.observe()
+    metrics.REQUESTS.inc(endpoint='/transcribe', status=200)
+    if traced:
+        trace = profiling.make_trace(profiling.new_request_id(), '/transcribe', stages,
+                                     time.perf_counter() - start, cached=result['cached'], **stages.info)
+        response = JSONResponse(dict(result, trace=trace))
+    return response
+
+
+async def _upload_and_transcribe(file, model, skip_silence, cache, stages):
     if not file:
-        raise HTTPException(status_code=400, detail='No file uploaded')
+        raise _failed(400, 'No file uploaded', 'NoFile')
 
-    model_dir = find_model_dir()
+    model_dir = find_model_dir(model)
     if not model_dir:
-        raise HTTPException(status_code=500, detail='No model found on server (place model under models/)')
-
-    suffix = os.path.splitext(file.filename)[1].lower()
-    with tempfile.TemporaryDirectory() as td:
-        in_path = os.path.join(td, 'in' + suffix)
-        out_wav = os.path.join(td, 'out.wav')
-        with open(in_path, 'wb') as f:
-            contents = await file.read()
-            f.write(contents)
-
-        # Convert to WAV 16k mono using ffmpeg
-        cmd = ['ffmpeg', '-y', '-i', in_path, '-ar', '16000', '-ac', '1', out_wav]
-        try:
-            subprocess.check_call(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except subprocess.CalledProcessError:
-            raise HTTPException(status_code=500, detail='ffmpeg conversion failed')
+        if model:
+            raise _failed(404, f'Model not found: {model}', 'ModelNotFound')
+        raise _failed(500, 'No model found on server (place model under models/)', 'NoModel')
+    try:
+        with stages.stage('model'):
+            await _wait_for_warmup(model_dir)
+    except ModelNotReady as e:
+        raise _failed(503, str(e), 'ModelNotReady', headers={'Retry-After': str(e.retry_after)})
 
-        # Transcribe
+    with stages.stage('receive'):
+        contents = await file.read()
+
+    # Decode with ffmpeg and transcribe in a worker process
+    async def compute():
+        start = time.perf_counter()
+        # profiling sessions (profiling.py) run inside the worker
+        profile = profiling.profiler.claim()
         try:
-            text = transcribe.transcribe_wav(out_wav, model_dir=model_dir)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+            text, stats = await transcription_pool.submit(worker_pool.decode_and_transcribe, contents, model_dir,
+                                                          skip_silence, profile)
+        except BaseException:
+            if profile is not None:
+                profiling.profiler.release()
+            raise
+        if profile is not None:
+            profiling.profiler.add(profile[0], stats.pop('profile', None))
+        stages.add('queue', max(0.0, time.perf_counter() - start - stats['worker_seconds']))
+        stages.add('model', stats['model_seconds'])
+        stages.add('decode', stats['decode_seconds'])
+        stages.add('recognize', stats['recognize_seconds'])
+        for name, seconds in stats['model_loads']:
+            metrics.MODEL_LOAD_SECONDS.observe(seconds, model=name)
+        metrics.observe_recognition(stats['audio_seconds'], stats['recognize_seconds'])
+        stages.info['decoder'] = stats.get('decoder')
+        return {'text': text, 'audio_seconds': stats['audio_seconds'], 'skipped_seconds': stats['skipped_seconds']}
+
+    try:
+        if cache:
+            # decoding happens in the workers, so key on the uploaded bytes
+            key = make_key(hashlib.sha256(contents).hexdigest(), os.path.basename(os.path.normpath(model_dir)),
+                           {'skip_silence': skip_silence, 'input': 'upload'})
+            result, cached = await result_cache.get_or_compute_async(key, compute)
+        else:
+            result, cached = await compute(), False
+    except worker_pool.QueueFull as e:
+        raise _failed(429, str(e), 'QueueFull', headers={'Retry-After': str(e.retry_after)})
+    except worker_pool.PoolUnavailable as e:
+        raise _failed(503, str(e), 'PoolUnavailable', headers={'Retry-After': str(e.retry_after)})
+    except Exception as e:
+        raise _failed(500, str(e), type(e).__name__)
+
+    return dict(result, cached=cached)
+
+
+def _check_admin(request):
+    if not profiling.admin_allowed(request.client.host if request.client else None,
+                                   request.headers.get('X-Admin-Token')):
+        raise HTTPException(status_code=403, detail='Admin access denied')
+
+
+@app.post('/admin/profile')
+async def start_profile(request: Request, requests: int = 10, mode: str = 'sample', interval_ms: float = 5.0):
+    """Profile the next `requests` transcriptions (in the workers) and write a dump"""
+    _check_admin(request)
+    try:
+        return JSONResponse(profiling.profiler.start(requests, mode, interval_ms / 1000.0))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get('/admin/profile')
+async def profile_status(request: Request):
+    _check_admin(request)
+    return JSONResponse(profiling.profiler.status())
+
+
+@app.delete('/admin/profile')
+async def stop_profile(request: Request):
+    """End the running session early and write what it captured"""
+    _check_admin(request)
+    return JSONResponse({'stopped': profiling.profiler.stop(), 'last': profiling.profiler.last})
+
+
+@app.get('/admin/profile/download')
+async def download_profile(request: Request):
+    """The dump of the last finished session"""
+    _check_admin(request)
+    last = profiling.profiler.last
+    if not last or not last['path'] or not os.path.exists(last['path']):
+        raise HTTPException(status_code=404, detail='No profile available')
+    return FileResponse(last['path'], filename=os.path.basename(last['path']))
+
+
+# PCM sample rates accepted on /stream
+MIN_STREAM_RATE = 8000
+MAX_STREAM_RATE = 48000
+
+
+def _is_eof(text):
+    """Clients end a stream with the text "EOF" or a JSON object {"eof": 1}."""
+    text = (text or '').strip()
+    if text.upper() == 'EOF':
+        return True
+    try:
+        return bool(json.loads(text).get('eof'))
+    except (ValueError, AttributeError):
+        return False
+
+
+@app.websocket('/stream')
+async def stream_transcribe(websocket: WebSocket, model: Optional[str] = None, sample_rate: int = 16000,
+                            format: str = 'pcm', partial_interval_ms: int = 200, idle_timeout_ms: int = 800,
+                            max_utterance_s: float = 30.0):
+    await websocket.accept()
+    with metrics.IN_FLIGHT.track(endpoint='/stream'):
+        await _stream_transcribe(websocket, model, sample_rate, format, partial_interval_ms, idle_timeout_ms,
+                                 max_utterance_s)
+
+
+async def _stream_transcribe(websocket, model, sample_rate, format, partial_interval_ms, idle_timeout_ms,
+                             max_utterance_s):
+    model_dir = find_model_dir(model)
+    if not model_dir:
+        await websocket.send_json({'type': 'error', 'error': f'Model not found: {model}' if model else 'No model found on server'})
+        await websocket.close(code=1008)
+        return
+    if format not in ('pcm', 'opus'):
+        await websocket.send_json({'type': 'error', 'error': f'Unsupported format: {format}'})
+        await websocket.close(code=1003)
+        return
+    if not MIN_STREAM_RATE <= sample_rate <= MAX_STREAM_RATE:
+        await websocket.send_json({'type': 'error', 'error': f'Unsupported sample_rate: {sample_rate} '
+                                                             f'(expected {MIN_STREAM_RATE}-{MAX_STREAM_RATE})'})
+        await websocket.close(code=1003)
+        return
+
+    try:
+        await _wait_for_warmup(model_dir)
+    except ModelNotReady as e:
+        metrics.ERRORS.inc(endpoint='/stream', type='ModelNotReady')
+        await websocket.send_json({'type': 'error', 'error': str(e), 'retry_after': e.retry_after})
+        await websocket.close(code=1013)
+        return
+
+    try:
+        loaded = await run_in_threadpool(registry.load, model_dir)
+    except Exception as e:
+        await websocket.send_json({'type': 'error', 'error': str(e)})
+        await websocket.close(code=1011)
+        return
+
+    # Opus is decoded by a long-running ffmpeg process to the model rate
+    rate = audio_decode.TARGET_RATE if format == 'opus' else sample_rate
+    try:
+        slot, rec = await run_in_threadpool(functools.partial(pool.checkout, loaded, rate, words=True, timeout=0))
+    except PoolTimeout:
+        metrics.ERRORS.inc(endpoint='/stream', type='PoolTimeout')
+        await websocket.send_json({'type': 'error', 'error': 'Too many concurrent streams'})
+        await websocket.close(code=1013)
+        return
+
+    decoder = None
+    session = StreamingSession(rec, rate, partial_interval=partial_interval_ms / 1000.0,
+                               max_utterance=max_utterance_s)
+    idle_timeout = idle_timeout_ms / 1000.0 if idle_timeout_ms > 0 else None
+    try:
+        if format == 'opus':
+            decoder = audio_decode.FfmpegStreamDecoder(rate)
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), timeout=idle_timeout)
+            except asyncio.TimeoutError:
+                # no audio for a while: finalize whatever has been said, including
+                # audio the Opus decoder still holds
+                if decoder is not None:
+                    for msg in await run_in_threadpool(session.accept, decoder.read()):
+                        await websocket.send_json(msg)
+                msg = await run_in_threadpool(session.flush)
+                if msg:
+                    await websocket.send_json(msg)
+                continue
+
+            if message['type'] == 'websocket.disconnect':
+                return
+            data = message.get('bytes')
+            if data is None:
+                if _is_eof(message.get('text')):
+                    break
+                continue
+            if decoder is not None:
+                await run_in_threadpool(decoder.feed, data)
+                data = decoder.read()
+            for msg in await run_in_threadpool(session.accept, data):
+                await websocket.send_json(msg)
 
-    return JSONResponse({'text': text})
+        if decoder is not None:
+            for msg in await run_in_threadpool(session.accept, await run_in_threadpool(decoder.finish)):
+                await websocket.send_json(msg)
+        await websocket.send_json(await run_in_threadpool(session.finish))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except audio_decode.DecodeError as e:
+        metrics.ERRORS.inc(endpoint='/stream', type='DecodeError')
+        await websocket.send_json({'type': 'error', 'error': str(e)})
+        await websocket.close(code=1003)
+    finally:
+        if decoder is not None:
+            decoder.close()
+        pool.checkin(slot, rec)
@@ -16,6 +16,7 @@ import tempfile
 import time
 
 import audio_utils
+import model_registry
 import transcribe
 
 
@@ -43,22 +44,14 @@ def main():
     print('Visuals saved to', a_out, s_out)
 
     print('Transcribing...')
-    app_root = os.path.dirname(__file__)
-    # find first model under models/
-    model_dir = None
-    mroot = os.path.join(app_root, 'models')
-    if os.path.exists(mroot):
-        for name in os.listdir(mroot):
-            p = os.path.join(mroot, name)
-            if os.path.isdir(p):
-                model_dir = p
-                break
+    # first model under models/ (or the one named by SMOKE_MODEL)
+    model_dir = model_registry.find_model_dir(os.environ.get('SMOKE_MODEL'))
 
     if not model_dir:
         print('No model found under models/. Please download a Vosk model as described in README.')
         return 3
 
-    text = transcribe.transcribe_wav(wav, model_dir=model_dir)
+    text = transcribe.transcribe_wav(wav, model=model_registry.registry.load(model_dir))
     print('Transcription result:')
     print(text)
 
@@ -0,0 +1,78 @@
+"""Incremental recognition state for live (WebSocket) transcription.
+
+A StreamingSession wraps one KaldiRecognizer and turns incoming PCM into the
+messages sent back to the client:
+
+    {"type": "partial", "partial": "hello wor"}
+    {"type": "final", "text": "hello world", "result": [...], "start": 0.0, "end": 1.4}
+
+Endpointing: Kaldi finalizes an utterance on its own when it detects
+trailing silence. On top of that the session finalizes when no audio has
+arrived for `idle_timeout` seconds (see `flush`) or when an utterance
+grows longer than `max_utterance` seconds.
+"""
+import json
+import time
+
+
+class StreamingSession:
+    def __init__(self, rec, sample_rate, partial_interval=0.2, max_utterance=30.0):
+        self.rec = rec
+        self.sample_rate = float(sample_rate)
+        self.partial_interval = partial_interval
+        self.max_utterance = max_utterance
+        self.audio_seconds = 0.0
+        self._utterance_start = 0.0
+        self._last_partial = ''
+        self._last_partial_at = 0.0
+
+    def _final(self, raw):
+        j = json.loads(raw)
+        msg = {
+            'type': 'final',
+            'text': j.get('text', ''),
+            'result': j.get('result', []),
+            'start': round(self._utterance_start, 3),
+            'end': round(self.audio_seconds, 3),
+        }
+        self._utterance_start = self.audio_seconds
+        self._last_partial = ''
+        return msg
+
+    def accept(self, pcm):
+        """Feed s16le mono PCM and return the list of messages to send."""
+        if not pcm:
+            return []
+        self.audio_seconds += len(pcm) / 2.0 / self.sample_rate
+        if self.rec.AcceptWaveform(pcm):
+            return [self._final(self.rec.Result())]
+
+        if self.max_utterance and self.audio_seconds - self._utterance_start >= self.max_utterance:
+            return [self._final(self.rec.FinalResult())]
+
+        now = time.monotonic()
+        if now - self._last_partial_at < self.partial_interval:
+            return []
+        partial = json.loads(self.rec.PartialResult()).get('partial', '')
+        if partial == self._last_partial:
+            return []
+        self._last_partial = partial
+        self._last_partial_at = now
+        return [{'type': 'partial', 'partial': partial}]
+
+    def flush(self):
+        """Finalize the current utterance if it has pending text (idle endpoint).
+
+        Returns the final message, or None if there was nothing to finalize.
+        """
+        if not self._last_partial:
+            partial = json.loads(self.rec.PartialResult()).get('partial', '')
+            if not partial:
+                return None
+        return self._final(self.rec.FinalResult())
+
+    def finish(self):
+        """Finalize at end of stream; always returns a final message."""
+        msg = self._final(self.rec.FinalResult())
+        msg['eof'] = True
+        return msg
@@ -0,0 +1,205 @@
+import hashlib
+import io
+import os
+import tarfile
+import threading
+import time
+import zipfile
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import model_downloader
+
+SEGMENT = 64 * 1024
+MODEL_BYTES = 1024 * 1024
+
+
+class _Server:
+    """Serves files from `root` with byte ranges, an ETag and optional failures."""
+
+    def __init__(self, root):
+        self.root = root
+        self.ranges = True
+        # ranges starting at or after this offset answer 500
+        self.fail_from = None
+        self.requested = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(SimpleHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_head(self):
+                path = os.path.join(server.root, self.path.lstrip('/'))
+                if not os.path.isfile(path):
+                    self.send_error(404)
+                    return None
+                with open(path, 'rb') as f:
+                    data = f.read()
+                rng = self.headers.get('Range') if server.ranges else None
+                if rng:
+                    start, end = rng.split('=', 1)[1].split('-')
+                    start, end = int(start), int(end) if end else len(data) - 1
+                    with server.lock:
+                        server.requested.append(start)
+                    if server.fail_from is not None and start >= server.fail_from:
+                        self.send_error(500)
+                        return None
+                    body = data[start:end + 1]
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+                else:
+                    body = data
+                    self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                if server.ranges:
+                    self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('ETag', '"v1"')
+                self.end_headers()
+                return io.BytesIO(body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}/'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # no retry backoff in tests
+    monkeypatch.setattr(model_downloader.time, 'sleep', lambda seconds: None)
+    root = tmp_path / 'srv'
+    root.mkdir()
+    srv = _Server(str(root))
+    yield srv
+    srv.httpd.shutdown()
+    srv.httpd.server_close()
+
+
+@pytest.fixture
+def model_files():
+    return {
+        'am/final.mdl': os.urandom(MODEL_BYTES),
+        'conf/model.conf': b'--sample-frequency=16000\n',
+    }
+
+
+def _archive(root, name, files):
+    path = os.path.join(root, name)
+    if name.endswith('.zip'):
+        with zipfile.ZipFile(path, 'w') as z:
+            for rel, data in files.items():
+                z.writestr(f'vosk-model-test/{rel}', data)
+    else:
+        with tarfile.open(path, 'w:gz') as t:
+            for rel, data in files.items():
+                info = tarfile.TarInfo(f'vosk-model-test/{rel}')
+                info.size = len(data)
+                t.addfile(info, io.BytesIO(data))
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _installed(path, files):
+    for rel, data in files.items():
+        with open(os.path.join(path, rel), 'rb') as f:
+            if f.read() != data:
+                return False
+    return True
+
+
+def _leftovers(dest):
+    return [name for name in os.listdir(dest) if name.startswith(('.tmp-', '.old-'))]
+
+
+@pytest.mark.parametrize('name', ['vosk-model-test.tar.gz', 'vosk-model-test.zip'])
+def test_parallel_download_installs_model(tmp_path, server, model_files, name):
+    digest = _archive(server.root, name, model_files)
+    dest = str(tmp_path / 'models')
+    progress = []
+
+    path = model_downloader.download_and_extract(server.url + name, dest, progress_callback=progress.append,
+                                                 checksum='sha256:' + digest, connections=4,
+                                                 segment_size=SEGMENT)
+
+    assert path == os.path.join(dest, 'vosk-model-test')
+    assert _installed(path, model_files)
+    assert model_downloader.is_complete_model(path)
+    size = os.path.getsize(os.path.join(server.root, name))
+    assert sorted(server.requested)[-1] >= size - SEGMENT
+    assert len(set(server.requested)) == -(-size // SEGMENT)
+    assert progress[-1] == 100
+    assert os.listdir(os.path.join(dest, model_downloader.DOWNLOADS_DIR)) == []
+    assert _leftovers(dest) == []
+
+
+def test_resume_after_failure(tmp_path, server, model_files):
+    name = 'vosk-model-test.tar.gz'
+    digest = _archive(server.root, name, model_files)
+    dest = str(tmp_path / 'models')
+    state_path = os.path.join(dest, model_downloader.DOWNLOADS_DIR, name + '.part.json')
+
+    server.fail_from = 4 * SEGMENT
+    with pytest.raises(Exception):
+        model_downloader.download_and_extract(server.url + name, dest, checksum=digest, connections=2,
+                                              segment_size=SEGMENT)
+    assert not os.path.exists(os.path.join(dest, 'vosk-model-test'))
+    assert _leftovers(dest) == []
+    # the download threads have stopped: the resume state no longer changes
+    with open(state_path) as f:
+        state = f.read()
+    time.sleep(0.2)
+    with open(state_path) as f:
+        assert f.read() == state
+
+    server.fail_from = None
+    server.requested.clear()
+    path = model_downloader.download_and_extract(server.url + name, dest, checksum=digest, connections=2,
+                                                 segment_size=SEGMENT)
+
+    assert _installed(path, model_files)
+    # segments finished before the failure were not fetched again
+    assert min(server.requested) >= SEGMENT
+    assert not os.path.exists(state_path)
+
+
+def test_checksum_mismatch_discards_download(tmp_path, server, model_files):
+    name = 'vosk-model-test.zip'
+    _archive(server.root, name, model_files)
+    dest = str(tmp_path / 'models')
+
+    with pytest.raises(model_downloader.ChecksumError):
+        model_downloader.download_and_extract(server.url + name, dest, checksum='sha256:' + '0' * 64,
+                                              segment_size=SEGMENT)
+
+    assert os.listdir(dest) == [model_downloader.DOWNLOADS_DIR]
+    assert os.listdir(os.path.join(dest, model_downloader.DOWNLOADS_DIR)) == []
+
+
+def test_install_replaces_incomplete_model(tmp_path, server, model_files):
+    name = 'vosk-model-test.tar.gz'
+    digest = _archive(server.root, name, model_files)
+    dest = tmp_path / 'models'
+    # left behind by an interrupted extraction
+    (dest / 'vosk-model-test' / 'conf').mkdir(parents=True)
+    assert model_downloader.ensure_vosk_model(str(dest)) is None
+
+    server.ranges = False
+    path = model_downloader.ensure_vosk_model(str(dest), server.url + name, checksum=digest)
+
+    assert path == str(dest / 'vosk-model-test')
+    assert _installed(path, model_files)
+    assert _leftovers(str(dest)) == []
+    assert model_downloader.ensure_vosk_model(str(dest)) == path
+
+
+def test_archive_without_model_is_not_installed(tmp_path, server):
+    name = 'vosk-model-test.tar.gz'
+    _archive(server.root, name, {'README': b'not a model'})
+    dest = str(tmp_path / 'models')
+
+    with pytest.raises(RuntimeError):
+        model_downloader.download_and_extract(server.url + name, dest, segment_size=SEGMENT)
+
+    assert os.listdir(dest) == [model_downloader.DOWNLOADS_DIR]
@@ -0,0 +1,68 @@
+import json
+import sys
+import tracemalloc
+import types
+
+import numpy as np
+import pytest
+
+import transcribe
+from recognizer_pool import RecognizerPool
+
+# bytes of audio per second of the 16 kHz stereo int16 test files
+BYTES_PER_SECOND = 16000 * 2 * 2
+PEAK_LIMIT = 512 * 1024
+
+
+class _StubRecognizer:
+    """Counts the bytes it is fed and keeps nothing else."""
+
+    def __init__(self, model, sample_rate):
+        self.nbytes = 0
+
+    def AcceptWaveform(self, data):
+        self.nbytes += len(data)
+        return False
+
+    def Result(self):
+        return json.dumps({'text': ''})
+
+    def FinalResult(self):
+        return json.dumps({'text': f'{self.nbytes} bytes'})
+
+    def Reset(self):
+        self.nbytes = 0
+
+
+@pytest.fixture
+def stub_vosk(monkeypatch):
+    vosk = types.ModuleType('vosk')
+    vosk.KaldiRecognizer = _StubRecognizer
+    monkeypatch.setitem(sys.modules, 'vosk', vosk)
+    monkeypatch.setattr(transcribe, 'pool', RecognizerPool())
+
+
+def _write_stereo_wav(path, seconds):
+    import soundfile as sf
+
+    rng = np.random.default_rng(0)
+    with sf.SoundFile(path, 'w', samplerate=16000, channels=2, subtype='PCM_16') as f:
+        for _ in range(int(seconds)):
+            f.write((rng.standard_normal((16000, 2)) * 3000).astype(np.int16))
+
+
+@pytest.mark.parametrize('seconds', [30, 300])
+def test_transcribe_wav_memory_does_not_grow_with_file_length(tmp_path, stub_vosk, seconds):
+    path = str(tmp_path / 'long.wav')
+    _write_stereo_wav(path, seconds)
+
+    tracemalloc.start()
+    try:
+        text = transcribe.transcribe_wav(path, model=object())
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # mono 16-bit output: half the stereo input
+    assert text == f'{seconds * BYTES_PER_SECOND // 2} bytes'
+    assert peak < PEAK_LIMIT, f'peak {peak} bytes for a {seconds * BYTES_PER_SECOND} byte file'
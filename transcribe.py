@@ -1,21 +1,20 @@
 import os
 import json
-import soundfile as sf
+import numpy as np
 
-try:
-    from vosk import Model, KaldiRecognizer
-except Exception:
-    Model = None
-    KaldiRecognizer = None
+from model_registry import registry, import_vosk
+from recognizer_pool import pool
+from vad import SilenceFilter
 
+# samples per AcceptWaveform call
+CHUNK = 4000
 
-def transcribe_wav(wav_path, model_dir='models'):
-    """Transcribe a WAV file using Vosk offline model.
 
-    Returns the full recognized text. Raises an error if model not found or Vosk not installed.
-    """
-    if Model is None or KaldiRecognizer is None:
-        raise RuntimeError('Vosk not installed. Please install `vosk` and a model.')
+def _resolve_model(model_dir, model):
+    import_vosk()
+
+    if model is not None:
+        return model
 
     if model_dir is None:
         raise FileNotFoundError('model_dir is None. Please provide a model directory path.')
@@ -23,27 +22,156 @@ def transcribe_wav(wav_path, model_dir='models'):
     if not os.path.exists(model_dir):
         raise FileNotFoundError(f'Model directory not found: {model_dir}. Please download a Vosk model and place it there.')
 
-    model = Model(model_dir)
+    return registry.load(model_dir)
 
-    data, samplerate = sf.read(wav_path, dtype='int16')
-    # If stereo, convert to mono by averaging channels
-    if data.ndim > 1:
-        data = data.mean(axis=1).astype('int16')
 
-    rec = KaldiRecognizer(model, samplerate)
+def _recognize(rec, chunks, samplerate=16000, skip_silence=False, stats=None):
+    """Feed PCM byte chunks to `rec` and return the joined text.
 
+    With `skip_silence`, chunks pass through a vad.SilenceFilter first. If a
+    `stats` dict is given, 'audio_seconds' and 'skipped_seconds' are set.
+    """
+    silence = SilenceFilter(samplerate) if skip_silence else None
+    nbytes = 0
     results = []
-    # Process in chunks
-    CHUNK = 4000
-    idx = 0
-    while idx < len(data):
-        chunk = data[idx:idx+CHUNK].tobytes()
-        if rec.AcceptWaveform(chunk):
+
+    def accept(chunk):
+        if chunk and rec.AcceptWaveform(chunk):
             j = json.loads(rec.Result())
             results.append(j.get('text', ''))
-        idx += CHUNK
+
+    for chunk in chunks:
+        nbytes += len(chunk)
+        accept(silence.process(chunk) if silence is not None else chunk)
+    if silence is not None:
+        accept(silence.flush())
 
     final = json.loads(rec.FinalResult())
     results.append(final.get('text', ''))
 
+    if stats is not None:
+        stats['audio_seconds'] = round(nbytes / 2.0 / samplerate, 3)
+        stats['skipped_seconds'] = round(silence.skipped_seconds, 3) if silence is not None else 0.0
     return ' '.join([r for r in results if r])
+
+
+def _pcm_blocks(sf_file, start=0, stop=None):
+    """Yield s16le mono PCM bytes from an open SoundFile, CHUNK frames at a time.
+
+    Only one block is in memory at a time; multi-channel blocks are downmixed
+    with integer arithmetic (no float copies).
+    """
+    frames = -1 if stop is None else max(0, stop - start)
+    if start:
+        sf_file.seek(start)
+    # one reusable read buffer for the whole file
+    out = np.empty((CHUNK, sf_file.channels), dtype=np.int16)
+    for block in sf_file.blocks(frames=frames, dtype='int16', always_2d=True, out=out):
+        if block.shape[1] == 1:
+            yield block.tobytes()
+        else:
+            # If stereo, convert to mono by averaging channels
+            yield (block.sum(axis=1, dtype=np.int32) // block.shape[1]).astype(np.int16).tobytes()
+
+
+def transcribe_wav(wav_path, model_dir='models', model=None, skip_silence=False, stats=None):
+    """Transcribe a WAV file using Vosk offline model.
+
+    The model comes from the shared registry, so it is loaded once per process.
+    Pass `model` to use an already loaded model instead of `model_dir`.
+    With `skip_silence`, long non-speech stretches are dropped before
+    recognition; pass a `stats` dict to get 'audio_seconds' and 'skipped_seconds'.
+
+    Returns the full recognized text. Raises an error if model not found or Vosk not installed.
+    """
+    import soundfile as sf
+
+    model = _resolve_model(model_dir, model)
+
+    # Read and process in fixed-size blocks so memory doesn't grow with file length
+    with sf.SoundFile(wav_path) as f:
+        samplerate = f.samplerate
+        # Reuse a pooled recognizer for this model and sample rate
+        with pool.acquire(model, samplerate) as rec:
+            return _recognize(rec, _pcm_blocks(f), samplerate, skip_silence, stats)
+
+
+def transcribe_pcm_stream(chunks, samplerate=16000, model_dir='models', model=None, skip_silence=False, stats=None):
+    """Transcribe raw 16-bit mono PCM arriving as an iterable of byte chunks.
+
+    Chunks are fed to the recognizer as they are produced (e.g. from
+    `audio_decode.ffmpeg_pcm_stream`), so recognition overlaps decoding.
+    `skip_silence` and `stats` work as in `transcribe_wav`.
+    Returns the full recognized text.
+    """
+    model = _resolve_model(model_dir, model)
+
+    with pool.acquire(model, samplerate) as rec:
+        return _recognize(rec, chunks, samplerate, skip_silence, stats)
+
+
+def _init_segment_worker(model_dir):
+    registry.load(model_dir)
+
+
+def _transcribe_segment(wav_path, start, stop, model_dir):
+    """Transcribe samples [start, stop) of `wav_path` (runs in a worker process)."""
+    import soundfile as sf
+
+    model = registry.load(model_dir)
+    with sf.SoundFile(wav_path) as f:
+        samplerate = f.samplerate
+        with pool.acquire(model, samplerate) as rec:
+            return _recognize(rec, _pcm_blocks(f, start, stop), samplerate)
+
+
+def transcribe_long(wav_path, model_dir='models', max_segment_s=30.0, workers=None):
+    """Transcribe a long recording by splitting it at silences and decoding segments in parallel.
+
+    Segments are at most `max_segment_s` long and are spread over `workers`
+    processes (default: CPU count), each of which loads the model once.
+    Returns a list of {'start', 'end', 'text'} dicts in order (times in seconds);
+    join the texts for the full transcript.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import vad
+
+    import_vosk()
+    if model_dir is None or not os.path.exists(model_dir):
+        raise FileNotFoundError(f'Model directory not found: {model_dir}. Please download a Vosk model and place it there.')
+
+    energies, samplerate, total = vad.frame_energy_db_file(wav_path)
+    segments = vad.split_on_silence(energies, samplerate, total, max_segment_s=max_segment_s)
+
+    workers = min(workers or os.cpu_count() or 1, len(segments))
+    if workers <= 1:
+        texts = [_transcribe_segment(wav_path, s, e, model_dir) for s, e in segments]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_segment_worker,
+                                 initargs=(model_dir,)) as executor:
+            futures = [executor.submit(_transcribe_segment, wav_path, s, e, model_dir) for s, e in segments]
+            texts = [f.result() for f in futures]
+
+    return [{'start': round(s / float(samplerate), 3), 'end': round(e / float(samplerate), 3), 'text': t}
+            for (s, e), t in zip(segments, texts)]
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='Transcribe a WAV file with Vosk.')
+    parser.add_argument('wav')
+    parser.add_argument('-m', '--model-dir', default=None, help='model directory (default: first under models/)')
+    parser.add_argument('--long', action='store_true', help='split at silences and decode segments in parallel')
+    parser.add_argument('--max-segment', type=float, default=30.0, help='maximum segment length in seconds (--long)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes for --long (default: CPU count)')
+    args = parser.parse_args()
+
+    model_dir = args.model_dir or registry.find_model_dir()
+    if args.long:
+        for seg in transcribe_long(args.wav, model_dir, max_segment_s=args.max_segment, workers=args.workers):
+            print(f"[{seg['start']:8.2f} - {seg['end']:8.2f}] {seg['text']}")
+    else:
+        print(transcribe_wav(args.wav, model_dir))
+    sys.exit(0)
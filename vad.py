@@ -0,0 +1,212 @@
+"""Energy-based voice activity helpers (NumPy, vectorized).
+
+Frame energies are computed in dBFS over fixed-length frames. The silence
+threshold adapts to the recording: it sits a margin above the noise floor
+(a low percentile of the frame energies), but never below an absolute floor.
+
+`SilenceFilter` uses the same energies to drop long non-speech stretches
+from a PCM stream before it reaches the recognizer.
+"""
+import numpy as np
+
+FRAME_MS = 30
+# dB above the estimated noise floor that still counts as silence
+NOISE_MARGIN_DB = 10.0
+# frames quieter than this are always silence
+SILENCE_FLOOR_DB = -55.0
+
+
+def frame_energy_db(samples, samplerate, frame_ms=FRAME_MS):
+    """Return the energy in dBFS of each whole `frame_ms` frame of int16 `samples`."""
+    frame = max(1, int(samplerate * frame_ms / 1000))
+    n = len(samples) // frame
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    x = np.asarray(samples[:n * frame], dtype=np.float32).reshape(n, frame)
+    power = np.einsum('ij,ij->i', x, x) / frame
+    return 10.0 * np.log10(power / (32768.0 ** 2) + 1e-10)
+
+
+def frame_energy_db_file(path, frame_ms=FRAME_MS, block_frames=2000):
+    """Frame energies of a sound file, read blockwise so memory stays bounded.
+
+    Returns (energies, samplerate, total_samples). Channels are averaged.
+    """
+    import soundfile as sf
+
+    info = sf.info(path)
+    frame = max(1, int(info.samplerate * frame_ms / 1000))
+    parts = []
+    carry = np.zeros(0, dtype=np.int16)
+    for block in sf.blocks(path, blocksize=frame * block_frames, dtype='int16', always_2d=True):
+        mono = block.sum(axis=1, dtype=np.int32) // block.shape[1]
+        if len(carry):
+            mono = np.concatenate([carry, mono])
+        n = len(mono) // frame * frame
+        parts.append(frame_energy_db(mono[:n], info.samplerate, frame_ms))
+        carry = mono[n:]
+    energies = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+    return energies, info.samplerate, info.frames
+
+
+def silence_threshold(energies):
+    """Adaptive silence threshold in dBFS for a set of frame energies."""
+    if len(energies) == 0:
+        return SILENCE_FLOOR_DB
+    noise_floor = float(np.percentile(energies, 10))
+    return max(noise_floor + NOISE_MARGIN_DB, SILENCE_FLOOR_DB)
+
+
+def _runs(mask):
+    """Return (starts, ends) of the runs of True in boolean array `mask`."""
+    padded = np.concatenate([[False], mask, [False]])
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return edges[0::2], edges[1::2]
+
+
+def split_on_silence(energies, samplerate, total_samples, max_segment_s=30.0,
+                     min_silence_ms=300, frame_ms=FRAME_MS, threshold_db=None):
+    """Split a signal into segments at silence boundaries.
+
+    Cuts are placed in the middle of silent stretches at least
+    `min_silence_ms` long. No segment exceeds `max_segment_s`; if a stretch
+    of speech is longer than that, it is cut at its quietest frame.
+    Returns a list of (start_sample, end_sample).
+    """
+    frame = max(1, int(samplerate * frame_ms / 1000))
+    n = len(energies)
+    max_frames = max(1, int(max_segment_s * 1000 / frame_ms))
+    if threshold_db is None:
+        threshold_db = silence_threshold(energies)
+
+    starts, ends = _runs(energies < threshold_db)
+    long_enough = (ends - starts) >= max(1, int(min_silence_ms / frame_ms))
+    cuts = ((starts[long_enough] + ends[long_enough]) // 2)
+
+    segments = []
+    seg_start = 0
+    while n - seg_start > max_frames:
+        limit = seg_start + max_frames
+        # last silence cut that keeps the segment within the limit
+        i = np.searchsorted(cuts, limit, side='right') - 1
+        if i >= 0 and cuts[i] > seg_start:
+            cut = int(cuts[i])
+        else:
+            # no usable silence: cut at the quietest frame of the second half
+            lo = seg_start + max_frames // 2
+            cut = lo + int(np.argmin(energies[lo:limit]))
+            cut = max(cut, seg_start + 1)
+        segments.append((seg_start, cut))
+        seg_start = cut
+    segments.append((seg_start, n))
+
+    out = [(s * frame, e * frame) for s, e in segments]
+    # the tail that didn't fill a whole frame belongs to the last segment
+    out[-1] = (out[-1][0], total_samples)
+    return out
+
+
+class SilenceFilter:
+    """Streaming pre-filter that removes non-speech frames from int16 mono PCM.
+
+    A frame is kept if any frame within `padding_ms` after it or
+    `hangover_ms` before it is speech, so word onsets and tails are not
+    clipped. Of every remaining silent stretch only the first
+    `keep_silence_ms` is passed on, which keeps pauses visible to the
+    recognizer's endpointing while skipping the rest. Output lags input by
+    the padding length; call `flush` at end of stream.
+
+    Usage:
+        f = SilenceFilter(16000)
+        for chunk in chunks:
+            rec.AcceptWaveform(f.process(chunk))
+        rec.AcceptWaveform(f.flush())
+        print(f.skipped_seconds)
+    """
+
+    def __init__(self, samplerate, threshold_db=None, hangover_ms=300, padding_ms=150,
+                 keep_silence_ms=200, frame_ms=FRAME_MS):
+        self.samplerate = samplerate
+        self.threshold_db = threshold_db
+        self.frame = max(1, int(samplerate * frame_ms / 1000))
+        self.hangover = int(round(hangover_ms / float(frame_ms)))
+        self.padding = int(round(padding_ms / float(frame_ms)))
+        self.keep_silence = int(round(keep_silence_ms / float(frame_ms)))
+        self.total_frames = 0
+        self.skipped_frames = 0
+        self._noise_floor = SILENCE_FLOOR_DB - NOISE_MARGIN_DB
+        self._rem = np.zeros(0, dtype=np.int16)
+        self._frames = np.zeros((0, self.frame), dtype=np.int16)
+        self._flags = np.zeros(0, dtype=bool)
+        self._history = np.zeros(self.hangover, dtype=bool)
+        self._silent_run = 0
+
+    @property
+    def skipped_seconds(self):
+        return self.skipped_frames * self.frame / float(self.samplerate)
+
+    @property
+    def total_seconds(self):
+        return self.total_frames * self.frame / float(self.samplerate)
+
+    def _threshold(self, energies):
+        if self.threshold_db is not None:
+            return self.threshold_db
+        if len(energies):
+            # the noise floor starts low (so leading speech is never dropped),
+            # follows quiet chunks down at once and rises slowly otherwise
+            chunk_floor = float(np.percentile(energies, 10))
+            self._noise_floor = min(chunk_floor, self._noise_floor + 0.05 * len(energies))
+        return max(self._noise_floor + NOISE_MARGIN_DB, SILENCE_FLOOR_DB)
+
+    def process(self, pcm, final=False):
+        """Filter a chunk of s16le PCM bytes; returns the bytes to recognize."""
+        samples = np.frombuffer(pcm, dtype=np.int16) if pcm else np.zeros(0, dtype=np.int16)
+        if len(self._rem):
+            samples = np.concatenate([self._rem, samples])
+        n = len(samples) // self.frame
+        frames = samples[:n * self.frame].reshape(n, self.frame)
+        self._rem = samples[n * self.frame:].copy()
+        self.total_frames += n
+
+        energies = frame_energy_db(frames.reshape(-1), self.samplerate, 1000.0 * self.frame / self.samplerate)
+        frames = np.concatenate([self._frames, frames])
+        flags = np.concatenate([self._flags, energies >= self._threshold(energies)])
+
+        # frames are decided once `padding` frames of lookahead are known
+        lookahead = np.zeros(self.padding, dtype=bool) if final else np.zeros(0, dtype=bool)
+        ctx = np.concatenate([self._history, flags, lookahead])
+        m = len(flags) if final else max(0, len(flags) - self.padding)
+        window = self.hangover + self.padding + 1
+        csum = np.concatenate([[0], np.cumsum(ctx, dtype=np.int64)])
+        idx = np.arange(m)
+        keep = (csum[idx + window] - csum[idx]) > 0
+
+        # position of each dropped-candidate frame within its silent stretch
+        silent = ~keep
+        run_start = np.where(silent & np.concatenate([[True], keep[:-1]]), idx, 0)
+        run_start = np.maximum.accumulate(run_start) if m else run_start
+        pos = idx - run_start
+        if m and silent[0]:
+            # the first stretch may continue one from the previous chunk
+            first_end = np.argmax(keep) if keep.any() else m
+            pos[:first_end] += self._silent_run
+        emit = keep | (silent & (pos < self.keep_silence))
+
+        out = frames[:m][emit]
+        self.skipped_frames += int(m - emit.sum())
+        if m:
+            self._silent_run = int(pos[-1]) + 1 if silent[-1] else 0
+        self._history = ctx[m:m + self.hangover].copy()
+        self._frames = frames[m:]
+        self._flags = flags[m:]
+
+        data = out.tobytes()
+        if final:
+            data += self._rem.tobytes()
+            self._rem = np.zeros(0, dtype=np.int16)
+        return data
+
+    def flush(self):
+        """Decide the frames held back for lookahead and return them."""
+        return self.process(b'', final=True)
@@ -0,0 +1,147 @@
+"""Incremental WAV parsing.
+
+`WavStreamReader` parses a RIFF/WAVE header from any readable stream (an
+HTTP request body, an uploaded file, a BytesIO) and then hands out PCM frames
+as they are read, without needing the whole file or a seekable source.
+"""
+import struct
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# data chunk sizes used by writers that don't know the length up front
+_UNKNOWN_SIZES = (0, 0xFFFFFFFF)
+# largest fmt chunk accepted (PCM is 16 bytes, WAVE_FORMAT_EXTENSIBLE 40)
+_MAX_FMT_SIZE = 64
+# unknown chunks (LIST, fact, ...) are skipped in blocks of this size
+_SKIP_BLOCK = 64 * 1024
+
+
+class WavFormatError(ValueError):
+    """Raised when the stream is not a PCM WAV file.
+
+    `consumed` holds the bytes already read from the stream, so a caller can
+    still hand the complete input to another decoder.
+    """
+
+    def __init__(self, message, consumed=b''):
+        super().__init__(message)
+        self.consumed = consumed
+
+
+def _read_exact(stream, n):
+    buf = b''
+    while len(buf) < n:
+        block = stream.read(n - len(buf))
+        if not block:
+            break
+        buf += block
+    return buf
+
+
+class WavStreamReader:
+    """Read PCM frames from a non-seekable WAV stream.
+
+    Usage:
+        reader = WavStreamReader(request.stream)
+        while True:
+            data = reader.readframes(4000)
+            if not data:
+                break
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.nchannels = None
+        self.sampwidth = None
+        self.framerate = None
+        self.comptype = 'NONE'
+        self._remaining = None
+        # size of the data chunk in bytes, None if the header doesn't say
+        self.data_size = None
+        # the header read so far, minus skipped chunks: with the rest of the
+        # stream it is still a valid file (see WavFormatError.consumed)
+        self.header = bytearray()
+        # bytes read from the stream before the PCM data
+        self.data_offset = 0
+        self._parse_header()
+
+    def _read_header(self, n, keep=True):
+        data = _read_exact(self._stream, n)
+        self.data_offset += len(data)
+        if keep:
+            self.header += data
+        return data
+
+    def _skip(self, n):
+        while n > 0:
+            block = self._stream.read(min(n, _SKIP_BLOCK))
+            if not block:
+                break
+            n -= len(block)
+            self.data_offset += len(block)
+
+    def _error(self, message):
+        return WavFormatError(message, bytes(self.header))
+
+    def _parse_header(self):
+        riff = self._read_header(12)
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            raise self._error('Not a RIFF/WAVE stream')
+        while True:
+            head = self._read_header(8, keep=False)
+            if len(head) < 8:
+                raise self._error('No data chunk in WAV stream')
+            chunk_id, size = head[:4], struct.unpack('<I', head[4:])[0]
+            if chunk_id in (b'fmt ', b'data'):
+                self.header += head
+            if chunk_id == b'fmt ':
+                if size > _MAX_FMT_SIZE:
+                    raise self._error(f'fmt chunk too large ({size} bytes)')
+                fmt = self._read_header(size + (size & 1))
+                if len(fmt) < 16:
+                    raise self._error('Truncated fmt chunk')
+                tag, self.nchannels, self.framerate, _rate, _align, bits = struct.unpack('<HHIIHH', fmt[:16])
+                if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                    tag = struct.unpack('<H', fmt[24:26])[0]
+                if tag != WAVE_FORMAT_PCM:
+                    self.comptype = f'0x{tag:04x}'
+                self.sampwidth = (bits + 7) // 8
+                if not self.nchannels or not self.sampwidth or not self.framerate:
+                    raise self._error('Invalid fmt chunk (zero channels, sample width or rate)')
+            elif chunk_id == b'data':
+                if self.framerate is None:
+                    raise self._error('data chunk before fmt chunk')
+                # streamed WAVs may not know their length; read to EOF then
+                self._remaining = None if size in _UNKNOWN_SIZES else size
+                self.data_size = self._remaining
+                return
+            else:
+                # not needed for decoding; never held in memory
+                self._skip(size + (size & 1))
+
+    def getnchannels(self):
+        return self.nchannels
+
+    def getsampwidth(self):
+        return self.sampwidth
+
+    def getframerate(self):
+        return self.framerate
+
+    def getcomptype(self):
+        return self.comptype
+
+    def readframes(self, n):
+        """Return up to `n` frames of raw PCM; b'' at end of data."""
+        frame = self.nchannels * self.sampwidth
+        want = n * frame
+        if self._remaining is not None:
+            want = min(want, self._remaining)
+        if want <= 0:
+            return b''
+        data = _read_exact(self._stream, want)
+        # keep whole frames only
+        data = data[:len(data) - len(data) % frame]
+        if self._remaining is not None:
+            self._remaining -= len(data)
+        return data
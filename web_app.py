@@ -3,16 +3,43 @@
 Cross-platform Speech Recognition Web App
 Works on: Android, iOS, Desktop browsers
 Deployable to: Google Play Store (via TWA), App Store (via PWA), Web hosting
+
+GET /metrics returns Prometheus text-format metrics (see metrics.py).
+Add trace=1 (or an X-Trace: 1 header) to /api/transcribe for per-stage
+timings in the response; /admin/profile runs an on-demand profiling session
+over the next N transcriptions (see profiling.py).
+
+The default model loads on a background thread at startup. GET /health/live
+answers as soon as the process is up; GET /health/ready returns 503 until
+the model is loaded (state loading/ready/failed and the load time are in
+the body). Transcriptions that arrive during warm-up wait up to
+MODEL_WAIT_SECONDS and then get a 503 with Retry-After. A failed load is
+retried by a later request or readiness check after a backoff.
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
 import os
-import wave
 import json
 from datetime import datetime
-import vosk
 import base64
+import hashlib
+import io
+import shutil
+import tempfile
+import time
+
+import audio_decode
+import metrics
+import profiling
+from audio_storage import AudioStorage
+from chunked_upload import UploadStore, UploadNotFound, OffsetMismatch, UploadTooLarge
+from model_registry import registry, model_sample_rate, ModelNotReady, Warmup, MODEL_WAIT_SECONDS
+from recognizer_pool import pool, PoolTimeout
+from recordings_index import RecordingsIndex
+from result_cache import cache as result_cache, make_key, HashingReader, MemoryLRU
+from wav_stream import WavStreamReader, WavFormatError
+from vad import SilenceFilter
 
 app = Flask(__name__, static_folder='web_static', template_folder='web_templates')
 CORS(app)  # Enable CORS for PWA
@@ -20,26 +47,72 @@ CORS(app)  # Enable CORS for PWA
 # Configure paths
 UPLOAD_FOLDER = 'web_uploads'
 RECORDINGS_FOLDER = 'web_recordings'
-MODEL_PATH = 'models/vosk-model-small-en-us-0.15'
+MODEL_PATH = os.environ.get('VOSK_MODEL_PATH', 'models/vosk-model-small-en-us-0.15')
+# Save received audio to disk (in the background, as FLAC); override per request with ?persist=0/1
+PERSIST_AUDIO = os.environ.get('PERSIST_AUDIO', '1') != '0'
+# Drop long silences before recognition; override per request with ?skip_silence=0/1
+SKIP_SILENCE = os.environ.get('SKIP_SILENCE', '0') == '1'
+# Reuse results for audio that was already transcribed; override per request with ?cache=0/1
+RESULT_CACHE = os.environ.get('RESULT_CACHE', '1') != '0'
+# Request bodies with these content types are WAV streamed straight into the recognizer
+STREAMING_MIMETYPES = ('audio/wav', 'audio/x-wav', 'audio/wave', 'audio/vnd.wave')
+# Other raw binary bodies (audio/webm, audio/ogg, ...) are decoded once fully received
+BINARY_MIMETYPES = ('application/octet-stream',)
+# Unfinished chunked uploads (/api/uploads)
+UPLOAD_PARTS_FOLDER = os.environ.get('UPLOAD_PARTS_FOLDER', os.path.join('cache', 'uploads'))
+# Received bodies and decoded PCM held before recognition spill to disk past this size
+SPOOL_BYTES = 8 << 20
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RECORDINGS_FOLDER, exist_ok=True)
 
+# Metadata index behind /api/recordings
+recordings = RecordingsIndex({'recordings': RECORDINGS_FOLDER, 'uploads': UPLOAD_FOLDER})
+# Saved audio: content-addressed FLAC files, kept under a disk quota
+storage = AudioStorage(recordings)
+# Resumable uploads, assembled on disk before transcription
+uploads = UploadStore(UPLOAD_PARTS_FOLDER)
+
+registry.add_load_listener(metrics.observe_model_load)
+metrics.export_stats('stt_result_cache', result_cache.stats, metrics.RESULT_CACHE_FIELDS)
+metrics.export_stats('stt_recognizer_pool', pool.stats, {
+    'in_use': ('gauge', 'Recognizers checked out.'),
+    'idle': ('gauge', 'Recognizers waiting in the pool.'),
+    'hits': ('counter', 'Recognizer checkouts served from the pool.'),
+    'misses': ('counter', 'Recognizer checkouts that created a recognizer.'),
+    'timeouts': ('counter', 'Recognizer checkouts that timed out.'),
+})
+metrics.callback('stt_storage_bytes', 'Bytes of saved audio.', lambda: storage.stats()['total_bytes'])
+
 # Initialize Vosk model
 model = None
 
 def init_model():
+    """Load the default model; runs on a background thread through `warmup`"""
     global model
-    if os.path.exists(MODEL_PATH):
-        try:
-            model = vosk.Model(MODEL_PATH)
-            print(f"✅ Vosk model loaded from {MODEL_PATH}")
-        except Exception as e:
-            print(f"⚠️  Model load failed: {e}")
-            model = None
-    else:
-        print(f"⚠️  Model not found at {MODEL_PATH}")
-        model = None
+    if not os.path.exists(MODEL_PATH):
+        raise FileNotFoundError(f"Model not found at {MODEL_PATH}")
+    loaded = registry.load(MODEL_PATH)
+    # build the first recognizer now too (same options as _recognize)
+    pool.prewarm(loaded, model_sample_rate(MODEL_PATH), words=True)
+    model = loaded
+    print(f"✅ Vosk model loaded from {MODEL_PATH}")
+
+# Started from __main__; under a WSGI server the first request or readiness check starts it
+warmup = Warmup(init_model)
+metrics.callback('stt_model_ready', 'Whether the default model has finished loading.',
+                 lambda: 1 if warmup.ready else 0)
+
+def get_model(name=None):
+    """Return the shared model `name` from the registry, or the default model.
+
+    The default model is waited for (see `warmup`); raises ModelNotReady if it
+    is still loading after MODEL_WAIT_SECONDS or its load failed.
+    """
+    if name:
+        return registry.get(name)
+    warmup.require(MODEL_WAIT_SECONDS)
+    return model
 
 @app.route('/')
 def index():
@@ -87,96 +160,522 @@ def service_worker():
     """Service worker for offline support"""
     return send_from_directory('web_static', 'service-worker.js')
 
+def _flag_requested(name, default):
+    """Read an on/off query parameter, falling back to `default`"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    return value.lower() not in ('0', 'false', 'no')
+
+def _open_pcm(stream, model_rate, stages=None):
+    """Return (samplerate, chunks) of mono 16-bit PCM for an uploaded stream.
+
+    Mono 16-bit PCM WAV is passed through while it is read. Anything else
+    (stereo/24-bit/float WAV, FLAC, OGG, compressed formats) is normalized to
+    the model rate by audio_decode, in-process where soundfile can decode it.
+    A seekable stream (an upload file, a multipart part) is rewound and
+    decoded in place; a request body is first spooled to a temporary file,
+    timed as the 'receive' stage of `stages` (a metrics.Stages).
+    stages.info['decoder'] records the path taken.
+    """
+    if stages is None:
+        stages = metrics.Stages()
+    info = stages.info
+    try:
+        wf = WavStreamReader(stream)
+        if wf.getnchannels() == 1 and wf.getsampwidth() == 2 and wf.getcomptype() == "NONE":
+            info['decoder'] = 'wav'
+            return wf.getframerate(), iter(lambda: wf.readframes(4000), b'')
+        consumed = bytes(wf.header)
+    except WavFormatError as e:
+        consumed = e.consumed
+    if stream.seekable():
+        stream.seek(0)
+        return model_rate, audio_decode.normalize_pcm_stream(stream, model_rate, info=info)
+
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    with stages.stage('receive'):
+        spool.write(consumed)
+        shutil.copyfileobj(stream, spool, 1 << 16)
+    spool.seek(0)
+
+    def chunks():
+        with spool:
+            yield from audio_decode.normalize_pcm_stream(spool, model_rate, info=info)
+
+    return model_rate, chunks()
+
+def _model_rate(name=None):
+    return model_sample_rate(registry.find_model_dir(name) if name else MODEL_PATH)
+
+def _recognize(chunks, rec_model, samplerate, skip_silence, writer=None):
+    """Run PCM chunks through a pooled recognizer.
+
+    If a writer is given the frames are also queued to it. With silence
+    skipping on, frames pass through a vad.SilenceFilter before the recognizer.
+    Returns a dict with text, audio_seconds and skipped_seconds.
+    """
+    silence = SilenceFilter(samplerate) if skip_silence else None
+    nbytes = 0
+    results = []
+    with pool.acquire(rec_model, samplerate, words=True) as rec:
+        def accept(data):
+            if data and rec.AcceptWaveform(data):
+                result = json.loads(rec.Result())
+                if 'text' in result and result['text']:
+                    results.append(result['text'])
+
+        for data in chunks:
+            nbytes += len(data)
+            if writer is not None:
+                writer.write(data)
+            accept(silence.process(data) if silence is not None else data)
+        if silence is not None:
+            accept(silence.flush())
+
+        # Get final result
+        final_result = json.loads(rec.FinalResult())
+        if 'text' in final_result and final_result['text']:
+            results.append(final_result['text'])
+
+    return {
+        'text': ' '.join(results),
+        'audio_seconds': round(nbytes / 2.0 / samplerate, 3),
+        'skipped_seconds': round(silence.skipped_seconds, 3) if silence is not None else 0.0,
+    }
+
+def _transcribe_stream(stream, rec_model, model_id, model_rate, folder, prefix, buffered=False, stages=None):
+    """Recognize an audio stream, consulting the result cache.
+
+    Results are cached under a hash of the normalized PCM, the model and the
+    options. A `buffered` upload (already fully received) is decoded and
+    hashed first, its PCM spooled to a temporary file, so a repeat is
+    answered from the cache and identical concurrent requests share one
+    recognition. A streamed body goes to the recognizer as it
+    arrives and is hashed on the way; its result is stored for later repeats.
+    Decode and recognition times are added to `stages` (a metrics.Stages).
+    Returns (result, filename, cached).
+    """
+    if stages is None:
+        stages = metrics.Stages()
+    # decode setup, minus reading a body that is decoded whole (timed as 'receive')
+    receive_before = stages.seconds.get('receive', 0.0)
+    open_start = time.perf_counter()
+    samplerate, chunks = _open_pcm(stream, model_rate, stages)
+    stages.add('decode', time.perf_counter() - open_start - (stages.seconds.get('receive', 0.0) - receive_before))
+    chunks = stages.timed_iter('decode', chunks)
+    skip_silence = _flag_requested('skip_silence', SKIP_SILENCE)
+    options = {'samplerate': samplerate, 'skip_silence': skip_silence}
+
+    writer = storage.writer(folder, prefix, samplerate) if _flag_requested('persist', PERSIST_AUDIO) else None
+
+    cached = False
+    decode_before = stages.seconds.get('decode', 0.0)
+    start = time.perf_counter()
+    try:
+        if not _flag_requested('cache', RESULT_CACHE):
+            result = _recognize(chunks, rec_model, samplerate, skip_silence, writer)
+        elif buffered:
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as pcm:
+                hashed = HashingReader(chunks)
+                for data in hashed:
+                    pcm.write(data)
+                    if writer is not None:
+                        writer.write(data)
+                pcm.seek(0)
+                key = make_key(hashed.hexdigest(), model_id, options)
+                blocks = iter(lambda: pcm.read(8000), b'')
+                result, cached = result_cache.get_or_compute(
+                    key, lambda: _recognize(blocks, rec_model, samplerate, skip_silence))
+        else:
+            hashed = HashingReader(chunks)
+            result = _recognize(hashed, rec_model, samplerate, skip_silence, writer)
+            result_cache.put(make_key(hashed.hexdigest(), model_id, options), result)
+    except Exception:
+        if writer is not None:
+            recordings.set_transcript(writer.close(), None, status='error')
+        raise
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if not cached:
+        # time in the recognizer, excluding decoding interleaved with it
+        recognize = time.perf_counter() - start - (stages.seconds.get('decode', 0.0) - decode_before)
+        stages.add('recognize', recognize)
+        metrics.observe_recognition(result['audio_seconds'], recognize)
+
+    if writer is not None:
+        recordings.set_transcript(writer.path, result['text'])
+
+    return result, (os.path.basename(writer.path) if writer is not None else None), cached
+
 @app.route('/api/transcribe', methods=['POST'])
 def transcribe():
-    """Transcribe audio file or base64 audio data"""
+    """Transcribe audio sent as a raw body, a chunked upload, a file or base64
+
+    The preferred form is the audio itself as the request body with its
+    Content-Type (audio/wav, audio/webm, audio/ogg, application/octet-stream,
+    ...). A raw WAV body is streamed: recognition starts while the body is
+    still arriving. `?upload_id=` transcribes a finished chunked upload (see
+    /api/uploads). Multipart `file` uploads and the older base64 data-URL JSON
+    ({"audio": "data:...;base64,..."}) are still accepted. Formats other than
+    mono 16-bit WAV are converted to the model's sample rate first.
+    """
+    start = time.perf_counter()
+    stages = metrics.Stages()
+    with metrics.IN_FLIGHT.track(endpoint='/api/transcribe'), metrics.REQUEST_SECONDS.time(endpoint='/api/transcribe'):
+        with profiling.profiler.request():
+            body, status = _transcribe(stages)
+        with stages.stage('serialize'):
+            response = jsonify(body)
+    stages.observe()
+    metrics.REQUESTS.inc(endpoint='/api/transcribe', status=status)
+    if profiling.trace_requested(request.args, request.headers):
+        trace = profiling.make_trace(profiling.new_request_id(), '/api/transcribe', stages,
+                                     time.perf_counter() - start, cached=body.get('cached'), **stages.info)
+        response = jsonify(dict(body, trace=trace))
+    response.status_code = status
+    if 'retry_after' in body:
+        response.headers['Retry-After'] = str(body['retry_after'])
+    return response
+
+def _error(message, status, error_type, retry_after=None):
+    """Count a failed transcription and return its (body, status)"""
+    metrics.ERRORS.inc(endpoint=request.path, type=error_type)
+    body = {'error': message}
+    if retry_after is not None:
+        body['retry_after'] = retry_after
+    return body, status
+
+def _transcribe(stages):
+    """Body of /api/transcribe; returns (response dict, status)"""
     try:
-        if not model:
-            return jsonify({'error': 'Model not loaded'}), 500
+        model_name = request.args.get('model')
+        try:
+            with stages.stage('model'):
+                rec_model = get_model(model_name)
+        except FileNotFoundError as e:
+            return _error(str(e), 404, 'ModelNotFound')
+        except ModelNotReady as e:
+            return _error(str(e), 503, 'ModelNotReady', retry_after=e.retry_after)
+        except RuntimeError as e:
+            return _error(str(e), 500, 'NoModel')
+        if not rec_model:
+            return _error('Model not loaded', 500, 'NoModel')
+        
+        upload_path = None
+        upload_id = request.args.get('upload_id')
+
+        # Parse a multipart form up front, so the upload time counts as 'receive'
+        files = {}
+        if request.mimetype == 'multipart/form-data':
+            with stages.stage('receive'):
+                files = request.files
+
+        # Handle a finished chunked upload
+        if upload_id:
+            try:
+                upload_path = uploads.path(upload_id)
+            except UploadNotFound:
+                return _error('Unknown upload', 404, 'UnknownUpload')
+            stream, folder, prefix, buffered = open(upload_path, 'rb'), UPLOAD_FOLDER, 'upload', True
+
+        # Handle raw WAV body, read incrementally from the request stream
+        elif request.mimetype in STREAMING_MIMETYPES:
+            stream, folder, prefix, buffered = request.stream, UPLOAD_FOLDER, 'upload', False
+
+        # Handle other raw audio bodies (no multipart or base64 overhead)
+        elif request.mimetype.startswith('audio/') or request.mimetype in BINARY_MIMETYPES:
+            stream, folder, prefix, buffered = request.stream, UPLOAD_FOLDER, 'upload', True
         
         # Handle file upload
-        if 'file' in request.files:
-            file = request.files['file']
+        elif 'file' in files:
+            file = files['file']
             if file.filename == '':
-                return jsonify({'error': 'No file selected'}), 400
+                return _error('No file selected', 400, 'NoFile')
             
-            filepath = os.path.join(UPLOAD_FOLDER, f"upload_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav")
-            file.save(filepath)
+            stream, folder, prefix, buffered = file.stream, UPLOAD_FOLDER, 'upload', True
         
         # Handle base64 audio data (from browser recording)
-        elif request.json and 'audio' in request.json:
-            audio_data = base64.b64decode(request.json['audio'].split(',')[1])
-            filepath = os.path.join(RECORDINGS_FOLDER, f"recording_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav")
-            with open(filepath, 'wb') as f:
-                f.write(audio_data)
+        elif request.is_json and request.json and 'audio' in request.json:
+            with stages.stage('receive'):
+                audio_data = base64.b64decode(request.json['audio'].split(',')[1])
+            stream, folder, prefix, buffered = io.BytesIO(audio_data), RECORDINGS_FOLDER, 'recording', True
         else:
-            return jsonify({'error': 'No audio data provided'}), 400
+            return _error('No audio data provided', 400, 'NoAudio')
         
         # Transcribe
-        wf = wave.open(filepath, "rb")
-        if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getcomptype() != "NONE":
-            return jsonify({'error': 'Audio must be WAV format mono PCM'}), 400
-        
-        rec = vosk.KaldiRecognizer(model, wf.getframerate())
-        rec.SetWords(True)
-        
-        results = []
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
-            if rec.AcceptWaveform(data):
-                result = json.loads(rec.Result())
-                if 'text' in result and result['text']:
-                    results.append(result['text'])
-        
-        # Get final result
-        final_result = json.loads(rec.FinalResult())
-        if 'text' in final_result and final_result['text']:
-            results.append(final_result['text'])
-        
-        transcription = ' '.join(results)
+        try:
+            model_id = model_name or os.path.basename(os.path.normpath(MODEL_PATH))
+            result, filename, cached = _transcribe_stream(stream, rec_model, model_id, _model_rate(model_name),
+                                                          folder, prefix, buffered, stages)
+        except audio_decode.DecodeError as e:
+            return _error(f'Unsupported or corrupt audio: {e}', 400, 'DecodeError')
+        except PoolTimeout as e:
+            return _error(str(e), 503, 'PoolTimeout')
+        finally:
+            if upload_path is not None:
+                stream.close()
+        if upload_path is not None:
+            uploads.discard(upload_id)
         
-        return jsonify({
+        return {
             'success': True,
-            'transcription': transcription,
-            'file': os.path.basename(filepath)
-        })
+            'transcription': result['text'],
+            'file': filename,
+            'audio_seconds': result['audio_seconds'],
+            'skipped_seconds': result['skipped_seconds'],
+            'cached': cached
+        }, 200
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _error(str(e), 500, type(e).__name__)
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """Start a chunked upload; send the chunks with PUT /api/uploads/<upload_id>"""
+    return jsonify({'upload_id': uploads.create(), 'size': 0}), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+def upload_chunk(upload_id):
+    """Append a chunk (PUT, raw body, `?offset=` = bytes sent so far), check progress (GET) or cancel
+
+    A chunk whose offset does not match what the server has is rejected with
+    409 and the current size, so an interrupted upload resumes from there.
+    When all chunks are in, POST /api/transcribe?upload_id=<upload_id>.
+    """
+    try:
+        if request.method == 'DELETE':
+            uploads.path(upload_id)
+            uploads.discard(upload_id)
+            return jsonify({'upload_id': upload_id, 'deleted': True})
+        if request.method == 'GET':
+            return jsonify({'upload_id': upload_id, 'size': uploads.size(upload_id)})
+        try:
+            offset = int(request.args.get('offset', '0'))
+        except ValueError:
+            return jsonify({'error': 'offset must be an integer'}), 400
+        size = uploads.append(upload_id, offset, request.stream)
+        return jsonify({'upload_id': upload_id, 'size': size})
+    except UploadNotFound:
+        return jsonify({'error': 'Unknown upload'}), 404
+    except OffsetMismatch as e:
+        return jsonify({'error': str(e), 'upload_id': upload_id, 'size': e.size}), 409
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+
+def _time_arg(name):
+    """Read a time query parameter given as epoch seconds or ISO 8601"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def _float_arg(name):
+    value = request.args.get(name)
+    return float(value) if value is not None else None
 
 @app.route('/api/recordings')
 def list_recordings():
-    """List all recordings"""
+    """List recordings from the metadata index, one page at a time
+
+    Query parameters: folder (recordings|uploads), status (done|error|none),
+    q (substring of name or transcript), min_duration/max_duration (seconds),
+    since/until (epoch seconds or ISO 8601), sort (modified|created|name|size|
+    duration), order (asc|desc), limit (1-500, default 100), cursor (the
+    next_cursor of the previous page) and refresh=1 to force a rescan.
+    """
+    try:
+        try:
+            limit = min(max(int(request.args.get('limit', 100)), 1), 500)
+            order = request.args.get('order', 'desc')
+            if order not in ('asc', 'desc'):
+                raise ValueError(f'Unknown order: {order}')
+            recordings.refresh(force=_flag_requested('refresh', False))
+            rows, next_cursor = recordings.query(
+                folder=request.args.get('folder'), status=request.args.get('status'),
+                search=request.args.get('q'), min_duration=_float_arg('min_duration'),
+                max_duration=_float_arg('max_duration'), since=_time_arg('since'), until=_time_arg('until'),
+                sort=request.args.get('sort', 'modified'), descending=order == 'desc',
+                limit=limit, cursor=request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'recordings': rows, 'next_cursor': next_cursor})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Spectrograms by (file hash, parameters), and file hashes by (path, size, mtime)
+_spectrograms = MemoryLRU(int(os.environ.get('SPECTROGRAM_CACHE_ENTRIES', '64')))
+# Largest spectrogram served, in uint8 cells (frames x bins)
+SPECTROGRAM_MAX_CELLS = int(os.environ.get('SPECTROGRAM_MAX_CELLS', str(8 << 20)))
+_file_digests = MemoryLRU(1024)
+
+def _find_recording(name):
+    """Path of recording `name` in the recordings or uploads folder, or None"""
+    name = os.path.basename(name)
+    for folder in [RECORDINGS_FOLDER, UPLOAD_FOLDER]:
+        path = os.path.join(folder, name)
+        if name and os.path.isfile(path):
+            return path
+    return None
+
+def _file_digest(path):
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    digest = _file_digests.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        digest = h.hexdigest()
+        _file_digests.put(key, digest)
+    return digest
+
+@app.route('/api/spectrogram/<name>')
+def get_spectrogram(name):
+    """Quantized log-power spectrogram of a recording for client-side rendering
+
+    Query parameters: n_fft (power of two, default 512), hop (default 160),
+    mels (mel bands, default 0 = linear bins), range (dB, default 80) and
+    format=json|bin. Values are uint8 codes in frame-major order;
+    dB = min_db + code / 255 * (max_db - min_db). The binary format returns
+    the raw codes with the shape and scale in X-Spectrogram-* headers, JSON
+    returns them base64-encoded. Spectrograms over SPECTROGRAM_MAX_CELLS
+    cells are refused with 413; ask for a larger hop or fewer mels.
+    """
+    path = _find_recording(name)
+    if path is None:
+        return jsonify({'error': 'Recording not found'}), 404
+    try:
+        n_fft = int(request.args.get('n_fft', 512))
+        hop = int(request.args.get('hop', 160))
+        n_mels = int(request.args.get('mels', 0))
+        dynamic_range = float(request.args.get('range', 80))
+    except ValueError:
+        return jsonify({'error': 'Invalid spectrogram parameters'}), 400
+    fmt = request.args.get('format', 'json')
+    if (n_fft < 64 or n_fft > 8192 or n_fft & (n_fft - 1) or not 0 < hop <= n_fft
+            or not 0 <= n_mels <= 256 or not 0 < dynamic_range <= 200 or fmt not in ('json', 'bin')):
+        return jsonify({'error': 'Invalid spectrogram parameters'}), 400
+
     try:
-        recordings = []
-        for folder in [RECORDINGS_FOLDER, UPLOAD_FOLDER]:
-            if os.path.exists(folder):
-                for file in os.listdir(folder):
-                    if file.endswith('.wav'):
-                        filepath = os.path.join(folder, file)
-                        recordings.append({
-                            'name': file,
-                            'size': os.path.getsize(filepath),
-                            'modified': datetime.fromtimestamp(os.path.getmtime(filepath)).isoformat()
-                        })
-        return jsonify({'recordings': recordings})
+        params = {'n_fft': n_fft, 'hop': hop, 'mels': n_mels, 'range': dynamic_range}
+        key = make_key(_file_digest(path), 'spectrogram', params)
+        etag = f'{key}.{fmt}'
+        if request.if_none_match.contains(etag):
+            return Response(status=304)
+        entry = _spectrograms.get(key)
+        if entry is None:
+            import audio_utils
+            try:
+                codes, min_db, max_db, sr = audio_utils.spectrogram_codes(
+                    path, n_fft=n_fft, hop=hop, n_mels=n_mels or None, dynamic_range=dynamic_range,
+                    max_cells=SPECTROGRAM_MAX_CELLS)
+            except audio_utils.SpectrogramTooLarge as e:
+                return jsonify({'error': str(e)}), 413
+            entry = {'frames': codes.shape[0], 'bins': codes.shape[1], 'sample_rate': sr, 'hop': hop,
+                     'n_fft': n_fft, 'mels': n_mels, 'min_db': round(min_db, 2), 'max_db': round(max_db, 2),
+                     'data': codes.tobytes()}
+            _spectrograms.put(key, entry)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+    if fmt == 'bin':
+        resp = Response(entry['data'], mimetype='application/octet-stream')
+        for field in ('frames', 'bins', 'sample_rate', 'hop', 'n_fft', 'mels', 'min_db', 'max_db'):
+            resp.headers['X-Spectrogram-' + field.replace('_', '-').title()] = str(entry[field])
+    else:
+        resp = jsonify(dict(entry, data=base64.b64encode(entry['data']).decode('ascii')))
+    resp.set_etag(etag)
+    return resp
+
+def _admin_denied():
+    if profiling.admin_allowed(request.remote_addr, request.headers.get('X-Admin-Token')):
+        return None
+    return jsonify({'error': 'Admin access denied'}), 403
+
+@app.route('/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    """Start (POST), inspect (GET) or stop (DELETE) a profiling session
+
+    POST parameters: requests (default 10), mode=sample|cprofile (default
+    sample), interval_ms (sampling interval, default 5). The dump is written
+    when that many transcriptions have been profiled; fetch it from
+    /admin/profile/download.
+    """
+    denied = _admin_denied()
+    if denied:
+        return denied
+    if request.method == 'GET':
+        return jsonify(profiling.profiler.status())
+    if request.method == 'DELETE':
+        return jsonify({'stopped': profiling.profiler.stop(), 'last': profiling.profiler.last})
+    try:
+        return jsonify(profiling.profiler.start(int(request.args.get('requests', 10)),
+                                                request.args.get('mode', 'sample'),
+                                                float(request.args.get('interval_ms', 5)) / 1000.0))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+
+@app.route('/admin/profile/download')
+def download_profile():
+    """The dump of the last finished profiling session"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    last = profiling.profiler.last
+    if not last or not last['path'] or not os.path.exists(last['path']):
+        return jsonify({'error': 'No profile available'}), 404
+    return send_from_directory(os.path.abspath(os.path.dirname(last['path'])), os.path.basename(last['path']),
+                               as_attachment=True)
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text-format metrics"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/health')
 def health():
     """Health check endpoint"""
+    warmup.start()
     return jsonify({
         'status': 'healthy',
         'model_loaded': model is not None,
+        'model': warmup.status(),
+        'models': [os.path.basename(p) for p, _size in registry.loaded_models()],
+        'recognizer_pool': pool.stats(),
+        'result_cache': result_cache.stats(),
+        'storage': storage.stats(),
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/health/live')
+def health_live():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'alive', 'timestamp': datetime.now().isoformat()})
+
+@app.route('/health/ready')
+def health_ready():
+    """Readiness: 200 once the default model is loaded, 503 while loading or after a failure"""
+    warmup.start()
+    status = warmup.status()
+    response = jsonify(dict(status, ready=warmup.ready))
+    if not warmup.ready:
+        response.status_code = 503
+        response.headers['Retry-After'] = str(warmup.retry_after())
+    return response
+
 if __name__ == '__main__':
     print("🌐 Starting Cross-Platform Speech Recognition Server...")
-    init_model()
+    # Load the model in the background so the server binds at once
+    warmup.start()
     
     # Run on all interfaces for mobile access
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,228 @@
+"""Bounded process pool for decoding and recognition off the event loop.
+
+Each worker process loads the model once (through its own model registry) and
+then serves jobs. Admission control keeps at most `workers + queue_size` jobs
+in flight; beyond that `submit` fails fast with QueueFull so the server can
+answer 429 with a Retry-After hint instead of piling up work. Worker
+processes are started on demand; `warm_up` starts them all ahead of the
+first request.
+
+Configuration (environment):
+    TRANSCRIBE_WORKERS      number of worker processes (default: min(4, CPUs))
+    TRANSCRIBE_QUEUE_SIZE   jobs allowed to wait for a worker (default: 2 * workers)
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+DEFAULT_WORKERS = int(os.environ.get('TRANSCRIBE_WORKERS', str(min(4, os.cpu_count() or 1))))
+DEFAULT_QUEUE_SIZE = int(os.environ.get('TRANSCRIBE_QUEUE_SIZE', str(2 * DEFAULT_WORKERS)))
+# seconds each warm-up job holds its worker (see TranscriptionPool.warm_up)
+WARM_UP_HOLD = 0.05
+
+
+class QueueFull(RuntimeError):
+    """Raised when the pool already has the maximum number of jobs in flight."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PoolUnavailable(RuntimeError):
+    """Raised when the worker processes are not running (crashed or shut down)."""
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# -- worker side -------------------------------------------------------------
+
+# (model name, seconds) of model loads in this worker not yet reported to the server
+_model_loads = []
+
+
+def _record_model_load(model_dir, seconds):
+    _model_loads.append((os.path.basename(os.path.normpath(model_dir)), seconds))
+
+
+def _init_worker(model_name):
+    # Load the default model and build a recognizer up front so the first job doesn't pay for them
+    from model_registry import registry, model_sample_rate
+    from recognizer_pool import pool
+    registry.add_load_listener(_record_model_load)
+    try:
+        pool.prewarm(registry.get(model_name), model_sample_rate(registry.find_model_dir(model_name)))
+    except Exception as e:
+        print(f'Worker {os.getpid()}: model preload failed: {e}')
+
+
+def _warm_up_job(model_name, hold=0.0):
+    from model_registry import registry
+    registry.get(model_name)
+    # keep this worker busy for a moment so the other warm-up jobs go to other workers
+    time.sleep(hold)
+    return os.getpid()
+
+
+def decode_and_transcribe(data, model_name=None, skip_silence=False, profile=None):
+    """Decode an upload to the model rate and transcribe it (runs in a worker).
+
+    WAV/FLAC/OGG are decoded in-process; ffmpeg is only spawned for formats
+    soundfile cannot read.
+
+    Returns (text, stats) with the audio and skipped-silence seconds, the
+    model lookup, decode, recognize and total seconds spent in the worker, the
+    decoder used and the model loads since the previous job (for the server's
+    metrics and traces). With `profile` = (mode, interval) the job is
+    profiled (see profiling.py) and stats['profile'] holds the result.
+    """
+    if profile is not None:
+        import profiling
+
+        with profiling.capture(*profile) as cap:
+            text, stats = decode_and_transcribe(data, model_name, skip_silence)
+        stats['profile'] = cap['result']
+        return text, stats
+
+    import audio_decode
+    import transcribe
+    from metrics import Stages
+    from model_registry import registry, model_sample_rate
+
+    start = time.perf_counter()
+    model = registry.get(model_name)
+    rate = model_sample_rate(registry.find_model_dir(model_name))
+    stats = {'model_seconds': time.perf_counter() - start}
+    pcm = audio_decode.normalize_pcm_stream(data, samplerate=rate, info=stats)
+    stages = Stages()
+    try:
+        recognize_start = time.perf_counter()
+        text = transcribe.transcribe_pcm_stream(stages.timed_iter('decode', pcm), rate, model=model,
+                                                skip_silence=skip_silence, stats=stats)
+        decode = stages.seconds.get('decode', 0.0)
+        stats['decode_seconds'] = decode
+        stats['recognize_seconds'] = time.perf_counter() - recognize_start - decode
+        stats['worker_seconds'] = time.perf_counter() - start
+        stats['model_loads'] = _model_loads[:]
+        del _model_loads[:]
+        return text, stats
+    finally:
+        pcm.close()
+
+
+# -- server side -------------------------------------------------------------
+
+class TranscriptionPool:
+    """Process pool with a bounded queue and fast rejection when full."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, model_name=None):
+        self.workers = max(1, int(workers))
+        self.queue_size = max(0, int(queue_size))
+        self.model_name = model_name
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        # moving average of job duration, used for the Retry-After estimate
+        self._avg_seconds = 1.0
+
+    @property
+    def capacity(self):
+        return self.workers + self.queue_size
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.model_name,),
+                )
+            return self._executor
+
+    def warm_up(self):
+        """Start every worker process and wait until each has its model loaded.
+
+        A warm-up job reports its worker's pid after the model has loaded
+        there. Jobs are not bound to workers, so one worker that is ready
+        early can take several; jobs are resubmitted until every worker has
+        reported. Blocking; raises if a worker cannot load the model.
+        Returns the worker pids.
+        """
+        executor = self.start()
+        ready = set()
+        while len(ready) < self.workers:
+            futures = [executor.submit(_warm_up_job, self.model_name, WARM_UP_HOLD)
+                       for _ in range(self.workers - len(ready))]
+            ready.update(f.result() for f in futures)
+        return sorted(ready)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def retry_after(self):
+        """Seconds a rejected client should wait before retrying."""
+        waves = max(1, self._in_flight - self.workers + 1) / float(self.workers)
+        return max(1, int(round(self._avg_seconds * waves)))
+
+    async def submit(self, fn, *args):
+        """Run `fn(*args)` in a worker process and return its result.
+
+        Raises QueueFull when `workers + queue_size` jobs are already in
+        flight, and PoolUnavailable if the worker processes died.
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._rejected += 1
+                raise QueueFull(f'Server busy ({self._in_flight} jobs in flight)', retry_after=self.retry_after())
+            self._in_flight += 1
+
+        start = time.monotonic()
+        try:
+            executor = self.start()
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                # a worker crashed; replace the pool for subsequent requests
+                self._reset(executor)
+                raise PoolUnavailable('Transcription workers restarting')
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._completed += 1
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+            return result
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _reset(self, broken):
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+        broken.shutdown(wait=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'in_flight': self._in_flight,
+                'queued': max(0, self._in_flight - self.workers),
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'avg_seconds': round(self._avg_seconds, 3),
+                'running': self._executor is not None,
+            }